@@ -1,11 +1,30 @@
 import os
 import re
-import requests
-from bs4 import BeautifulSoup
+import io
+import json
+import gzip
+import html
+import hashlib
 import sys
+import time
 import random
-from datetime import datetime
-from typing import Optional, Dict
+import heapq
+import threading
+import signal
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import accumulate, chain
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Optional, Dict, List, Set, Iterable, Callable
+
+# requests and bs4 are imported where they are used, so runs that never touch
+# the network or the BeautifulSoup fallback (queries, archive maintenance,
+# streamed parses) start without loading them
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 # Fix Unicode encoding for Windows console
 if sys.platform == "win32":
@@ -47,15 +66,103 @@ class Config:
     ]
     
     def __init__(self):
-        self.publisher_sale_url = "https://assetstore.unity.com/publisher-sale"
+        self.publisher_sale_url = os.environ.get("PUBLISHER_SALE_URL", "https://assetstore.unity.com/publisher-sale")
         self.telegram_bot_token = os.environ.get("TELEGRAM_BOT_TOKEN")
         self.telegram_chat_id = os.environ.get("TELEGRAM_CHAT_ID")
+        self.telegram_api_url = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+        self.telegram_broadcast_file = os.environ.get("TELEGRAM_BROADCAST_FILE")
         self.affiliate_id = "1011lHuMX"
+        self.html_parser = "html.parser"
+        # Extraction stages, in order: page structured data (JSON-LD, embedded state,
+        # OpenGraph), the DOM-free StreamExtractor, then BeautifulSoup (html_parser)
+        self.structured_extract = True
+        self.stream_extract = True
+        
+        # Further promotion pages to track alongside publisher_sale_url (see SourceRegistry)
+        self.sources_file = os.environ.get("SCRAPER_SOURCES_FILE")
+        self.source_workers = 4
+        
+        # HTTP transport (seconds unless noted)
+        self.http_connect_timeout = 5.0
+        self.http_read_timeout = 20.0
+        self.http_max_retries = 3
+        self.http_backoff_base = 0.5
+        self.http_backoff_max = 10.0
+        self.http_pool_size = 10
+        
+        # On-disk HTTP and parse cache (set cache_dir to None to disable)
+        self.cache_dir = os.environ.get("SCRAPER_CACHE_DIR", ".cache")
+        self.cache_max_bytes = 50 * 1024 * 1024
+        self.cache_max_age_days = 30
+        
+        # Crawl of the featured publisher's catalog for the discount summary: pages
+        # fetched at once, requests/s and open requests per host, and a page cap
+        self.crawl_catalog = True
+        self.crawl_workers = 4
+        self.crawl_host_rate = 5.0
+        self.crawl_host_concurrency = 2
+        self.crawl_max_pages = 40
+        
+        # Compressed copies of the pages behind each archive entry, kept next to the
+        # archive so past entries can be re-parsed (set snapshot_dir to None to disable)
+        self.snapshot_dir = os.environ.get("SCRAPER_SNAPSHOT_DIR", "snapshots")
+        
+        # Telegram broadcast limits (messages per second)
+        self.telegram_global_rate = 30.0
+        self.telegram_chat_rate = 1.0
+        self.telegram_group_rate = 20 / 60
+        self.telegram_broadcast_workers = 8
+        self.telegram_max_attempts = 5
+        # Post the asset's key image with the message as its caption (sendPhoto); the
+        # image is uploaded once and its file_id reused for every later send
+        self.telegram_send_photos = True
+        # Uploaded image file_ids, kept next to the archive (not in cache_dir) so the
+        # workflow can commit them and later runs reuse them (None keeps them in memory)
+        self.media_cache_file = os.environ.get("TELEGRAM_MEDIA_CACHE_FILE", "telegram_media.json")
+        # Outbox of rendered messages with per-recipient delivery state, so a later run
+        # (or --drain) delivers what a failed run could not (set outbox_file to None to
+        # keep it in memory). It holds chat IDs: never commit it to a public repository. Deliveries are sent in
+        # batches and retried with exponential backoff; repeated error notifications
+        # of one type are merged for outbox_error_window seconds.
+        self.outbox_file = os.environ.get("TELEGRAM_OUTBOX_FILE", "telegram_outbox.sqlite3")
+        self.outbox_batch_size = 50
+        self.outbox_max_attempts = 8
+        self.outbox_retry_base = 60.0
+        self.outbox_retry_max = 6 * 3600.0
+        self.outbox_error_window = 3600.0
+        self.outbox_retention_days = 30
+        
+        # Watch mode polling (seconds); the rollover is the last archived sale end
+        self.store_timezone = "America/Los_Angeles"
+        self.watch_fast_interval = 15.0
+        self.watch_late_interval = 120.0
+        self.watch_slow_interval = 1800.0
+        self.watch_window_before = 10 * 60
+        self.watch_window_after = 2 * 3600
+        self.watch_late_period = 24 * 3600
         
     def is_telegram_configured(self) -> bool:
         """Check if Telegram credentials are available."""
         return bool(self.telegram_bot_token and self.telegram_chat_id)
     
+    def load_broadcast_chat_ids(self) -> List[str]:
+        """
+        Read broadcast recipients from telegram_broadcast_file: one chat ID per line,
+        blank lines and '#' comments ignored, duplicates dropped (first one wins).
+        """
+        if not self.telegram_broadcast_file:
+            return []
+        
+        chat_ids = []
+        seen = set()
+        with open(self.telegram_broadcast_file, "r", encoding="utf-8") as f:
+            for line in f:
+                chat_id = line.split("#", 1)[0].strip()
+                if chat_id and chat_id not in seen:
+                    seen.add(chat_id)
+                    chat_ids.append(chat_id)
+        return chat_ids
+    
     def get_random_greeting(self) -> str:
         """Get a random Friday greeting."""
         return random.choice(self.FRIDAY_GREETINGS)
@@ -84,11 +191,24 @@ class MessageFormatter:
             f'with the code "<code>{asset_data["code"]}</code>".\n'
             f'Also, 50% off publisher assets:\n'
             f'{asset_data["publisher_url"]}\n'
+            f'{self.format_catalog_summary(asset_data.get("catalog"))}'
             f'{asset_data["end_date"]}\n\n'
             f'Enjoy!!'
         )
         return message
     
+    def format_catalog_summary(self, catalog: Optional[Dict]) -> str:
+        """Lines describing the publisher's discounted catalog, or nothing if there is none."""
+        if not catalog or not catalog.get("discounted"):
+            return ""
+        lines = [f'🛒 {catalog["discounted"]} of {catalog["packages"]} assets discounted, '
+                 f'up to {catalog["max_discount"]}% off\n']
+        for item in catalog.get("top", []):
+            symbol = "$" if item.get("currency") in (None, "USD") else f'{item["currency"]} '
+            was = f'{symbol}{item["original_price"]:.2f} → ' if item.get("original_price") else ""
+            lines.append(f'• {html.escape(item["name"])} — {was}{symbol}{item["price"]:.2f}\n')
+        return "".join(lines)
+    
     def format_error_message(self, error_type: str, error_details: str, include_timestamp: bool = True) -> str:
         """Format an error notification message."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC") if include_timestamp else ""
@@ -103,6 +223,268 @@ class MessageFormatter:
             error_message += f"<i>Time: {timestamp}</i>"
         
         return error_message
+    
+    def format_repeat_note(self, occurrences: int, since: float) -> str:
+        """Note appended to an error notification that stands for several occurrences."""
+        first = datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        return f"\n<i>Occurred {occurrences} times since {first}.</i>"
+
+
+# =============================================================================
+# INSTRUMENTATION CLASSES
+# =============================================================================
+
+class PhaseTimings:
+    """
+    Collects wall-clock samples per pipeline phase (Single Responsibility Principle).
+    Summarises each phase with tail-latency percentiles over the most recent
+    MAX_SAMPLES samples, so a long-running process stays bounded.
+    """
+    
+    MAX_SAMPLES = 2048
+    
+    def __init__(self):
+        self.samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, phase: str, seconds: float):
+        """Record one sample for a phase."""
+        with self._lock:
+            samples = self.samples.get(phase)
+            if samples is None:
+                samples = self.samples[phase] = deque(maxlen=self.MAX_SAMPLES)
+            samples.append(seconds)
+    
+    @contextmanager
+    def measure(self, phase: str):
+        """Time the enclosed block as one sample of the phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+    
+    @staticmethod
+    def _percentile(ordered: List[float], pct: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+    
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Return count, total and p50/p95/p99/max (milliseconds) per phase."""
+        with self._lock:
+            snapshot = {phase: sorted(values) for phase, values in self.samples.items()}
+        
+        return {
+            phase: {
+                "count": len(values),
+                "total_ms": sum(values) * 1000,
+                "p50_ms": self._percentile(values, 50) * 1000,
+                "p95_ms": self._percentile(values, 95) * 1000,
+                "p99_ms": self._percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+            for phase, values in snapshot.items()
+        }
+    
+    def format_report(self) -> str:
+        """Format the report as a fixed-width table."""
+        lines = [f"{'phase':<28}{'count':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for phase, stats in self.report().items():
+            lines.append(
+                f"{phase:<28}{stats['count']:>6}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+
+class _NullSpan:
+    """Span stand-in handed out when metrics are disabled; attributes are dropped."""
+    
+    def __setitem__(self, key, value):
+        pass
+    
+    def update(self, *args, **kwargs):
+        pass
+
+
+class Metrics:
+    """
+    Run instrumentation (Single Responsibility Principle).
+    Every span feeds the PhaseTimings percentiles; when enabled, spans also keep
+    their attributes (bytes, status, retries, node counts...) and counters are
+    recorded for the JSON run report and the Prometheus textfile (the most recent
+    MAX_SPANS spans are kept). Disabled, a span costs two clock reads and counters
+    are no-ops.
+    """
+    
+    PROMETHEUS_PREFIX = "unity_scraper"
+    NULL_SPAN = _NullSpan()
+    MAX_SPANS = 4096
+    
+    def __init__(self, enabled: bool = False, timings: Optional[PhaseTimings] = None,
+                 profile_path: Optional[str] = None):
+        self.enabled = enabled
+        self.timings = timings or PhaseTimings()
+        self.spans: deque = deque(maxlen=self.MAX_SPANS)
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.profile_path = profile_path
+        self._profiler = None
+        self._profile_lock = threading.Lock()
+        if profile_path:
+            import cProfile
+            self._profiler = cProfile.Profile()
+    
+    @contextmanager
+    def span(self, phase: str, **attrs):
+        """
+        Time the enclosed block as one sample of the phase. Yields a dict-like
+        object the block can add attributes to; an escaping exception is recorded.
+        """
+        start = time.perf_counter()
+        if not self.enabled:
+            try:
+                yield self.NULL_SPAN
+            finally:
+                self.timings.add(phase, time.perf_counter() - start)
+            return
+        
+        record = dict(attrs)
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            self.timings.add(phase, end - start)
+            with self._lock:
+                self.spans.append({
+                    "phase": phase,
+                    "thread": threading.current_thread().name,
+                    "start_ms": round((start - self._origin) * 1000, 3),
+                    "duration_ms": round((end - start) * 1000, 3),
+                    "attrs": record,
+                })
+    
+    def count(self, name: str, value: float = 1, **labels):
+        """Add to a counter, keyed by name and labels."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v).lower() if isinstance(v, bool) else str(v))
+                                  for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def gauge(self, name: str, value: float):
+        """Set a gauge to its latest value."""
+        if self.enabled:
+            self.gauges[name] = value
+    
+    @contextmanager
+    def profile(self):
+        """
+        Run the enclosed block under cProfile if a profile dump was requested.
+        Blocks running concurrently in other threads are not profiled.
+        """
+        if self._profiler is None or not self._profile_lock.acquire(blocking=False):
+            yield
+            return
+        self._profiler.enable()
+        try:
+            yield
+        finally:
+            self._profiler.disable()
+            self._profile_lock.release()
+    
+    def report(self) -> Dict:
+        """Run report: span list, counters, gauges and per-phase percentiles."""
+        with self._lock:
+            spans = list(self.spans)
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "duration_s": round(time.perf_counter() - self._origin, 4),
+            "gauges": dict(self.gauges),
+            "counters": counters,
+            "phases": self.timings.report(),
+            "spans": spans,
+        }
+    
+    @staticmethod
+    def _labels(labels: Iterable) -> str:
+        """Render a Prometheus label set, escaping values."""
+        parts = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}" if parts else ""
+    
+    @staticmethod
+    def _metric_name(name: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    
+    def format_prometheus(self) -> str:
+        """Render phases, counters and gauges in the Prometheus text exposition format."""
+        prefix = self.PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_phase_seconds Time spent per pipeline phase in the last run.",
+            f"# TYPE {prefix}_phase_seconds summary",
+        ]
+        for phase, stats in sorted(self.timings.report().items()):
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                labels = self._labels((("phase", phase), ("quantile", quantile)))
+                lines.append(f"{prefix}_phase_seconds{labels} {stats[key] / 1000:.6f}")
+            labels = self._labels((("phase", phase),))
+            lines.append(f"{prefix}_phase_seconds_sum{labels} {stats['total_ms'] / 1000:.6f}")
+            lines.append(f"{prefix}_phase_seconds_count{labels} {stats['count']}")
+        
+        with self._lock:
+            counters = sorted(self.counters.items())
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{self._metric_name(name)}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{self._labels(labels)} {value:g}")
+        
+        gauges = dict(self.gauges)
+        gauges.setdefault("run_timestamp_seconds", self.started_at)
+        gauges["run_duration_seconds"] = time.perf_counter() - self._origin
+        for name, value in sorted(gauges.items()):
+            metric = f"{prefix}_{self._metric_name(name)}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        """Replace path in one step, as textfile collectors may read it at any time."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    
+    def write_json(self, path: str):
+        """Write the run report as JSON."""
+        self._write_atomic(path, json.dumps(self.report(), indent=2, ensure_ascii=False))
+    
+    def write_prometheus(self, path: str):
+        """Write the Prometheus textfile (e.g. for node_exporter's textfile collector)."""
+        self._write_atomic(path, self.format_prometheus())
+    
+    def dump_profile(self) -> Optional[str]:
+        """Write the collected parse profile (pstats format), if profiling was on."""
+        if self._profiler is None:
+            return None
+        self._profiler.dump_stats(self.profile_path)
+        return self.profile_path
 
 
 # =============================================================================
@@ -112,36 +494,223 @@ class MessageFormatter:
 class ArchiveService:
     """
     Manages historical archive of scraped assets (Single Responsibility Principle).
-    Saves data to yearly JSON files with automatic rotation.
+    Appends entries to yearly JSON Lines files (assets_archive_<year>.jsonl), one
+    fsync'd line per asset, so a write costs O(1) and a killed job can at worst
+    leave a torn last line, which is ignored on read and cut off on the next append.
+    Legacy yearly JSON files are migrated once and can still be exported.
     """
     
-    def __init__(self, config: Config, archive_dir: str = "."):
+    def __init__(self, config: Config, archive_dir: str = ".", metrics: Optional[Metrics] = None):
         self.config = config
         self.archive_dir = archive_dir
+        self.metrics = metrics or Metrics()
+        self._index = None
+    
+    def _get_archive_filename(self, year: Optional[int] = None) -> str:
+        """Get the archive filename for a year (the current year by default)."""
+        year = year or datetime.now().year
+        return f"{self.archive_dir}/assets_archive_{year}.jsonl"
+    
+    def _get_legacy_filename(self, year: int) -> str:
+        """Get the legacy JSON archive filename for a year."""
+        return f"{self.archive_dir}/assets_archive_{year}.json"
+    
+    def available_years(self) -> List[int]:
+        """Years that have an archive, in either format."""
+        years = set()
+        for name in os.listdir(self.archive_dir):
+            match = re.fullmatch(r"assets_archive_(\d{4})\.jsonl?", name)
+            if match:
+                years.add(int(match.group(1)))
+        return sorted(years)
+    
+    @staticmethod
+    def _fsync_dir(directory: str):
+        """Persist a directory entry (new or renamed file); not supported on Windows."""
+        if sys.platform == "win32":
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
     
-    def _get_archive_filename(self) -> str:
-        """Get the archive filename for the current year."""
-        current_year = datetime.now().year
-        return f"{self.archive_dir}/assets_archive_{current_year}.json"
+    def _write_atomic(self, path: str, data: bytes):
+        """Replace a file in one step so readers see either the old or the new content."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_dir(os.path.dirname(os.path.abspath(path)))
     
-    def save_asset(self, asset_data: Dict[str, str]) -> bool:
+    @staticmethod
+    def _repair_tail(path: str):
+        """Cut off a torn last line left by an interrupted append."""
+        with open(path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            chunk_start = max(0, size - 65536)
+            f.seek(chunk_start)
+            chunk = f.read()
+            last_newline = chunk.rfind(b"\n")
+            f.truncate(chunk_start + last_newline + 1 if last_newline >= 0 else 0)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _get_catalog_filename(self, year: Optional[int] = None) -> str:
+        """Get the publisher catalog records filename for a year (the current year by default)."""
+        year = year or datetime.now().year
+        return f"{self.archive_dir}/publisher_catalog_{year}.jsonl"
+    
+    def _append_entry(self, path: str, entry: Dict[str, str]) -> int:
+        """Append one entry as a single write and fsync it. Returns the bytes written."""
+        return self._append_lines(path, [entry])
+    
+    def _append_lines(self, path: str, entries: List[Dict]) -> int:
+        """Append entries as a single write and fsync it. Returns the bytes written."""
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+        created = not os.path.exists(path)
+        if not created:
+            self._repair_tail(path)
+        
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if created:
+            self._fsync_dir(os.path.dirname(os.path.abspath(path)))
+        return len(data)
+    
+    def latest_entry(self) -> Optional[Dict[str, str]]:
+        """The most recently archived entry across all years, if any."""
+        for year in reversed(self.available_years()):
+            entries = self.load_entries(year)
+            if entries:
+                return entries[-1]
+        return None
+    
+    def load_entries(self, year: Optional[int] = None) -> List[Dict[str, str]]:
+        """Load all entries for a year, skipping a torn last line."""
+        year = year or datetime.now().year
+        path = self._get_archive_filename(year)
+        if not os.path.exists(path):
+            legacy_path = self._get_legacy_filename(year)
+            if os.path.exists(legacy_path):
+                with open(legacy_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            return []
+        
+        entries = []
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    entries.append(json.loads(line))
+        return entries
+    
+    def migrate_legacy(self, remove_legacy: bool = True) -> List[int]:
         """
-        Save asset data to the yearly archive file.
-        Returns True if successful, False otherwise.
+        Convert legacy assets_archive_<year>.json files that have no .jsonl
+        counterpart yet. Returns the migrated years.
+        """
+        migrated = []
+        for year in self.available_years():
+            legacy_path = self._get_legacy_filename(year)
+            path = self._get_archive_filename(year)
+            if not os.path.exists(legacy_path) or os.path.exists(path):
+                continue
+            
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            self._write_atomic(path, data.encode("utf-8"))
+            if remove_legacy:
+                os.remove(legacy_path)
+            print(f"📦 Migrated {len(entries)} entries from {legacy_path} to {path}")
+            migrated.append(year)
+        return migrated
+    
+    def export_legacy(self, year: int, output_path: Optional[str] = None) -> str:
+        """Write a year's archive in the legacy JSON list format. Returns the path."""
+        output_path = output_path or self._get_legacy_filename(year)
+        data = json.dumps(self.load_entries(year), indent=2, ensure_ascii=False)
+        self._write_atomic(output_path, data.encode("utf-8"))
+        return output_path
+    
+    def apply_corrections(self, year: int, corrections: List[tuple]) -> int:
+        """
+        Rewrite a year's archive with corrected entries. corrections holds
+        (position, original entry, corrected entry) tuples; an entry that no longer
+        matches its original (e.g. edited meanwhile) is left alone. Returns the
+        number of entries replaced.
         """
-        import json
-        from pathlib import Path
+        self.migrate_legacy()
+        entries = self.load_entries(year)
+        applied = 0
+        for position, original, corrected in corrections:
+            if position < len(entries) and entries[position] == original:
+                entries[position] = corrected
+                applied += 1
+        if not applied:
+            return 0
         
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with self.metrics.span("archive:rewrite", year=year) as span:
+            self._write_atomic(self._get_archive_filename(year), data.encode("utf-8"))
+            span["bytes"] = len(data)
+        try:
+            if self._index is None:
+                self._index = ArchiveIndex(self)
+            self._index.reindex_year(year)
+        except Exception as e:
+            print(f"Warning: could not update archive index: {e}")
+        return applied
+    
+    def get_index(self) -> "ArchiveIndex":
+        """Open (once) and sync the persistent archive index."""
+        if self._index is None:
+            self._index = ArchiveIndex(self)
+        self._index.sync()
+        return self._index
+    
+    def _update_index(self):
+        """Index a new entry; the archive stays authoritative if this fails."""
+        try:
+            self.get_index()
+        except Exception as e:
+            print(f"Warning: could not update archive index: {e}")
+    
+    def append_catalog(self, records: List[Dict]) -> int:
+        """
+        Append a batch of publisher catalog records to publisher_catalog_<year>.jsonl
+        (kept apart from the promotion archive). Returns the bytes written.
+        """
+        if not records:
+            return 0
+        with self.metrics.span("archive:catalog", records=len(records)) as span:
+            span["bytes"] = written = self._append_lines(self._get_catalog_filename(), records)
+        return written
+    
+    def save_asset(self, asset_data: Dict[str, str], snapshots: Optional[Dict[str, Dict[str, str]]] = None,
+                   source: Optional[str] = None) -> bool:
+        """
+        Save asset data to the yearly archive file, with the name of the source it
+        came from and references to the page snapshots it was parsed from, if any.
+        Returns True if successful, False otherwise.
+        """
         try:
+            self.migrate_legacy()
             archive_file = self._get_archive_filename()
             
-            # Load existing data or create new list
-            if Path(archive_file).exists():
-                with open(archive_file, 'r', encoding='utf-8') as f:
-                    archive = json.load(f)
-            else:
-                archive = []
-            
             # Add timestamp to the entry
             entry = {
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -151,15 +720,17 @@ class ArchiveService:
                 "publisher_url": asset_data["publisher_url"],
                 "end_date": asset_data["end_date"]
             }
+            if source:
+                entry["source"] = source
+            if snapshots:
+                entry["snapshots"] = snapshots
             
-            # Append new entry
-            archive.append(entry)
-            
-            # Save back to file
-            with open(archive_file, 'w', encoding='utf-8') as f:
-                json.dump(archive, f, indent=2, ensure_ascii=False)
+            with self.metrics.span("archive:append") as span:
+                span["bytes"] = self._append_entry(archive_file, entry)
             
             print(f"📦 Asset archived to {archive_file}")
+            with self.metrics.span("archive:index"):
+                self._update_index()
             return True
             
         except Exception as e:
@@ -168,264 +739,2935 @@ class ArchiveService:
 
 
 # =============================================================================
-# ASSET PARSER CLASS
+# ARCHIVE INDEX CLASS
 # =============================================================================
 
-class AssetParser:
+class ArchiveIndex:
     """
-    Parses HTML content to extract asset information (Single Responsibility Principle).
+    Persistent SQLite index over every yearly archive (Single Responsibility Principle).
+    Indexes publisher ID, package ID, coupon code, normalized end date and asset
+    name tokens. Each archive file is tracked by byte offset and a hash of the
+    bytes before it, so sync() only reads lines appended since the last sync, and
+    a file rewritten underneath the index is read again from the start.
     """
     
-    @staticmethod
-    def parse_coupon_code(text: str) -> Optional[str]:
-        """Extract coupon code from text."""
-        match = re.search(r"coupon code\s+([A-Z0-9]+)", text, re.IGNORECASE)
-        return match.group(1) if match else None
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            year INTEGER PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            prefix_sha256 TEXT
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            timestamp TEXT,
+            name TEXT,
+            url TEXT,
+            code TEXT,
+            publisher_url TEXT,
+            end_date TEXT,
+            publisher_id TEXT,
+            package_id TEXT,
+            end_date_norm TEXT,
+            sale_sha256 TEXT,
+            raw TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_publisher ON entries (publisher_id);
+        CREATE INDEX IF NOT EXISTS entries_package ON entries (package_id);
+        CREATE INDEX IF NOT EXISTS entries_code ON entries (code COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS entries_end_date ON entries (end_date_norm);
+        CREATE INDEX IF NOT EXISTS entries_year ON entries (year);
+        CREATE TABLE IF NOT EXISTS name_tokens (
+            token TEXT NOT NULL,
+            entry_id INTEGER NOT NULL,
+            PRIMARY KEY (token, entry_id)
+        ) WITHOUT ROWID;
+    """
     
-    @staticmethod
-    def parse_sale_end_date(text: str) -> Optional[str]:
-        """Extract sale end date from text."""
-        # Try specific phrase first
-        date_match = re.search(r"Sale and related free asset promotion end\s+(.*?)(?=\.|$)", text, re.IGNORECASE)
-        if not date_match:
-            # Fallback
-            date_match = re.search(r"(Sale ends|Ends)[:\s]+(.*?)(?=\.|$|Terms)", text, re.IGNORECASE)
+    def __init__(self, archive: "ArchiveService", path: Optional[str] = None):
+        import sqlite3
         
-        if date_match:
-            raw_date = date_match.group(1 if date_match.re.groups == 1 else 2).strip()
-            return f"* Sale and related free asset promotion end {raw_date}."
-        return None
+        self.archive = archive
+        self.path = path or os.path.join(archive.archive_dir, "archive_index.sqlite3")
+        # Ledger checks run on source scheduler threads; PromotionLedger serializes them
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(self.SCHEMA)
+        # Indexes built before prefixes and sale pages were hashed lack the columns:
+        # add them and let sync() read every year again to fill them in
+        with self.db:
+            if "prefix_sha256" not in {row["name"] for row in self.db.execute("PRAGMA table_info(sources)")}:
+                self.db.execute("ALTER TABLE sources ADD COLUMN prefix_sha256 TEXT")
+            if "sale_sha256" not in {row["name"] for row in self.db.execute("PRAGMA table_info(entries)")}:
+                self.db.execute("ALTER TABLE entries ADD COLUMN sale_sha256 TEXT")
+                for table in ("name_tokens", "entries", "sources"):
+                    self.db.execute(f"DELETE FROM {table}")
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_sale_page ON entries (sale_sha256)")
     
-    @staticmethod
-    def _ensure_absolute_url(url: str) -> str:
-        """Ensure the URL is absolute."""
-        if not url:
-            return ""
-        if url.startswith("http"):
-            return url
-        return "https://assetstore.unity.com" + (url if url.startswith("/") else "/" + url)
-
-    @staticmethod
-    def find_asset_link(soup: BeautifulSoup, asset_title: str = None) -> Optional[str]:
-        """Find the asset URL from the page."""
-        # 1. Try to find "Get your gift" button - checking nested text and case-insensitive
-        for a in soup.find_all("a", href=True):
-            text = a.get_text().lower()
-            if "get your" in text and ("gift" in text or "free" in text):
-                return AssetParser._ensure_absolute_url(a['href'])
-        
-        # 2. If asset_title is provided, search for a link containing that title
-        if asset_title:
-            # Look for links containing /packages/ and matching title
-            for a in soup.find_all("a", href=lambda h: h and "/packages/" in h):
-                if asset_title.lower() in a.get_text().lower():
-                    return AssetParser._ensure_absolute_url(a['href'])
-        
-        # 3. Fallback: only if we have nothing else, look for any package link
-        # But prioritize those that aren't obviously common ones
-        link = soup.find("a", href=lambda h: h and "/packages/" in h)
-        if link:
-            return AssetParser._ensure_absolute_url(link['href'])
-            
-        return None
+    def _drop_year(self, year: int):
+        self.db.execute("DELETE FROM name_tokens WHERE entry_id IN (SELECT id FROM entries WHERE year = ?)", (year,))
+        self.db.execute("DELETE FROM entries WHERE year = ?", (year,))
+        self.db.execute("DELETE FROM sources WHERE year = ?", (year,))
     
-    @staticmethod
-    def find_publisher_url(soup: BeautifulSoup) -> Optional[str]:
-        """Find the publisher URL from the asset page."""
-        # Look for publisher link in the main asset info section
-        # Unity usually has a specific layout for this
-        pub_link = soup.find("a", href=lambda h: h and "/publishers/" in h)
+    def _add(self, year: int, entry: Dict[str, str]):
+        cursor = self.db.execute(
+            "INSERT INTO entries (year, timestamp, name, url, code, publisher_url, end_date,"
+            " publisher_id, package_id, end_date_norm, sale_sha256, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                year, entry.get("timestamp"), entry.get("name"), entry.get("url"), entry.get("code"),
+                entry.get("publisher_url"), entry.get("end_date"),
+                AssetParser.parse_publisher_id(entry.get("publisher_url")),
+                AssetParser.parse_package_id(entry.get("url")),
+                AssetParser.normalize_end_date(entry.get("end_date")),
+                (entry.get("snapshots") or {}).get("publisher-sale", {}).get("sha256"),
+                json.dumps(entry, ensure_ascii=False),
+            )
+        )
+        self.db.executemany(
+            "INSERT OR IGNORE INTO name_tokens (token, entry_id) VALUES (?, ?)",
+            [(token, cursor.lastrowid) for token in AssetParser.tokenize_name(entry.get("name"))]
+        )
+    
+    def _sync_year(self, year: int, from_start: bool = False) -> int:
+        """
+        Index lines appended to a year's archive since the last sync. If the bytes
+        already indexed changed (a re-parse, corrections pulled from another
+        machine, a re-run migration or export) or a new line does not decode, the
+        year is indexed again from the start.
+        """
+        path = self.archive._get_archive_filename(year)
+        if not os.path.exists(path):
+            return 0
         
-        # Try to find one that is NOT just a random link (e.g. avoid footer)
-        # Usually the publisher link is near the asset title or has a specific class
-        # But a general search is okay if we are on the correct asset page.
-        if pub_link:
-            return AssetParser._ensure_absolute_url(pub_link['href'])
-        return None
+        row = self.db.execute("SELECT offset, prefix_sha256 FROM sources WHERE year = ?", (year,)).fetchone()
+        offset = row["offset"] if row and not from_start else 0
+        added = 0
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read(offset))
+            if from_start or (offset and digest.hexdigest() != row["prefix_sha256"]):
+                self._drop_year(year)
+                offset, digest = 0, hashlib.sha256()
+                f.seek(0)
+            resumed = offset > 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        if resumed:
+                            return self._sync_year(year, from_start=True)
+                        print(f"Warning: skipping unreadable line at byte {offset} of {path}")
+                        entry = None
+                    if entry is not None:
+                        self._add(year, entry)
+                        added += 1
+                offset += len(line)
+                digest.update(line)
+        self.db.execute("INSERT OR REPLACE INTO sources (year, offset, prefix_sha256) VALUES (?, ?, ?)",
+                        (year, offset, digest.hexdigest()))
+        return added
+    
+    def sync(self) -> int:
+        """Bring the index up to date with every archive file. Returns new entries."""
+        with self.db:
+            return sum(self._sync_year(year) for year in self.archive.available_years())
+    
+    def reindex_year(self, year: int) -> int:
+        """Re-read one year from the start, e.g. after its file was rewritten in place."""
+        with self.db:
+            self._drop_year(year)
+            return self._sync_year(year)
+    
+    def rebuild(self) -> int:
+        """Drop and re-index everything."""
+        with self.db:
+            for table in ("name_tokens", "entries", "sources"):
+                self.db.execute(f"DELETE FROM {table}")
+        return self.sync()
+    
+    def query(self, publisher: Optional[str] = None, package: Optional[str] = None,
+              code: Optional[str] = None, end_date: Optional[str] = None,
+              name: Optional[str] = None, year: Optional[int] = None,
+              sale_page: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Return archive entries matching every given filter, oldest first.
+        publisher and package accept IDs or full URLs; end_date accepts YYYY-MM-DD or
+        any date sentence; name matches entries containing all of its tokens;
+        sale_page is the SHA-256 of the sale page snapshot an entry was parsed from.
+        """
+        clauses, params = [], []
+        if publisher:
+            clauses.append("e.publisher_id = ?")
+            params.append(AssetParser.parse_publisher_id(publisher) or publisher)
+        if package:
+            clauses.append("e.package_id = ?")
+            params.append(AssetParser.parse_package_id(package) or package)
+        if code:
+            clauses.append("e.code = ? COLLATE NOCASE")
+            params.append(code)
+        if end_date:
+            clauses.append("e.end_date_norm = ?")
+            params.append(AssetParser.normalize_end_date(end_date) or end_date)
+        if year:
+            clauses.append("e.year = ?")
+            params.append(year)
+        if sale_page:
+            clauses.append("e.sale_sha256 = ?")
+            params.append(sale_page)
+        for token in AssetParser.tokenize_name(name):
+            clauses.append("e.id IN (SELECT entry_id FROM name_tokens WHERE token = ?)")
+            params.append(token)
+        
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        rows = self.db.execute(f"SELECT e.raw FROM entries e{where} ORDER BY e.year, e.id", params)
+        return [json.loads(row["raw"]) for row in rows]
+    
+    def close(self):
+        self.db.close()
 
 
 # =============================================================================
-# ASSET SCRAPER CLASS
+# HTTP CLIENT CLASSES
 # =============================================================================
 
-class AssetScraper:
+class FetchedPage:
     """
-    Handles web scraping operations (Single Responsibility Principle).
-    Uses AssetParser for parsing logic (Dependency Inversion Principle).
+    Body and provenance of a successfully fetched page.
+    body_hash identifies the content regardless of where it came from.
     """
     
-    def __init__(self, config: Config, parser: AssetParser):
-        self.config = config
-        self.parser = parser
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+    def __init__(self, url: str, status_code: int, content: bytes, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+        self.body_hash = hashlib.sha256(content).hexdigest()
+
+
+class HttpCache:
+    """
+    Persistent conditional-request cache (Single Responsibility Principle).
+    Stores bodies with their ETag/Last-Modified validators so unchanged pages are
+    revalidated with a 304, and stores parse results keyed by body hash so an
+    unchanged page is never parsed twice. Evicts by total size and by age.
+    """
     
-    def _make_request(self, url: str) -> Optional[BeautifulSoup]:
-        """Make HTTP request and return BeautifulSoup object."""
+    def __init__(self, cache_dir: str, max_bytes: int = 50 * 1024 * 1024, max_age_days: float = 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "http"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "parsed"), exist_ok=True)
+    
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.cache_dir, *parts)
+    
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """Write via a temporary file so readers never see a partial entry."""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return the stored metadata for a URL, if its body is still on disk."""
+        key = self._key(url)
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return BeautifulSoup(response.content, "html.parser")
-        except Exception as e:
-            print(f"Error fetching URL {url}: {e}")
+            with open(self._path("http", key + ".json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._path("http", key + ".body")):
             return None
+        return meta
     
-    def scrape(self) -> Optional[Dict[str, str]]:
+    def conditional_headers(self, meta: Optional[Dict]) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers from stored validators."""
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+    
+    def load_body(self, url: str) -> Optional[bytes]:
+        """Read the stored body for a URL and mark the entry as recently used."""
+        key = self._key(url)
+        path = self._path("http", key + ".body")
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            # Both files: eviction must not take the validators of an entry in use
+            os.utime(path)
+            os.utime(self._path("http", key + ".json"))
+            return body
+        except OSError:
+            return None
+    
+    def store(self, url: str, response) -> None:
+        """Store a 200 response body with its validators."""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            # Without validators the entry could never be revalidated
+            return
+        
+        key = self._key(url)
+        with self._lock:
+            self._write_atomic(self._path("http", key + ".body"), response.content)
+            meta = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "stored_at": time.time(),
+                "size": len(response.content),
+            }
+            self._write_atomic(self._path("http", key + ".json"), json.dumps(meta).encode("utf-8"))
+        self.evict()
+    
+    def get_parsed(self, kind: str, body_hash: str) -> Optional[Dict]:
+        """Return a stored parse result for a page body."""
+        path = self._path("parsed", f"{kind}-{body_hash}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+            return data
+        except (OSError, ValueError):
+            return None
+    
+    def put_parsed(self, kind: str, body_hash: str, data: Dict) -> None:
+        """Store a parse result for a page body."""
+        path = self._path("parsed", f"{kind}-{body_hash}.json")
+        with self._lock:
+            self._write_atomic(path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+    
+    def evict(self) -> int:
         """
-        Scrape the Unity Asset Store for the weekly free asset.
-        Returns a dictionary with asset details or None if failed.
+        Drop entries older than max_age, then least recently used entries until the
+        cache fits in max_bytes. Returns the number of files removed.
         """
-        print(f"Scraping URL: {self.config.publisher_sale_url}")
-        soup = self._make_request(self.config.publisher_sale_url)
+        now = time.time()
+        entries = []
+        for sub in ("http", "parsed"):
+            directory = self._path(sub)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
         
-        if not soup:
-            return None
+        removed = 0
+        total = sum(size for _, size, _ in entries)
+        with self._lock:
+            for mtime, size, path in sorted(entries):
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                    total -= size
+                except OSError:
+                    pass
+        return removed
+
+
+class HttpClient:
+    """
+    Pooled HTTP transport (Single Responsibility Principle).
+    Reuses keep-alive connections, applies connect/read timeouts and retries
+    5xx/429 responses with jittered exponential backoff (POSTs only when they
+    cannot have been delivered). With an HttpCache,
+    page fetches are conditional and 304s are served from disk.
+    """
+    
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    
+    def __init__(self, config: Config, headers: Optional[Dict[str, str]] = None,
+                 metrics: Optional[Metrics] = None, max_workers: int = 4,
+                 cache: Optional[HttpCache] = None):
+        self.config = config
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.timings = self.metrics.timings
+        self.timeout = (config.http_connect_timeout, config.http_read_timeout)
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
         
-        # Initialize default values
-        asset_title = "Unknown Asset"
-        asset_url = self.config.publisher_sale_url
-        coupon_code = "Unknown Code"
-        publisher_url = self.config.publisher_sale_url
-        sale_end_date = "Unknown Date"
+        import requests
+        
+        # Retries are handled here, so the adapter itself must not retry
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=config.http_pool_size,
+            pool_maxsize=config.http_pool_size,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+    
+    def _backoff_delay(self, attempt: int, response=None) -> float:
+        """Delay before the next attempt: Retry-After if given, else full-jitter exponential."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.strip().isdigit():
+            return min(float(retry_after), self.config.http_backoff_max)
+        ceiling = min(self.config.http_backoff_max, self.config.http_backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+    
+    def request(self, method: str, url: str, phase: str = "http",
+                retry_statuses: Optional[frozenset] = None, **kwargs):
+        """
+        Send a request, retrying connection errors, timeouts and 5xx/429 responses
+        (or the given retry_statuses). A POST is only retried when it cannot have
+        reached the server (connection errors, connect timeouts): after a read
+        timeout or a 5xx it may have taken effect, so retrying could repeat it.
+        Returns the final response, which may still carry an error status.
+        """
+        import requests
+        
+        max_retries = self.config.http_max_retries
+        idempotent = method.upper() != "POST"
+        if retry_statuses is None:
+            retry_statuses = self.RETRY_STATUSES if idempotent else frozenset()
+        # ConnectTimeout is a ConnectionError; ReadTimeout is not
+        retry_errors = (requests.ConnectionError, requests.Timeout) if idempotent else (requests.ConnectionError,)
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
         
-        # Search for coupon code in the page
-        found_coupon = False
-        for element in soup.find_all(string=True):
-            if "coupon code" in element.lower() or "use code" in element.lower():
-                parent = element.parent
-                text = parent.get_text(strip=True)
+        with self.metrics.span(phase, method=method, url=url) as span:
+            while True:
+                response = None
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    if response.status_code not in retry_statuses or attempt >= max_retries:
+                        self._record(span, phase, response, attempt)
+                        return response
+                    reason = f"HTTP {response.status_code}"
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= max_retries or not isinstance(e, retry_errors):
+                        span["retries"] = attempt
+                        self.metrics.count("http_errors", phase=phase, error=type(e).__name__)
+                        raise
+                    reason = type(e).__name__
                 
-                # Extract coupon code
-                code = self.parser.parse_coupon_code(text)
-                if code:
-                    coupon_code = code
-                    found_coupon = True
-                    
-                    # Try to find asset title
-                    container = parent.find_parent("div")
-                    
-                    # Try to find asset title - look in container then in siblings/parent
-                    title_tag = None
-                    search_scope = container
-                    for _ in range(3): # Look up to 3 levels up if title not found
-                        if not search_scope: break
-                        title_tag = search_scope.find(["h3", "h2", "h1"])
-                        if title_tag: break
-                        search_scope = search_scope.parent
-                        
-                    if title_tag:
-                        asset_title = title_tag.get_text(strip=True)
-                    
-                    # Try to find asset URL
-                    # Priority 1: Search in the container
-                    link_url = self.parser.find_asset_link(container, asset_title)
-                    
-                    # Priority 2: Search in the whole page but specifically for the title
-                    if not link_url:
-                        link_url = self.parser.find_asset_link(soup, asset_title)
-                    
-                    if link_url:
-                        asset_url = link_url
-                    
-                    # VALIDATION: If we have a title and a URL, check if they seem to match
-                    # (Prevent picking up a random "Featured" asset)
-                    if asset_title != "Unknown Asset" and "/packages/" in asset_url:
-                        url_slug = asset_url.split("/")[-1].split("-")
-                        # Simple check: at least one word from the title should be in the URL slug
-                        title_words = [w.lower() for w in re.findall(r'\w+', asset_title) if len(w) > 3]
-                        if title_words and not any(w in asset_url.lower() for w in title_words):
-                            print(f"WARNING: Asset title '{asset_title}' does not match URL '{asset_url}'. Resetting URL.")
-                            asset_url = self.config.publisher_sale_url # Reset to safe default
-                    
-                    # Extract sale end date
-                    page_text = soup.get_text(" ", strip=True)
-                    end_date = self.parser.parse_sale_end_date(page_text)
-                    if end_date:
-                        sale_end_date = end_date
-                    
-                    # Fetch publisher URL from asset page
-                    if asset_url and "/packages/" in asset_url:
-                        asset_soup = self._make_request(asset_url)
-                        if asset_soup:
-                            pub_url = self.parser.find_publisher_url(asset_soup)
-                            if pub_url:
-                                publisher_url = pub_url
-                    
-                    break
+                delay = self._backoff_delay(attempt, response)
+                attempt += 1
+                self.metrics.count("http_retries", phase=phase, reason=reason)
+                print(f"Retrying {url} in {delay:.2f}s ({reason}, attempt {attempt}/{max_retries})")
+                time.sleep(delay)
+    
+    def _record(self, span, phase: str, response, retries: int):
+        """Attach the final response's status, size and retry count to the request span."""
+        if not self.metrics.enabled:
+            return
+        size = len(response.content)
+        span.update(status=response.status_code, bytes=size, retries=retries)
+        self.metrics.count("http_requests", phase=phase, status=response.status_code)
+        self.metrics.count("http_response_bytes", size, phase=phase)
+    
+    def get(self, url: str, phase: str = "http", **kwargs):
+        """Send a GET request (see request)."""
+        return self.request("GET", url, phase, **kwargs)
+    
+    def post(self, url: str, phase: str = "http", **kwargs):
+        """Send a POST request (see request)."""
+        return self.request("POST", url, phase, **kwargs)
+    
+    def fetch(self, url: str, phase: str = "http") -> FetchedPage:
+        """
+        GET a page, revalidating any cached copy. Raises requests.HTTPError for
+        error statuses.
+        """
+        meta = self.cache.lookup(url) if self.cache else None
+        headers = self.cache.conditional_headers(meta) if self.cache else {}
+        response = self.get(url, phase, headers=headers)
         
-        if not found_coupon:
-            print("WARNING: Could not find 'coupon code' keyword in the page. The layout might have changed or is JS-rendered.")
-            print(f"Page Title: {soup.title.string if soup.title else 'No Title'}")
-            return None
+        if response.status_code == 304 and meta:
+            body = self.cache.load_body(url)
+            if body is not None:
+                self.metrics.count("http_cache_hits", phase=phase)
+                return FetchedPage(url, 200, body, from_cache=True)
+            # Body vanished under us: fetch unconditionally
+            response = self.get(url, phase)
         
-        return {
-            "name": asset_title,
-            "url": asset_url,
-            "code": coupon_code,
-            "publisher_url": publisher_url,
-            "end_date": sale_end_date
-        }
+        response.raise_for_status()
+        if self.cache and response.status_code == 200:
+            self.cache.store(url, response)
+        return FetchedPage(url, response.status_code, response.content)
+    
+    def prefetch(self, url: str, phase: str = "http") -> Future:
+        """Start a fetch in the background and return its Future."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="http")
+        return self._executor.submit(self.fetch, url, phase)
+    
+    def close(self):
+        """Release pooled connections and background workers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
 
 
 # =============================================================================
-# TELEGRAM SERVICE CLASS
+# SNAPSHOT STORE CLASS
 # =============================================================================
 
-class TelegramService:
+class SnapshotStore:
     """
-    Handles all Telegram communication (Single Responsibility Principle).
-    Depends on abstraction (Config) not concretions (Dependency Inversion Principle).
+    Content-addressed store of fetched pages (Single Responsibility Principle).
+    Each body is gzip-compressed under its SHA-256 (<root>/<2 hex>/<sha256>.html.gz),
+    so a page seen in many runs or by many entries is stored once. Archive entries
+    refer to their pages by URL and hash.
     """
     
-    def __init__(self, config: Config, formatter: MessageFormatter):
-        self.config = config
-        self.formatter = formatter
+    def __init__(self, root: str, metrics: Optional[Metrics] = None):
+        self.root = root
+        self.metrics = metrics or Metrics()
     
-    def _post_to_api(self, message: str) -> bool:
-        """Send a message to Telegram API."""
-        if not self.config.is_telegram_configured():
-            print("Error: Telegram credentials not found in environment variables.")
-            return False
-        
-        url = f"https://api.telegram.org/bot{self.config.telegram_bot_token}/sendMessage"
-        payload = {
-            "chat_id": self.config.telegram_chat_id,
-            "text": message,
-            "parse_mode": "HTML"
-        }
-        
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            return True
-        except Exception as e:
-            print(f"Error posting to Telegram API: {e}")
-            print(f"Response: {response.text if 'response' in locals() else 'N/A'}")
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + ".html.gz")
+    
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+    
+    def put(self, page: FetchedPage) -> Dict[str, str]:
+        """Store a page body unless it is already present. Returns its reference."""
+        path = self._path(page.body_hash)
+        stored = False
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # mtime=0 keeps the compressed file identical for identical bodies
+            data = gzip.compress(page.content, compresslevel=9, mtime=0)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            stored = True
+            self.metrics.count("snapshot_bytes", len(data))
+        self.metrics.count("snapshots", stored=stored)
+        return {"url": page.url, "sha256": page.body_hash}
+    
+    def load(self, ref: Dict[str, str]) -> FetchedPage:
+        """Read a stored page back. Raises ValueError if it does not match its hash."""
+        with open(self._path(ref["sha256"]), "rb") as f:
+            content = gzip.decompress(f.read())
+        page = FetchedPage(ref["url"], 200, content, from_cache=True)
+        if page.body_hash != ref["sha256"]:
+            raise ValueError(f"Snapshot {ref['sha256']} is corrupt")
+        return page
+
+
+# =============================================================================
+# PROMOTION LEDGER CLASS
+# =============================================================================
+
+class AlreadyPosted(Exception):
+    """Raised to stop a run once the current promotion is known to be handled."""
+    
+    def __init__(self, identity: str, reason: str):
+        super().__init__(f"Promotion {identity} already posted ({reason})")
+        self.identity = identity
+        self.reason = reason
+
+
+class PromotionLedger:
+    """
+    Decides whether this week's promotion was already handled (Single Responsibility Principle).
+    A promotion is identified by coupon code + package ID + normalized end date,
+    and counts as handled once it is in the archive. An unchanged sale page stops
+    the run right after the first fetch: its fingerprint (the body hash) is looked
+    up among the sale page snapshots the archive entries were parsed from, which
+    persist wherever the archive does, and in a small optional state file that
+    also covers runs without snapshots.
+    """
+    
+    MAX_FINGERPRINTS = 64
+    
+    def __init__(self, archive: ArchiveService, state_path: Optional[str] = None):
+        self.archive = archive
+        self.state_path = state_path
+        self.fingerprints: Dict[str, str] = {}
+        # Sources are scraped concurrently and all of them call check()
+        self._lock = threading.RLock()
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    self.fingerprints = json.load(f).get("fingerprints", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable ledger {state_path}: {e}")
+    
+    @staticmethod
+    def identity(asset_data: Dict[str, str]) -> str:
+        """Stable identity of a promotion: CODE|package ID|YYYY-MM-DD ('?' for unknown parts)."""
+        return "|".join((
+            (asset_data.get("code") or "?").upper(),
+            AssetParser.parse_package_id(asset_data.get("url")) or "?",
+            AssetParser.normalize_end_date(asset_data.get("end_date")) or "?",
+        ))
+    
+    @staticmethod
+    def fingerprint(page: FetchedPage) -> str:
+        """Cheap fingerprint of a fetched sale page."""
+        return page.body_hash
+    
+    def is_posted(self, identity: str) -> bool:
+        """Check whether the archive already holds this promotion."""
+        code, package_id, end_date = identity.split("|")
+        if code == "?":
             return False
+        with self._lock:
+            entries = self.archive.get_index().query(code=code)
+        return any(self.identity(entry) == identity for entry in entries)
+    
+    def check(self, page: FetchedPage, asset_data: Optional[Dict[str, str]] = None):
+        """
+        Gate for AssetScraper.scrape: raise AlreadyPosted if the page fingerprint or
+        the promotion identity is already known to be handled.
+        """
+        with self._lock:
+            self._check(page, asset_data)
+    
+    def _check(self, page: FetchedPage, asset_data: Optional[Dict[str, str]]):
+        if asset_data is None:
+            fingerprint = self.fingerprint(page)
+            archived = self.archive.get_index().query(sale_page=fingerprint)
+            if archived:
+                raise AlreadyPosted(self.identity(archived[-1]), "sale page unchanged")
+            identity = self.fingerprints.get(fingerprint)
+            if identity and self.is_posted(identity):
+                raise AlreadyPosted(identity, "sale page unchanged")
+            return
+        
+        identity = self.identity(asset_data)
+        if self.is_posted(identity):
+            self.remember(page, identity)
+            raise AlreadyPosted(identity, "already in archive")
+    
+    def remember(self, page: FetchedPage, identity: str):
+        """Record that this sale page belongs to a handled promotion."""
+        if not self.state_path:
+            return
+        with self._lock:
+            self._remember(page, identity)
+    
+    def _remember(self, page: FetchedPage, identity: str):
+        self.fingerprints.pop(self.fingerprint(page), None)
+        self.fingerprints[self.fingerprint(page)] = identity
+        while len(self.fingerprints) > self.MAX_FINGERPRINTS:
+            self.fingerprints.pop(next(iter(self.fingerprints)))
+        
+        tmp_path = self.state_path + ".tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprints": self.fingerprints}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+
+# =============================================================================
+# RATE LIMITING CLASSES
+# =============================================================================
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter (Single Responsibility Principle).
+    acquire() blocks until a token is available; pause() withholds tokens for a
+    while, e.g. to honour a Telegram retry_after.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Take a token if one is available, otherwise return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.updated:
+                # Paused
+                return self.updated - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+    
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+    
+    def pause(self, seconds: float):
+        """Withhold all tokens for the given number of seconds."""
+        with self._lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class BroadcastReport:
+    """
+    Per-recipient outcome of a Telegram broadcast.
+    Each result holds chat_id, ok, status, attempts, retry_after (total seconds
+    waited on 429s), elapsed, error, media ("text", "upload" or "file_id") and
+    uploaded_bytes, plus permanent (whether retrying is pointless) once drained.
+    """
+    
+    def __init__(self):
+        self.results: List[Dict] = []
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+    
+    def add(self, result: Dict):
+        with self._lock:
+            self.results.append(result)
+    
+    def finish(self):
+        self.finished = time.perf_counter()
+    
+    @property
+    def delivered(self) -> int:
+        return sum(1 for result in self.results if result["ok"])
+    
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.delivered
+    
+    def summary(self) -> Dict:
+        """Totals, throughput and throttling counts for the whole broadcast."""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "recipients": len(self.results),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "throttled": sum(1 for result in self.results if result["retry_after"]),
+            "uploaded_bytes": sum(result["uploaded_bytes"] for result in self.results),
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(self.delivered / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+    
+    def save(self, path: str):
+        """Write the summary and per-recipient results as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "results": self.results}, f, indent=2, ensure_ascii=False)
+
+
+# =============================================================================
+# ASSET PARSER CLASS
+# =============================================================================
+
+class AssetParser:
+    """
+    Parses HTML content to extract asset information (Single Responsibility Principle).
+    """
+    
+    # Bump whenever parsing logic changes so cached parse results are not reused
+    VERSION = "4"
+    
+    @staticmethod
+    def parse_coupon_code(text: str) -> Optional[str]:
+        """Extract coupon code from text."""
+        match = re.search(r"coupon code\s+([A-Z0-9]+)", text, re.IGNORECASE)
+        return match.group(1) if match else None
+    
+    SALE_END_RE = re.compile(r"Sale and related free asset promotion end\s+(.*?)(?=\.|$)", re.IGNORECASE)
+    SALE_ENDS_RE = re.compile(r"(Sale ends|Ends)[:\s]+(.*?)(?=\.|$|Terms)", re.IGNORECASE)
+    
+    @classmethod
+    def parse_sale_end_date(cls, text: str) -> Optional[str]:
+        """Extract sale end date from text."""
+        # A case-insensitive scan of a whole page is slow: find where a match could start first
+        # (unless lowercasing changed the length, and with it the offsets)
+        lowered = text.lower()
+        exact = len(lowered) == len(text)
+        
+        # Try specific phrase first
+        start = lowered.find("sale and related free asset promotion end") if exact else 0
+        date_match = cls.SALE_END_RE.search(text, start) if start >= 0 else None
+        if not date_match:
+            # Fallback
+            start = lowered.find("ends") if exact else 0
+            date_match = cls.SALE_ENDS_RE.search(text, max(0, start - len("sale "))) if start >= 0 else None
+        
+        if date_match:
+            raw_date = date_match.group(1 if date_match.re.groups == 1 else 2).strip()
+            return f"* Sale and related free asset promotion end {raw_date}."
+        return None
+    
+    @staticmethod
+    def normalize_end_date(text: str) -> Optional[str]:
+        """Reduce a sale end date sentence (e.g. 'January 8, 2026 at 7:59am PT') to YYYY-MM-DD."""
+        if not text:
+            return None
+        match = re.search(r"([A-Za-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})", text)
+        if not match:
+            return None
+        try:
+            month = datetime.strptime(match.group(1)[:3].title(), "%b").month
+            return datetime(int(match.group(3)), month, int(match.group(2))).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def parse_package_id(url: str) -> Optional[str]:
+        """Extract the numeric package ID from a /packages/...-<id> URL."""
+        match = re.search(r"/packages/\S*?-(\d+)(?:[/?#]|$)", url or "")
+        return match.group(1) if match else None
+    
+    @staticmethod
+    def parse_publisher_id(url: str) -> Optional[str]:
+        """Extract the numeric publisher ID from a /publishers/<id> URL."""
+        match = re.search(r"/publishers/(\d+)", url or "")
+        return match.group(1) if match else None
+    
+    @staticmethod
+    def tokenize_name(name: str) -> List[str]:
+        """Lowercase word tokens used by the asset name index."""
+        return sorted(set(re.findall(r"[a-z0-9]+", (name or "").lower())))
+    
+    @staticmethod
+    def _ensure_absolute_url(url: str) -> str:
+        """Ensure the URL is absolute."""
+        if not url:
+            return ""
+        if url.startswith("http"):
+            return url
+        return "https://assetstore.unity.com" + (url if url.startswith("/") else "/" + url)
+
+    @staticmethod
+    def find_asset_link(soup: "BeautifulSoup", asset_title: str = None) -> Optional[str]:
+        """Find the asset URL from the page."""
+        links = soup.find_all("a", href=True)
+        return LinkIndex((position, a["href"], a.get_text()) for position, a in enumerate(links)).best(asset_title)
+    
+    @staticmethod
+    def find_publisher_url(soup: "BeautifulSoup") -> Optional[str]:
+        """Find the publisher URL from the asset page."""
+        # Look for publisher link in the main asset info section
+        # Unity usually has a specific layout for this
+        pub_link = soup.find("a", href=lambda h: h and "/publishers/" in h)
+        
+        # Try to find one that is NOT just a random link (e.g. avoid footer)
+        # Usually the publisher link is near the asset title or has a specific class
+        # But a general search is okay if we are on the correct asset page.
+        if pub_link:
+            return AssetParser._ensure_absolute_url(pub_link['href'])
+        return None
+
+
+# =============================================================================
+# LINK INDEX CLASS
+# =============================================================================
+
+class LinkIndex:
+    """
+    Every gift button and package link of a page, read once (Single Responsibility Principle).
+    Keeps each link's href, anchor text and document position, and ranks them as
+    the promoted asset's link with one score: similarity of the title to the
+    package slug or anchor text, a "Get your gift" button, being inside the
+    coupon's container and closeness to the coupon. The same index answers for
+    the container and the whole page, and the choice does not depend on which
+    featured link comes first. Only links that can win are scored, so pages with
+    thousands of featured links cost one literal scan per title word.
+    """
+    
+    WORD_RE = re.compile(r"[a-z0-9]+")
+    WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789")
+    # Shorter words ("a", "on", "3d", "ui") say little about which package is meant
+    MIN_WORD_LENGTH = 3
+    # A title and a package slug are taken to match from this similarity on
+    MIN_SIMILARITY = 0.5
+    # Score weights
+    SIMILARITY_WEIGHT = 3.0
+    GIFT_WEIGHT = 2.0
+    SCOPE_WEIGHT = 1.0
+    # Document positions over which closeness to the coupon halves
+    PROXIMITY_SCALE = 50.0
+    
+    def __init__(self, links: Iterable[tuple]):
+        """links: (document position, href, anchor text) triples, in document order."""
+        self.positions: List[int] = []
+        self.hrefs: List[str] = []
+        self.texts: List[str] = []
+        self.gifts: Set[int] = set()
+        searchable = []
+        for position, href, text in links:
+            text = text.lower()
+            is_gift = "get your" in text and ("gift" in text or "free" in text)
+            if is_gift or "/packages/" in href:
+                if is_gift:
+                    self.gifts.add(len(self.hrefs))
+                self.positions.append(position)
+                self.hrefs.append(href)
+                self.texts.append(text)
+                # The last path segment holds the slug (a query string only adds false hits)
+                searchable.append(href.rpartition("/")[2].lower() + " " + text)
+        # Slugs and anchor texts joined once, so a title word is looked up in a single scan
+        self._joined = "\0".join(searchable)
+        self._starts = list(accumulate((len(text) + 1 for text in searchable), initial=0))
+    
+    def __len__(self) -> int:
+        return len(self.hrefs)
+    
+    @classmethod
+    def tokens(cls, text: Optional[str]) -> List[str]:
+        """Distinct lowercase words of at least MIN_WORD_LENGTH characters, in order."""
+        return [word for word in dict.fromkeys(cls.WORD_RE.findall((text or "").lower()))
+                if len(word) >= cls.MIN_WORD_LENGTH]
+    
+    @staticmethod
+    def package_slug(url: str) -> str:
+        """Lowercased last path segment of a package URL, e.g. 'ocean-toolkit-53514'."""
+        return (url or "").partition("?")[0].partition("#")[0].rstrip("/").rpartition("/")[2].lower()
+    
+    @classmethod
+    def slug_tokens(cls, slug: str) -> List[str]:
+        """Word tokens of a package slug, without the trailing package ID."""
+        words = cls.tokens(slug)
+        if len(words) > 1 and words[-1].isdigit() and slug.endswith("-" + words[-1]):
+            words.pop()
+        return words
+    
+    @staticmethod
+    def word_matcher(title_tokens: List[str]) -> Callable[[str], bool]:
+        """
+        Memoised test of whether a word is one of the title's. Long words also match
+        on a common prefix, as slugs drop apostrophes and titles get trimmed or
+        pluralised. A page repeats few distinct words, so each is tested once.
+        """
+        exact = set(title_tokens)
+        long_words = [word for word in title_tokens if len(word) >= 4]
+        known: Dict[str, bool] = {}
+        
+        def matches(word: str) -> bool:
+            hit = known.get(word)
+            if hit is None:
+                hit = known[word] = word in exact or (len(word) >= 4 and any(
+                    word.startswith(other) or other.startswith(word) for other in long_words))
+            return hit
+        return matches
+    
+    def _title_hits(self, title_tokens: List[str]) -> set:
+        """
+        Indexes of the links whose slug or anchor text could share a word with the
+        title: a word starting with a long title word's first four letters, or
+        equal to a short one. One literal scan per title word finds them.
+        """
+        joined, word_chars = self._joined, self.WORD_CHARS
+        hits = set()
+        for word in title_tokens:
+            pattern = re.escape(word[:4]) if len(word) >= 4 else re.escape(word) + "(?![a-z0-9])"
+            for match in re.finditer(pattern, joined):
+                start = match.start()
+                if start == 0 or joined[start - 1] not in word_chars:
+                    hits.add(bisect_right(self._starts, start) - 1)
+        return hits
+    
+    @classmethod
+    def similarity(cls, title_tokens: List[str], tokens: List[str],
+                   matches: Optional[Callable[[str], bool]] = None) -> float:
+        """Dice coefficient of the title's tokens and another token list."""
+        if not title_tokens or not tokens:
+            return 0.0
+        matches = matches or cls.word_matcher(title_tokens)
+        matched = sum(map(matches, tokens))
+        return 2.0 * min(matched, len(title_tokens)) / (len(title_tokens) + len(tokens))
+    
+    @classmethod
+    def title_matches(cls, asset_title: Optional[str], url: str) -> bool:
+        """True if a package URL's slug belongs to the title (or there is no title to check)."""
+        title_tokens = cls.tokens(asset_title)
+        if not title_tokens:
+            return True
+        return cls.similarity(title_tokens, cls.slug_tokens(cls.package_slug(url))) >= cls.MIN_SIMILARITY
+    
+    def score(self, index: int, title_tokens: List[str], scope: Optional[tuple] = None,
+              anchor: Optional[int] = None, matches: Optional[Callable[[str], bool]] = None) -> float:
+        """How likely the index-th link is the promoted asset's link; see the class docstring."""
+        score = 0.0
+        if title_tokens:
+            matches = matches or self.word_matcher(title_tokens)
+            href = self.hrefs[index]
+            slug = self.slug_tokens(self.package_slug(href)) if "/packages/" in href else []
+            score = self.SIMILARITY_WEIGHT * max(self.similarity(title_tokens, slug, matches),
+                                                 self.similarity(title_tokens, self.tokens(self.texts[index]), matches))
+        if index in self.gifts:
+            score += self.GIFT_WEIGHT
+        position = self.positions[index]
+        if scope is not None and scope[0] < position < scope[1]:
+            score += self.SCOPE_WEIGHT
+        if anchor is not None:
+            score += 1.0 / (1.0 + abs(position - anchor) / self.PROXIMITY_SCALE)
+        return score
+    
+    def best(self, asset_title: Optional[str] = None, scope: Optional[tuple] = None,
+             anchor: Optional[int] = None) -> Optional[str]:
+        """
+        URL of the best scoring gift button or package link, the earliest on a tie.
+        scope is the (start, stop) position range of the coupon's container (which
+        holds the coupon) and anchor the coupon's own position, when known.
+        """
+        if not self.hrefs:
+            return None
+        title_tokens = self.tokens(asset_title)
+        # Any other link scores only for scope and proximity, so it cannot beat the
+        # first link on the page or in scope, or the links on either side of the coupon
+        contenders = self._title_hits(title_tokens).union(self.gifts, (0,))
+        if scope is not None:
+            first_in_scope = bisect_right(self.positions, scope[0])
+            if first_in_scope < len(self.hrefs):
+                contenders.add(first_in_scope)
+        if anchor is not None:
+            nearest = bisect_left(self.positions, anchor)
+            contenders.update(index for index in (nearest - 1, nearest) if 0 <= index < len(self.hrefs))
+        
+        matches = self.word_matcher(title_tokens)
+        best_index, best_score = None, None
+        for index in sorted(contenders):
+            score = self.score(index, title_tokens, scope, anchor, matches)
+            if best_score is None or score > best_score:
+                best_index, best_score = index, score
+        return AssetParser._ensure_absolute_url(self.hrefs[best_index])
+
+
+# =============================================================================
+# PAGE EXTRACTOR CLASS
+# =============================================================================
+
+class PageExtractor:
+    """
+    Extracts the weekly promotion from a parsed sale page (Single Responsibility Principle).
+    Visits the document once, collecting coupon text, headings, links and page text,
+    and resolves every field from those collections instead of re-walking the tree.
+    """
+    
+    COUPON_MARKER_RE = re.compile(r"coupon code|use code", re.IGNORECASE)
+    LOWERCASE_MARKER_RE = re.compile(COUPON_MARKER_RE.pattern)
+    HEADING_TAGS = frozenset(("h1", "h2", "h3"))
+    TITLE_SEARCH_DEPTH = 3
+    
+    def __init__(self, parser: AssetParser):
+        self.parser = parser
+    
+    def _walk(self, soup: "BeautifulSoup") -> Dict:
+        """
+        Collect everything the extraction needs in a single pass over the tree.
+        The loop body is kept to one class check and appends to flat lists: no
+        per-node tuples, dicts or strings, which on large pages would also set off
+        garbage collections over the whole tree. Only strings get their position
+        recorded; the few element positions needed later are counted from the
+        coupon text (see _position).
+        """
+        from bs4 import NavigableString, CData, Tag
+        
+        text_types = frozenset(getattr(soup, "interesting_string_types", None) or (NavigableString, CData))
+        heading_tags = self.HEADING_TAGS
+        heading_positions = []
+        headings = []
+        link_positions = []
+        hrefs = []
+        # Each link's text is texts[link_starts[i]:link_ends[i]], instead of a get_text() per link
+        link_starts = []
+        link_ends = []
+        strings = []
+        string_positions = []
+        texts = []
+        position = -1
+        link_end = None
+        
+        for position, node in enumerate(soup.descendants):
+            if node is link_end:
+                link_ends.append(len(texts))
+                link_end = None
+            # type() skips the __getattr__ hook bs4 nodes have, which node.__class__ goes through
+            cls = type(node)
+            if cls is Tag:
+                name = node.name
+                if name in heading_tags:
+                    heading_positions.append(position)
+                    headings.append(node)
+                elif name == "a" and "href" in node.attrs:
+                    if len(link_ends) < len(link_starts):
+                        # A link inside a link: the outer one's text stops here
+                        link_ends.append(len(texts))
+                    link_positions.append(position)
+                    hrefs.append(node["href"])
+                    link_starts.append(len(texts))
+                    # The link ends where the next node outside its subtree starts
+                    ancestor = node
+                    while ancestor is not None and ancestor.next_sibling is None:
+                        ancestor = ancestor.parent
+                    link_end = ancestor.next_sibling if ancestor is not None else None
+                continue
+            
+            strings.append(node)
+            string_positions.append(position)
+            if cls in text_types:
+                texts.append(node)
+        if len(link_ends) < len(link_starts):
+            # The last link runs to the end of the page
+            link_ends.append(len(texts))
+        
+        coupon = self._find_coupon(strings)
+        return {
+            "coupon": coupon and coupon[:2],
+            # The coupon text and its position, from which other positions are counted
+            "origin": (strings[coupon[2]], string_positions[coupon[2]]) if coupon else None,
+            "size": position + 1,
+            "headings": (heading_positions, headings),
+            "links": (link_positions, hrefs, ["".join(texts[start:end]) for start, end in zip(link_starts, link_ends)]),
+            # Whitespace-normalised page text, as parse_sale_end_date expects
+            "page_text": " ".join(" ".join(texts).split()),
+        }
+    
+    def _find_coupon(self, strings: List) -> Optional[tuple]:
+        """
+        Find the first text node mentioning a coupon whose parent yields a code,
+        as (code, parent, index of the text node). Scans the joined text once and
+        maps each match back to its node by counting the separators before it.
+        """
+        # Lowercasing once is cheaper than a case-insensitive scan and keeps the separators
+        joined = "\0".join(strings).lower()
+        tried = set()
+        for match in self.LOWERCASE_MARKER_RE.finditer(joined):
+            index = joined.count("\0", 0, match.start())
+            if index in tried:
+                continue
+            tried.add(index)
+            parent = strings[index].parent
+            code = self.parser.parse_coupon_code(parent.get_text(strip=True))
+            if code:
+                return code, parent, index
+        return None
+    
+    @staticmethod
+    def _position(node, collected: Dict, forward: bool = False) -> int:
+        """
+        Document position of an ancestor of the coupon text (or, forward, of a node
+        after it), found by stepping from the coupon text to it. The walked root
+        is at -1; None, past the last node, at the document size.
+        """
+        current, position = collected["origin"]
+        if node is None:
+            return collected["size"]
+        if forward:
+            while current is not node:
+                current = current.next_element
+                position += 1
+            return position
+        while current is not node:
+            current = current.previous_element
+            position -= 1
+            if current is None:
+                return -1
+        return position
+    
+    def _scope_range(self, scope, collected: Dict) -> tuple:
+        """
+        Return the (start, stop) document positions spanned by scope (an ancestor
+        of the coupon text) and its descendants, so scope membership is a
+        comparison instead of an ancestor walk.
+        """
+        node = scope
+        while node is not None and node.next_sibling is None:
+            node = node.parent
+        following = node.next_sibling if node is not None else None
+        return self._position(scope, collected), self._position(following, collected, forward=True)
+    
+    def _find_title(self, container, collected: Dict) -> Optional[str]:
+        """Find the first heading in the container, looking up a few levels if needed."""
+        search_scope = container
+        for _ in range(self.TITLE_SEARCH_DEPTH):
+            if not search_scope:
+                break
+            start, stop = self._scope_range(search_scope, collected)
+            positions, headings = collected["headings"]
+            first = bisect_right(positions, start)
+            if first < len(positions) and positions[first] < stop:
+                return headings[first].get_text(strip=True)
+            search_scope = search_scope.parent
+        return None
+    
+    def extract(self, soup: "BeautifulSoup", fallback_url: str,
+                on_asset: Optional[Callable[[Dict[str, str]], None]] = None) -> Optional[Dict[str, str]]:
+        """
+        Extract the weekly asset from the sale page.
+        Returns the same dictionary shape as AssetScraper.scrape (with the publisher URL
+        left at its fallback), or None if no coupon code was found.
+        on_asset is called with the result as soon as every sale page field is
+        settled, before any follow-up work.
+        """
+        collected = self._walk(soup)
+        if not collected["coupon"]:
+            return None
+        
+        coupon_code, parent = collected["coupon"]
+        container = parent.find_parent("div")
+        title = self._find_title(container, collected)
+        asset_title = title or "Unknown Asset"
+        
+        # Rank every link of the page once, favouring the coupon's container and its surroundings
+        links = LinkIndex(zip(*collected["links"]))
+        scope = self._scope_range(container, collected) if container is not None else None
+        link_url = links.best(title, scope, anchor=self._position(parent, collected))
+        
+        asset_data = self._assemble(coupon_code, asset_title, link_url, collected["page_text"], fallback_url)
+        if on_asset:
+            on_asset(asset_data)
+        return asset_data
+    
+    def _assemble(self, coupon_code: str, asset_title: str, link_url: Optional[str],
+                  page_text: str, fallback_url: str) -> Dict[str, str]:
+        """Validate the located title and link and build the asset dictionary."""
+        asset_url = link_url or fallback_url
+        sale_end_date = "Unknown Date"
+        
+        # VALIDATION: If we have a title and a URL, check if they seem to match
+        # (Prevent picking up a random "Featured" asset)
+        if asset_title != "Unknown Asset" and "/packages/" in asset_url:
+            if not LinkIndex.title_matches(asset_title, asset_url):
+                print(f"WARNING: Asset title '{asset_title}' does not match URL '{asset_url}'. Resetting URL.")
+                asset_url = fallback_url
+        
+        end_date = self.parser.parse_sale_end_date(page_text)
+        if end_date:
+            sale_end_date = end_date
+        
+        return {
+            "name": asset_title,
+            "url": asset_url,
+            "code": coupon_code,
+            "publisher_url": fallback_url,
+            "end_date": sale_end_date
+        }
+
+
+class _StopTokenizing(Exception):
+    """Raised inside a tokenizer callback once the wanted token has been seen."""
+
+
+class _PageTokenizer(HTMLParser):
+    """
+    Records a flat outline of a page as the stdlib tokenizer reads it, without
+    building a tree: one [name, start, end, parent] row per element, the visible
+    text runs, headings and links. Positions are numbered like BeautifulSoup's
+    descendants, and end tags and text runs are handled as its html.parser
+    builder does, so scope checks give the same answers as PageExtractor.
+    """
+    
+    VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input",
+                           "link", "meta", "param", "source", "track", "wbr"))
+    HIDDEN_TAGS = frozenset(("script", "style", "template"))
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Row 0 is the document itself; its end is set by close()
+        self.elements: List[list] = [["[document]", -1, None, None]]
+        self.texts: List[str] = []
+        self.text_positions: List[int] = []
+        self.text_parents: List[int] = []
+        self.headings: List[tuple] = []
+        self.links: List[tuple] = []
+        self.position = 0
+        self._stack = [0]
+        self._hidden = 0
+        self._pending: List[str] = []
+    
+    def _flush(self):
+        """Emit the pending text run as one node, as BeautifulSoup joins adjacent data."""
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        if not self._hidden:
+            self.texts.append(text)
+            self.text_positions.append(self.position)
+            self.text_parents.append(self._stack[-1])
+        self.position += 1
+    
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        index = len(self.elements)
+        self.elements.append([tag, self.position, None, self._stack[-1]])
+        if tag in PageExtractor.HEADING_TAGS:
+            self.headings.append((self.position, index))
+        elif tag == "a":
+            href = None
+            for name, value in attrs:
+                if name == "href":
+                    href = value or ""
+            if href is not None:
+                self.links.append((self.position, index, href))
+        self.position += 1
+        
+        if tag in self.VOID_TAGS:
+            self.elements[index][2] = self.position
+            return
+        self._stack.append(index)
+        if tag in self.HIDDEN_TAGS:
+            self._hidden += 1
+    
+    def handle_endtag(self, tag):
+        self._flush()
+        stack = self._stack
+        for depth in range(len(stack) - 1, 0, -1):
+            if self.elements[stack[depth]][0] == tag:
+                for index in stack[depth:]:
+                    self.elements[index][2] = self.position
+                    if self.elements[index][0] in self.HIDDEN_TAGS:
+                        self._hidden -= 1
+                del stack[depth:]
+                return
+        # No open element of that name: ignored
+    
+    def handle_data(self, data):
+        self._pending.append(data)
+    
+    def handle_comment(self, data):
+        self._flush()
+        self.position += 1
+    
+    handle_decl = handle_pi = handle_comment
+    
+    def unknown_decl(self, data):
+        if data.startswith("CDATA["):
+            self._flush()
+            self.handle_data(data[6:])
+            self._flush()
+        else:
+            self.handle_comment(data)
+    
+    def close(self):
+        super().close()
+        self._flush()
+        for index in self._stack:
+            self.elements[index][2] = self.position
+    
+    def text(self, element: int, strip: bool = False) -> str:
+        """Visible text inside an element (get_text, or get_text(strip=True))."""
+        _, start, end, _ = self.elements[element]
+        pieces = self.texts[bisect_right(self.text_positions, start):bisect_left(self.text_positions, end)]
+        if strip:
+            return "".join(piece.strip() for piece in pieces)
+        return "".join(pieces)
+
+
+class _PublisherLinkFinder(HTMLParser):
+    """Stops at the first <a href> pointing at a publisher page."""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.href: Optional[str] = None
+    
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        href = None
+        for name, value in attrs:
+            if name == "href":
+                href = value
+        if href and "/publishers/" in href:
+            self.href = href
+            raise _StopTokenizing
+
+
+class StreamExtractor(PageExtractor):
+    """
+    DOM-free variant of PageExtractor (Single Responsibility Principle).
+    Tokenizes the raw page once with the stdlib HTML tokenizer and answers the
+    same questions from a flat outline instead of a BeautifulSoup tree. It only
+    returns a result it is confident in (coupon, title, matching package link and
+    end date all found); otherwise it returns None and the caller falls back to
+    PageExtractor.
+    """
+    
+    @staticmethod
+    def _decode(content) -> Optional[str]:
+        if isinstance(content, str):
+            return content
+        try:
+            return content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            # Let BeautifulSoup sniff other encodings
+            return None
+    
+    def _find_coupon(self, tokens: _PageTokenizer) -> Optional[tuple]:
+        """First visible text mentioning a coupon whose parent element yields a code."""
+        texts = tokens.texts
+        joined = "\0".join(texts)
+        starts = list(accumulate((len(text) + 1 for text in texts), initial=0))
+        tried = set()
+        for match in self.COUPON_MARKER_RE.finditer(joined):
+            index = bisect_right(starts, match.start()) - 1
+            parent = tokens.text_parents[index]
+            if parent in tried:
+                continue
+            tried.add(parent)
+            code = self.parser.parse_coupon_code(tokens.text(parent, strip=True))
+            if code:
+                return code, parent
+        return None
+    
+    def _find_title(self, container: Optional[int], tokens: _PageTokenizer) -> Optional[str]:
+        """First heading in the container, looking up a few levels if needed."""
+        scope = container
+        for _ in range(self.TITLE_SEARCH_DEPTH):
+            if scope is None:
+                break
+            _, start, end, parent = tokens.elements[scope]
+            for position, heading in tokens.headings:
+                if start < position < end:
+                    return tokens.text(heading, strip=True)
+            scope = parent
+        return None
+    
+    def extract(self, content, fallback_url: str,
+                on_asset: Optional[Callable[[Dict[str, str]], None]] = None) -> Optional[Dict[str, str]]:
+        """
+        Extract the weekly asset from the raw sale page (bytes or str), or return
+        None when not confident. on_asset is only called for a confident result.
+        """
+        markup = self._decode(content)
+        if markup is None:
+            return None
+        tokens = _PageTokenizer()
+        tokens.feed(markup)
+        tokens.close()
+        
+        coupon = self._find_coupon(tokens)
+        if not coupon:
+            return None
+        coupon_code, parent = coupon
+        
+        container = tokens.elements[parent][3]
+        while container is not None and tokens.elements[container][0] != "div":
+            container = tokens.elements[container][3]
+        asset_title = self._find_title(container, tokens)
+        if not asset_title:
+            return None
+        
+        links = LinkIndex((position, href, tokens.text(element)) for position, element, href in tokens.links)
+        scope = tuple(tokens.elements[container][1:3]) if container is not None else None
+        link_url = links.best(asset_title, scope, anchor=tokens.elements[parent][1])
+        
+        # Whitespace-normalised like PageExtractor's, so both read the same end date
+        page_text = " ".join(" ".join(tokens.texts).split())
+        if (not link_url or "/packages/" not in link_url or not LinkIndex.title_matches(asset_title, link_url)
+                or not self.parser.parse_sale_end_date(page_text)):
+            return None
+        
+        asset_data = self._assemble(coupon_code, asset_title, link_url, page_text, fallback_url)
+        if on_asset:
+            on_asset(asset_data)
+        return asset_data
+    
+    @staticmethod
+    def find_publisher_url(content) -> Optional[str]:
+        """Publisher URL from the raw asset page, stopping at the first publisher link."""
+        markup = StreamExtractor._decode(content)
+        if markup is None:
+            return None
+        finder = _PublisherLinkFinder()
+        try:
+            finder.feed(markup)
+            finder.close()
+        except _StopTokenizing:
+            pass
+        return AssetParser._ensure_absolute_url(finder.href) if finder.href else None
+
+
+# =============================================================================
+# STRUCTURED DATA EXTRACTOR CLASS
+# =============================================================================
+
+class StructuredDataExtractor:
+    """
+    Reads the promotion from machine-readable page data (Single Responsibility Principle).
+    Scans JSON-LD, application/json state blocks, inline `window.__STATE__ = {...}`
+    assignments and OpenGraph tags with a few regexes, without tokenizing the page,
+    and collects every product (name, package URL/ID, publisher, price, coupon,
+    end date) they describe. Heuristic extractors are only needed when this comes
+    up empty.
+    """
+    
+    SCRIPT_RE = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+    SCRIPT_TYPE_RE = re.compile(r"""\btype\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+    STATE_RE = re.compile(r"\b(?:window\.)?__[A-Za-z0-9_]+__\s*=\s*(?=[{\[])")
+    META_RE = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
+    ATTR_RE = re.compile(r"""([a-zA-Z_:.-]+)\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""")
+    TAG_RE = re.compile(r"<[^>]*>")
+    HEADING_RE = re.compile(r"<h[1-6]\b[^>]*>(.*?)</h[1-6]\s*>", re.IGNORECASE | re.DOTALL)
+    PACKAGE_HREF_RE = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*["']([^"']*/packages/[^"']*)["']""", re.IGNORECASE)
+    END_DATE_MARKER_RE = re.compile(r"promotion end|sale ends", re.IGNORECASE)
+    SENTENCE_END_RE = re.compile(r"[.!?](?:\s|$)")
+    
+    JSON_TYPES = frozenset(("application/ld+json", "application/json"))
+    URL_KEYS = ("url", "@id", "link", "href", "canonicalUrl")
+    PACKAGE_ID_KEYS = ("packageId", "package_id", "productID", "sku")
+    PUBLISHER_KEYS = ("publisher", "brand", "manufacturer", "seller", "author")
+    CODE_KEYS = ("couponCode", "coupon", "promoCode", "voucherCode")
+    END_DATE_KEYS = ("endDate", "endsAt", "saleEnd", "priceValidUntil", "validThrough")
+    IMAGE_KEYS = ("image", "thumbnailUrl", "mainImage", "keyImage")
+    ORIGINAL_PRICE_KEYS = ("originalPrice", "listPrice", "regularPrice", "priceBeforeDiscount", "highPrice")
+    DISCOUNT_KEYS = ("discountPercentage", "discountPercent", "discount")
+    TEXT_WINDOW = 300
+    # Markup before the coupon marker searched for the free asset's name (its heading)
+    BLOCK_WINDOW = 1500
+    
+    def __init__(self, parser: AssetParser):
+        self.parser = parser
+        self.last_product: Optional[Dict] = None
+    
+    def _json_blocks(self, markup: str) -> List:
+        """Every JSON value embedded in script tags."""
+        blocks = []
+        decoder = json.JSONDecoder()
+        for match in self.SCRIPT_RE.finditer(markup):
+            type_match = self.SCRIPT_TYPE_RE.search(match.group(1))
+            body = match.group(2)
+            if type_match and type_match.group(1).lower() in self.JSON_TYPES:
+                try:
+                    blocks.append(json.loads(body))
+                except ValueError:
+                    pass
+                continue
+            for state in self.STATE_RE.finditer(body):
+                try:
+                    blocks.append(decoder.raw_decode(body, state.end())[0])
+                except ValueError:
+                    pass
+        return blocks
+    
+    def _opengraph(self, markup: str) -> Dict[str, str]:
+        """OpenGraph/product meta properties (og:title, og:url, product:price:amount...)."""
+        properties = {}
+        for tag in self.META_RE.finditer(markup):
+            attrs = {name.lower(): value.strip("\"'") for name, value in self.ATTR_RE.findall(tag.group(0))}
+            key = attrs.get("property") or attrs.get("name")
+            if key and "content" in attrs and key.startswith(("og:", "product:")):
+                properties.setdefault(key, html.unescape(attrs["content"]))
+        return properties
+    
+    @staticmethod
+    def _walk(value, ancestors: tuple = ()):
+        """Yield (dict, ancestor dicts nearest first) for every object in a JSON value."""
+        if isinstance(value, dict):
+            yield value, ancestors
+            for child in value.values():
+                yield from StructuredDataExtractor._walk(child, (value,) + ancestors)
+        elif isinstance(value, list):
+            for child in value:
+                yield from StructuredDataExtractor._walk(child, ancestors)
+    
+    @staticmethod
+    def _first(obj: Dict, keys: Iterable[str]):
+        for key in keys:
+            value = obj.get(key)
+            if value not in (None, "", [], {}):
+                return value
+        return None
+    
+    @staticmethod
+    def _offer_value(obj: Dict, keys: Iterable[str]) -> Optional[float]:
+        """First numeric value among keys on the product itself, then on its (first) offer."""
+        offers = obj.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        for source in (obj, offers if isinstance(offers, dict) else {}):
+            for key in keys:
+                value = source.get(key)
+                if isinstance(value, dict):
+                    value = value.get("amount", value.get("value"))
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    continue
+        return None
+    
+    @staticmethod
+    def _currency(obj: Dict) -> Optional[str]:
+        offers = obj.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        for source in (obj, offers if isinstance(offers, dict) else {}):
+            value = source.get("priceCurrency") or source.get("currency")
+            if isinstance(value, str):
+                return value
+        return None
+    
+    @classmethod
+    def _price(cls, obj: Dict) -> Optional[float]:
+        """Price of a product object (its own price or its offer's), 0 for explicitly free ones."""
+        if obj.get("isFree") is True:
+            return 0.0
+        return cls._offer_value(obj, ("price", "lowPrice", "finalPrice"))
+    
+    def _image(self, obj: Dict) -> Optional[str]:
+        """Absolute URL of a product's (first) image: a URL, a list of them or an ImageObject."""
+        image = self._first(obj, self.IMAGE_KEYS)
+        if isinstance(image, list):
+            image = image[0] if image else None
+        if isinstance(image, dict):
+            image = image.get("url") or image.get("contentUrl")
+        if not isinstance(image, str) or not image.strip():
+            return None
+        image = image.strip()
+        return "https:" + image if image.startswith("//") else AssetParser._ensure_absolute_url(image)
+    
+    def _publisher(self, obj: Dict) -> tuple:
+        """(publisher ID, publisher URL) of a product object, if it names one."""
+        publisher_id = obj.get("publisherId")
+        for key in self.PUBLISHER_KEYS:
+            publisher = obj.get(key)
+            if isinstance(publisher, dict):
+                url = self._first(publisher, self.URL_KEYS)
+                publisher_id = self.parser.parse_publisher_id(url) if isinstance(url, str) else None
+                publisher_id = publisher_id or publisher.get("id") or publisher.get("publisherId")
+                if publisher_id:
+                    break
+        if publisher_id is None or not str(publisher_id).isdigit():
+            return None, None
+        return str(publisher_id), f"https://assetstore.unity.com/publishers/{publisher_id}"
+    
+    def _product(self, obj: Dict, ancestors: tuple) -> Optional[Dict]:
+        """Describe obj if it is a package with a name and a /packages/ URL."""
+        name = obj.get("name") or obj.get("title")
+        url = self._first(obj, self.URL_KEYS)
+        if not isinstance(name, str) or not isinstance(url, str) or "/packages/" not in url:
+            return None
+        url = AssetParser._ensure_absolute_url(url.split("?")[0])
+        package_id = self.parser.parse_package_id(url) or self._first(obj, self.PACKAGE_ID_KEYS)
+        publisher_id, publisher_url = self._publisher(obj)
+        
+        # A promotion object usually wraps the package: look for its coupon and end date
+        # on the package first, then on the objects around it
+        code = end_date = None
+        for context in (obj,) + ancestors:
+            if code is None:
+                value = self._first(context, self.CODE_KEYS)
+                code = value if isinstance(value, str) and re.fullmatch(r"[A-Za-z0-9]+", value) else None
+            if end_date is None:
+                value = self._first(context, self.END_DATE_KEYS)
+                end_date = value if isinstance(value, str) else None
+        
+        return {
+            "name": html.unescape(name.strip()),
+            "url": url,
+            "package_id": str(package_id) if package_id is not None else None,
+            "publisher_id": publisher_id,
+            "publisher_url": publisher_url,
+            "price": self._price(obj),
+            "original_price": self._offer_value(obj, self.ORIGINAL_PRICE_KEYS),
+            "discount": self._offer_value(obj, self.DISCOUNT_KEYS),
+            "currency": self._currency(obj),
+            "code": code.upper() if code else None,
+            "end_date": end_date,
+            "image": self._image(obj),
+        }
+    
+    def read(self, content) -> List[Dict]:
+        """Every product described by the page's structured data, in document order."""
+        markup = StreamExtractor._decode(content)
+        if markup is None:
+            return []
+        # The same package often appears twice (e.g. a ListItem and its Product): merge by URL
+        products: Dict[str, Dict] = {}
+        for block in self._json_blocks(markup):
+            for obj, ancestors in self._walk(block):
+                product = self._product(obj, ancestors)
+                if not product:
+                    continue
+                known = products.setdefault(product["url"], product)
+                for key, value in product.items():
+                    if known[key] is None:
+                        known[key] = value
+        
+        og = self._opengraph(markup)
+        og_url = og.get("og:url", "")
+        if og.get("og:title") and "/packages/" in og_url:
+            price = og.get("product:price:amount")
+            products.setdefault(AssetParser._ensure_absolute_url(og_url.split("?")[0]), {
+                "name": og["og:title"].split(" | ")[0].strip(),
+                "url": AssetParser._ensure_absolute_url(og_url.split("?")[0]),
+                "package_id": self.parser.parse_package_id(og_url),
+                "publisher_id": None,
+                "publisher_url": None,
+                "price": float(price) if price and price.replace(".", "", 1).isdigit() else None,
+                "original_price": None,
+                "discount": None,
+                "currency": og.get("product:price:currency"),
+                "code": None,
+                "end_date": None,
+                "image": self._image({"image": og.get("og:image")}),
+            })
+        return list(products.values())
+    
+    def _text_after(self, markup: str, marker, limit: int) -> Iterable[str]:
+        """
+        Tag-stripped text of the sentence holding each marker match, up to limit
+        characters of markup on either side, for fields the data does not carry
+        (the end date sentence starts before its marker).
+        """
+        for match in marker.finditer(markup):
+            before = html.unescape(self.TAG_RE.sub(" ", markup[max(0, match.start() - limit):match.start()]))
+            after = html.unescape(self.TAG_RE.sub(" ", markup[match.start():match.start() + limit]))
+            yield self.SENTENCE_END_RE.split(before)[-1] + after
+    
+    def _named_near_coupon(self, product: Dict, markup: str) -> bool:
+        """
+        True if the coupon block names the product: every word of its name (or of
+        its package slug) appears in the text around a coupon marker. Words like
+        "free" or "asset" are everywhere on a sale page, so some is not enough.
+        """
+        for match in PageExtractor.COUPON_MARKER_RE.finditer(markup):
+            window = markup[max(0, match.start() - self.BLOCK_WINDOW):match.start() + self.TEXT_WINDOW]
+            block = LinkIndex.word_matcher(LinkIndex.tokens(html.unescape(self.TAG_RE.sub(" ", window))))
+            for words in (LinkIndex.tokens(product["name"]), LinkIndex.slug_tokens(LinkIndex.package_slug(product["url"]))):
+                if words and all(map(block, words)):
+                    return True
+        return False
+    
+    def _format_end_date(self, end_date: str) -> Optional[str]:
+        """Turn a human end date ('January 8, 2026 at 7:59am PT') into the message line."""
+        if not self.parser.normalize_end_date(end_date):
+            return None
+        return f"* Sale and related free asset promotion end {end_date.strip().rstrip('.')}."
+    
+    def extract(self, content, fallback_url: str,
+                on_asset: Optional[Callable[[Dict[str, str]], None]] = None) -> Optional[Dict[str, str]]:
+        """
+        Extract the weekly asset from the sale page's structured data, or return
+        None if it does not identify the free asset together with its coupon and
+        end date. The free asset is the product carrying a coupon code, else the
+        one priced 0 that the page's coupon block names (any other free product
+        on the page is not this week's gift). on_asset is only called for a result.
+        """
+        self.last_product = None
+        scored = [((product["code"] is not None) * 2 + (product["price"] == 0), product) for product in self.read(content)]
+        score, promo = max(scored, key=lambda item: item[0], default=(0, None))
+        if not score:
+            return None
+        markup = StreamExtractor._decode(content)
+        if not promo["code"]:
+            promo = next((product for score, product in scored
+                          if score == 1 and self._named_near_coupon(product, markup)), None)
+            if promo is None:
+                return None
+        
+        code = promo["code"]
+        if not code:
+            for text in self._text_after(markup, PageExtractor.COUPON_MARKER_RE, self.TEXT_WINDOW):
+                code = self.parser.parse_coupon_code(text)
+                if code:
+                    break
+        end_date = self._format_end_date(promo["end_date"]) if promo["end_date"] else None
+        if not end_date:
+            for text in self._text_after(markup, self.END_DATE_MARKER_RE, self.TEXT_WINDOW):
+                end_date = self.parser.parse_sale_end_date(" ".join(text.split()))
+                if end_date:
+                    break
+        if not code or not end_date:
+            return None
+        
+        self.last_product = promo
+        asset_data = {
+            "name": promo["name"],
+            "url": promo["url"],
+            "code": code,
+            "publisher_url": promo["publisher_url"] or fallback_url,
+            "end_date": end_date
+        }
+        if promo["image"]:
+            asset_data["image_url"] = promo["image"]
+        if on_asset:
+            on_asset(asset_data)
+        return asset_data
+    
+    def coupon_link(self, content) -> Optional[str]:
+        """
+        Package URL that the first coupon block links to and names in its heading,
+        read straight from the markup. Only a guess, good enough to start the asset
+        page download while the page is still being tokenized; the extractors
+        still decide which asset it is.
+        """
+        markup = StreamExtractor._decode(content)
+        if markup is None:
+            return None
+        # A case-insensitive scan of a large page costs more than lowercasing it first
+        lowered = markup.lower()
+        if len(lowered) == len(markup):
+            markers = PageExtractor.LOWERCASE_MARKER_RE.finditer(lowered)
+        else:
+            markers = PageExtractor.COUPON_MARKER_RE.finditer(markup)
+        for match in markers:
+            headings = self.HEADING_RE.findall(markup, max(0, match.start() - self.BLOCK_WINDOW), match.start())
+            title = html.unescape(self.TAG_RE.sub(" ", headings[-1])) if headings else None
+            if not LinkIndex.tokens(title):
+                continue
+            # The block's button follows its coupon text, before the next heading starts another block
+            end = match.end() + self.TEXT_WINDOW
+            next_heading = self.HEADING_RE.search(markup, match.end(), end)
+            for href in self.PACKAGE_HREF_RE.findall(markup, match.end(), next_heading.start() if next_heading else end):
+                url = html.unescape(href)
+                if LinkIndex.title_matches(title, url):
+                    return AssetParser._ensure_absolute_url(url)
+        return None
+    
+    def find_publisher_url(self, content, package_url: Optional[str] = None) -> Optional[str]:
+        """Publisher URL of the package described by a package page's structured data."""
+        package_id = self.parser.parse_package_id(package_url) if package_url else None
+        for product in self.read(content):
+            if product["publisher_url"] and (package_id is None or product["package_id"] in (None, package_id)):
+                return product["publisher_url"]
+        return None
+    
+    def find_image_url(self, content, package_url: Optional[str] = None) -> Optional[str]:
+        """Key image of a package page: its product's image, else the page's og:image."""
+        package_id = self.parser.parse_package_id(package_url) if package_url else None
+        for product in self.read(content):
+            if product["image"] and (package_id is None or product["package_id"] in (None, package_id)):
+                return product["image"]
+        markup = StreamExtractor._decode(content)
+        return self._image({"image": self._opengraph(markup).get("og:image")}) if markup else None
+
+
+# =============================================================================
+# ASSET SCRAPER CLASS
+# =============================================================================
+
+class AssetScraper:
+    """
+    Handles web scraping operations (Single Responsibility Principle).
+    Uses AssetParser for parsing logic (Dependency Inversion Principle).
+    Scrapes one PromotionSource (the publisher sale page by default) with the
+    extraction stages its strategy names; scrapers of several sources can share
+    one HttpClient.
+    """
+    
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    
+    def __init__(self, config: Config, parser: AssetParser, client: Optional[HttpClient] = None,
+                 metrics: Optional[Metrics] = None, source: Optional["PromotionSource"] = None):
+        self.config = config
+        self.parser = parser
+        self.source = source or PromotionSource.default(config)
+        self.extractor = PageExtractor(parser)
+        self.stream_extractor = StreamExtractor(parser)
+        self.structured_extractor = StructuredDataExtractor(parser)
+        self.headers = {"User-Agent": self.USER_AGENT}
+        if client is None:
+            cache = None
+            if config.cache_dir:
+                cache = HttpCache(config.cache_dir, config.cache_max_bytes, config.cache_max_age_days)
+            client = HttpClient(config, self.headers, metrics=metrics, cache=cache)
+        self.client = client
+        self.cache = client.cache
+        self.metrics = client.metrics
+        self.timings = client.timings
+        self.last_page: Optional[FetchedPage] = None
+        self.last_asset_page: Optional[FetchedPage] = None
+        self.last_image: Optional[FetchedPage] = None
+    
+    def _uses(self, stage: str) -> bool:
+        """Whether an extraction stage is part of this source's strategy and enabled in the config."""
+        enabled = {"structured": self.config.structured_extract, "stream": self.config.stream_extract}
+        return stage in self.source.stages and enabled.get(stage, True)
+    
+    def _parse_page(self, page: FetchedPage, phase: str) -> "BeautifulSoup":
+        """Parse a fetched page body."""
+        from bs4 import BeautifulSoup
+        
+        with self.metrics.span(f"parse:{phase}", bytes=len(page.content),
+                               from_cache=page.from_cache) as span, self.metrics.profile():
+            soup = BeautifulSoup(page.content, self.config.html_parser)
+        if self.metrics.enabled:
+            # Counted after the span closes so the extra walk is not billed to parsing
+            span["nodes"] = sum(1 for _ in soup.descendants)
+        return soup
+    
+    def _fetch(self, url: str, phase: str) -> Optional[FetchedPage]:
+        """Fetch a page, printing and swallowing errors."""
+        try:
+            return self.client.fetch(url, f"fetch:{phase}")
+        except Exception as e:
+            print(f"Error fetching URL {url}: {e}")
+            return None
+    
+    def _make_request(self, url: str, phase: str = "page") -> Optional["BeautifulSoup"]:
+        """Make HTTP request and return BeautifulSoup object."""
+        page = self._fetch(url, phase)
+        return self._parse_page(page, phase) if page else None
+    
+    def _resolve_prefetch(self, url: str, future: Future, phase: str) -> Optional[FetchedPage]:
+        """Wait for a background fetch."""
+        try:
+            with self.metrics.span(f"wait:{phase}"):
+                return future.result()
+        except Exception as e:
+            print(f"Error fetching URL {url}: {e}")
+            return None
+    
+    def _parse_cache_key(self, page: FetchedPage) -> str:
+        """
+        Parse results depend on the body, the parser version and the extraction
+        stages that ran (disabling a stage or switching the tree builder can change them).
+        """
+        stages = [f"dom.{self.config.html_parser}" if stage == "dom" else stage
+                  for stage in self.source.stages if self._uses(stage)]
+        return f"{self.parser.VERSION}-{'_'.join(stages)}-{page.body_hash}"
+    
+    def _cached_parse(self, kind: str, page: FetchedPage) -> Optional[Dict]:
+        """Return a stored parse result for this page body, if any."""
+        if not self.cache:
+            return None
+        parsed = self.cache.get_parsed(kind, self._parse_cache_key(page))
+        self.metrics.count("parse_cache_lookups", kind=kind, hit=parsed is not None)
+        return parsed
+    
+    def _store_parse(self, kind: str, page: FetchedPage, data: Dict):
+        """Remember a parse result for this page body."""
+        if self.cache:
+            self.cache.put_parsed(kind, self._parse_cache_key(page), data)
+    
+    def scrape(self, gate: Optional[Callable[[FetchedPage, Optional[Dict[str, str]]], None]] = None) -> Optional[Dict[str, str]]:
+        """
+        Scrape the Unity Asset Store for the weekly free asset.
+        Returns a dictionary with asset details or None if failed.
+        gate, if given, is called with the sale page right after it is fetched and
+        again with the sale page fields before their asset page is used; it may
+        raise (e.g. AlreadyPosted) to stop the scrape at either point.
+        """
+        print(f"Scraping URL: {self.source.url}")
+        page = self._fetch(self.source.url, self.source.name)
+        self.last_page = page
+        self.last_asset_page = None
+        self.last_image = None
+        
+        if not page:
+            return None
+        if gate:
+            gate(page, None)
+        
+        # Start the asset page download as soon as its URL is known: guessed from
+        # the markup before a slow extraction stage runs, or from the sale page fields
+        prefetched = {}
+        
+        def start_prefetch(url: str):
+            if url not in prefetched and self.source.asset_page:
+                prefetched[url] = self.client.prefetch(url, "fetch:asset-page")
+        
+        def start_asset_fetch(data: Dict[str, str]):
+            if gate:
+                gate(page, data)
+            url = data["url"]
+            # Structured data may already name the publisher, making the asset page unnecessary
+            if url and "/packages/" in url and data["publisher_url"] == self.source.url:
+                start_prefetch(url)
+        
+        asset_data = self._cached_parse(self.source.name, page)
+        if asset_data:
+            print("Publisher sale page unchanged, using cached parse result.")
+            start_asset_fetch(asset_data)
+        else:
+            asset_data = self.extract_sale_page(page, on_asset=start_asset_fetch, on_asset_url=start_prefetch)
+            if not asset_data:
+                return None
+            self._store_parse(self.source.name, page, asset_data)
+        
+        # Fetch publisher URL from asset page; its key image downloads meanwhile
+        asset_url = asset_data["url"]
+        image_future = None
+        if asset_url in prefetched:
+            asset_page = self._resolve_prefetch(asset_url, prefetched[asset_url], "asset-page")
+            self.last_asset_page = asset_page
+            if asset_page:
+                parsed = self._cached_parse("asset-page", asset_page)
+                image_url = parsed["image_url"] if parsed else self.structured_extractor.find_image_url(asset_page.content, asset_url)
+                image_future = self._start_image_fetch(image_url or asset_data.get("image_url"))
+                if parsed is None:
+                    parsed = {"publisher_url": self.extract_asset_page(asset_page, asset_url), "image_url": image_url}
+                    self._store_parse("asset-page", asset_page, parsed)
+                if parsed["publisher_url"]:
+                    asset_data["publisher_url"] = parsed["publisher_url"]
+                if parsed["image_url"]:
+                    asset_data["image_url"] = parsed["image_url"]
+        else:
+            image_future = self._start_image_fetch(asset_data.get("image_url"))
+        
+        if image_future:
+            self.last_image = self._resolve_prefetch(asset_data["image_url"], image_future, "image")
+        return asset_data
+    
+    def _start_image_fetch(self, image_url: Optional[str]) -> Optional[Future]:
+        """Download the asset's key image in the background, when posts carry images."""
+        if not image_url or not self.config.telegram_send_photos:
+            return None
+        return self.client.prefetch(image_url, "fetch:image")
+    
+    def extract_sale_page(self, page: FetchedPage,
+                          on_asset: Optional[Callable[[Dict[str, str]], None]] = None,
+                          on_asset_url: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, str]]:
+        """
+        Run the source's extraction stages (structured data, streaming, BeautifulSoup)
+        over its promotion page. Needs no network, so it also re-parses stored snapshots.
+        When structured data does not settle it, on_asset_url is called with the
+        coupon block's package link (StructuredDataExtractor.coupon_link), if any,
+        before the slower stages run.
+        """
+        asset_data = None
+        if self._uses("structured"):
+            with self.metrics.span(f"structured:{self.source.name}", bytes=len(page.content)) as span:
+                asset_data = self.structured_extractor.extract(page.content, page.url, on_asset=on_asset)
+                span["found"] = asset_data is not None
+            product = self.structured_extractor.last_product
+            if product:
+                print(f"Structured data: {product['name']} (package {product['package_id'] or '?'}, "
+                      f"publisher {product['publisher_id'] or '?'}, price {product['price']})")
+        
+        if not asset_data and on_asset_url and (self._uses("stream") or self._uses("dom")):
+            asset_url = self.structured_extractor.coupon_link(page.content)
+            if asset_url:
+                on_asset_url(asset_url)
+        
+        if not asset_data and self._uses("stream"):
+            with self.metrics.span(f"stream:{self.source.name}", bytes=len(page.content)) as span, self.metrics.profile():
+                asset_data = self.stream_extractor.extract(page.content, page.url, on_asset=on_asset)
+                span["confident"] = asset_data is not None
+            if not asset_data and self._uses("dom"):
+                print("Streaming extractor not confident, falling back to BeautifulSoup.")
+        
+        if not asset_data and not self._uses("dom"):
+            print(f"WARNING: No promotion found on {page.url} with the '{self.source.strategy}' strategy.")
+        elif not asset_data:
+            soup = self._parse_page(page, self.source.name)
+            with self.metrics.span(f"extract:{self.source.name}") as span, self.metrics.profile():
+                asset_data = self.extractor.extract(soup, page.url, on_asset=on_asset)
+                span["found"] = asset_data is not None
+            
+            if not asset_data:
+                print("WARNING: Could not find 'coupon code' keyword in the page. The layout might have changed or is JS-rendered.")
+                print(f"Page Title: {soup.title.string if soup.title else 'No Title'}")
+        return asset_data
+    
+    def extract_asset_page(self, asset_page: FetchedPage, asset_url: str) -> Optional[str]:
+        """Find the publisher URL on an asset page, trying the same stages in the same order."""
+        publisher_url = None
+        if self._uses("structured"):
+            with self.metrics.span("structured:asset-page", bytes=len(asset_page.content)):
+                publisher_url = self.structured_extractor.find_publisher_url(asset_page.content, asset_url)
+        if not publisher_url and self._uses("stream"):
+            with self.metrics.span("stream:asset-page", bytes=len(asset_page.content)), self.metrics.profile():
+                publisher_url = self.stream_extractor.find_publisher_url(asset_page.content)
+        if not publisher_url and self._uses("dom"):
+            asset_soup = self._parse_page(asset_page, "asset-page")
+            with self.metrics.span("extract:asset-page"), self.metrics.profile():
+                publisher_url = self.parser.find_publisher_url(asset_soup)
+        return publisher_url
+    
+    def close(self):
+        """Release the HTTP client."""
+        self.client.close()
+
+
+# =============================================================================
+# SOURCE REGISTRY AND SCHEDULER CLASSES
+# =============================================================================
+
+class PromotionSource:
+    """
+    One promotion page to track and the strategy used to read it.
+    A strategy names the extraction stages to run, in order: "structured" (page
+    data), "stream" (StreamExtractor) and "dom" (BeautifulSoup + PageExtractor).
+    asset_page controls whether the package page is fetched for the publisher.
+    """
+    
+    STRATEGIES = {
+        # Coupon-code promotions laid out like the publisher sale page
+        "publisher-sale": ("structured", "stream", "dom"),
+        # Pages that carry the offer only as JSON-LD / embedded state
+        "structured": ("structured",),
+        # Sale-page layout without a structured-data block worth trying
+        "markup": ("stream", "dom"),
+    }
+    
+    def __init__(self, name: str, url: str, strategy: str = "publisher-sale", asset_page: bool = True):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}' for source '{name}' "
+                             f"(expected one of: {', '.join(self.STRATEGIES)})")
+        self.name = name
+        self.url = url
+        self.strategy = strategy
+        self.stages = self.STRATEGIES[strategy]
+        self.asset_page = asset_page
+    
+    @classmethod
+    def default(cls, config: Config) -> "PromotionSource":
+        """The weekly publisher sale page."""
+        return cls("publisher-sale", config.publisher_sale_url)
+
+
+class SourceRegistry:
+    """
+    The promotion pages a run tracks (Single Responsibility Principle).
+    Always starts with the publisher sale page; Config.sources_file adds more as a
+    JSON list of {"name", "url", "strategy", "asset_page"} objects.
+    """
+    
+    def __init__(self, sources: Iterable[PromotionSource] = ()):
+        self.sources: Dict[str, PromotionSource] = {}
+        for source in sources:
+            self.add(source)
+    
+    @classmethod
+    def from_config(cls, config: Config) -> "SourceRegistry":
+        registry = cls([PromotionSource.default(config)])
+        if config.sources_file:
+            with open(config.sources_file, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    registry.add(PromotionSource(item["name"], item["url"], item.get("strategy", "publisher-sale"),
+                                                 item.get("asset_page", True)))
+        return registry
+    
+    def add(self, source: PromotionSource):
+        if source.name in self.sources:
+            raise ValueError(f"Duplicate source name '{source.name}'")
+        self.sources[source.name] = source
+    
+    def get(self, name: Optional[str]) -> Optional[PromotionSource]:
+        return self.sources.get(name)
+    
+    def __iter__(self):
+        return iter(self.sources.values())
+    
+    def __len__(self) -> int:
+        return len(self.sources)
+
+
+class SourceScheduler:
+    """
+    Scrapes every registered source concurrently (Single Responsibility Principle).
+    Each source gets its own AssetScraper (and AssetParser); all of them share one
+    HttpClient, so the connection pool, the cache and the prefetch workers are
+    common. At most config.source_workers sources are scraped at once, so a run
+    takes about as long as its slowest source.
+    """
+    
+    # Outcomes of one source's scrape
+    FOUND = "found"
+    HANDLED = "handled"
+    FAILED = "failed"
+    
+    def __init__(self, config: Config, registry: SourceRegistry, client: Optional[HttpClient] = None,
+                 metrics: Optional[Metrics] = None):
+        self.config = config
+        self.scrapers: List[AssetScraper] = []
+        for source in registry:
+            scraper = AssetScraper(config, AssetParser(), client=client, metrics=metrics, source=source)
+            client = scraper.client
+            self.scrapers.append(scraper)
+        self.client = client
+        self.metrics = self.client.metrics
+        self._executor = None
+    
+    def _scrape(self, scraper: AssetScraper, gate) -> tuple:
+        with self.metrics.span(f"source:{scraper.source.name}") as span:
+            try:
+                asset_data = scraper.scrape(gate=gate)
+            except AlreadyPosted as e:
+                span["outcome"] = self.HANDLED
+                return self.HANDLED, e
+            except Exception as e:
+                print(f"Error scraping {scraper.source.name}: {e}")
+                span["outcome"] = self.FAILED
+                return self.FAILED, e
+            span["outcome"] = self.FOUND if asset_data else self.FAILED
+            return (self.FOUND, asset_data) if asset_data else (self.FAILED, None)
+    
+    def scrape_all(self, gate=None) -> List[tuple]:
+        """
+        Scrape every source. Returns (scraper, outcome, value) tuples in registry
+        order: value is the asset data when FOUND, the AlreadyPosted exception when
+        HANDLED and the error (or None) when FAILED.
+        """
+        if len(self.scrapers) == 1:
+            results = [self._scrape(self.scrapers[0], gate)]
+        else:
+            if self._executor is None:
+                workers = max(1, min(self.config.source_workers, len(self.scrapers)))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="source")
+            futures = [self._executor.submit(self._scrape, scraper, gate) for scraper in self.scrapers]
+            results = [future.result() for future in futures]
+        return [(scraper,) + result for scraper, result in zip(self.scrapers, results)]
+    
+    def close(self):
+        """Stop the workers and release the shared HTTP client."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.client.close()
+
+
+# =============================================================================
+# PUBLISHER CATALOG CRAWLER CLASSES
+# =============================================================================
+
+class CatalogSummary:
+    """
+    Running totals over a publisher's catalog records (Single Responsibility Principle).
+    Keeps counts and the TOP most discounted packages only, so records can be
+    streamed through it without being held in memory.
+    """
+    
+    TOP = 3
+    
+    def __init__(self):
+        self.packages = 0
+        self.discounted = 0
+        self.max_discount = 0
+        self.pages = 0
+        self._top: List[tuple] = []
+    
+    def add(self, record: Dict):
+        self.packages += 1
+        discount = record.get("discount") or 0
+        if discount <= 0:
+            return
+        self.discounted += 1
+        self.max_discount = max(self.max_discount, discount)
+        # Ties keep catalog order; the heap holds the TOP largest discounts
+        item = (discount, -self.packages, record)
+        if len(self._top) < self.TOP:
+            heapq.heappush(self._top, item)
+        elif item[:2] > self._top[0][:2]:
+            heapq.heapreplace(self._top, item)
+    
+    def to_dict(self) -> Dict:
+        top = sorted(self._top, key=lambda item: item[:2], reverse=True)
+        return {
+            "packages": self.packages,
+            "discounted": self.discounted,
+            "max_discount": self.max_discount,
+            "pages": self.pages,
+            "top": [{key: record.get(key) for key in ("name", "url", "price", "original_price", "discount", "currency")}
+                    for _, _, record in top],
+        }
+
+
+class CatalogCrawler:
+    """
+    Walks the featured publisher's paginated catalog (Single Responsibility Principle).
+    Page 1 gives the page count; the remaining pages are fetched on a bounded pool
+    with a per-host request rate and a per-host cap on open requests. Records
+    (package name, URL, price, list price, discount) come from each page's
+    structured data and are handed to the sink page by page, in page order, so at
+    most a few pages are held at once however large the catalog is.
+    """
+    
+    PAGE_LINK_RE = re.compile(r"""href\s*=\s*["'][^"']*[?&](?:amp;)?page=(\d+)""", re.IGNORECASE)
+    
+    def __init__(self, config: Config, client: HttpClient, metrics: Optional[Metrics] = None):
+        self.config = config
+        self.client = client
+        self.metrics = metrics or client.metrics
+        self.extractor = StructuredDataExtractor(AssetParser())
+        self._hosts: Dict[str, tuple] = {}
+        self._hosts_lock = threading.Lock()
+    
+    @staticmethod
+    def page_url(publisher_url: str, page: int) -> str:
+        base = publisher_url.split("?")[0]
+        return base if page == 1 else f"{base}?page={page}"
+    
+    @contextmanager
+    def _host_slot(self, url: str):
+        """Wait for the host's rate limiter and one of its connection slots."""
+        host = url.split("/")[2] if "://" in url else url
+        with self._hosts_lock:
+            limits = self._hosts.get(host)
+            if limits is None:
+                limits = (TokenBucket(self.config.crawl_host_rate, capacity=1),
+                          threading.BoundedSemaphore(self.config.crawl_host_concurrency))
+                self._hosts[host] = limits
+        bucket, slots = limits
+        with slots:
+            bucket.acquire()
+            yield
+    
+    def _discount(self, product: Dict) -> int:
+        """Discount in whole percent: the page's own figure, else derived from the two prices."""
+        if product["discount"] is not None:
+            return int(round(product["discount"]))
+        price, original = product["price"], product["original_price"]
+        if price is None or not original or price >= original:
+            return 0
+        return int(round((1 - price / original) * 100))
+    
+    def _fetch_page(self, url: str) -> tuple:
+        """(catalog records, highest page number linked) of one catalog page."""
+        with self._host_slot(url):
+            try:
+                page = self.client.fetch(url, "fetch:catalog")
+            except Exception as e:
+                print(f"Error fetching catalog page {url}: {e}")
+                self.metrics.count("catalog_page_errors")
+                return [], 0
+        
+        with self.metrics.span("extract:catalog", bytes=len(page.content)) as span:
+            records = []
+            for product in self.extractor.read(page.content):
+                if product["price"] is None:
+                    continue
+                records.append({
+                    "name": product["name"],
+                    "url": product["url"],
+                    "package_id": product["package_id"],
+                    "price": product["price"],
+                    "original_price": product["original_price"],
+                    "discount": self._discount(product),
+                    "currency": product["currency"] or "USD",
+                })
+            markup = StreamExtractor._decode(page.content) or ""
+            last_page = max((int(n) for n in self.PAGE_LINK_RE.findall(markup)), default=1)
+            span["records"] = len(records)
+        return records, last_page
+    
+    def crawl(self, publisher_url: str, sink: Optional[Callable[[List[Dict]], None]] = None) -> CatalogSummary:
+        """Crawl every catalog page of a publisher, passing each page's records to sink."""
+        summary = CatalogSummary()
+        
+        def emit(records: List[Dict]):
+            summary.pages += 1
+            for record in records:
+                summary.add(record)
+            if sink and records:
+                sink(records)
+        
+        with self.metrics.span("catalog:crawl", url=publisher_url) as span:
+            records, last_page = self._fetch_page(self.page_url(publisher_url, 1))
+            emit(records)
+            last_page = min(last_page, self.config.crawl_max_pages)
+            
+            if last_page > 1:
+                workers = max(1, self.config.crawl_workers)
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog") as executor:
+                    pending = deque()
+                    for number in range(2, last_page + 1):
+                        pending.append(executor.submit(self._fetch_page, self.page_url(publisher_url, number)))
+                        if len(pending) >= workers * 2:
+                            emit(pending.popleft().result()[0])
+                    while pending:
+                        emit(pending.popleft().result()[0])
+            span.update(pages=summary.pages, packages=summary.packages, discounted=summary.discounted)
+        self.metrics.count("catalog_records", summary.packages)
+        return summary
+
+
+# =============================================================================
+# TELEGRAM SERVICE CLASS
+# =============================================================================
+
+class MediaCache:
+    """
+    Persistent map of uploaded images to Telegram file_ids (Single Responsibility Principle).
+    Keyed by bot ID and image SHA-256 (file_ids are only valid for the bot that
+    uploaded them), so an image is uploaded once and then sent by reference.
+    Without a path the cache only lives for the process.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.file_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.file_ids = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable media cache {path}: {e}")
+    
+    @staticmethod
+    def key(bot_token: str, image: FetchedPage) -> str:
+        return f"{bot_token.split(':')[0]}:{image.body_hash}"
+    
+    def get(self, key: str) -> Optional[str]:
+        return self.file_ids.get(key)
+    
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.file_ids, f, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def put(self, key: str, file_id: str):
+        with self._lock:
+            if self.file_ids.get(key) != file_id:
+                self.file_ids[key] = file_id
+                self._save()
+    
+    def drop(self, key: str):
+        """Forget a file_id Telegram no longer accepts."""
+        with self._lock:
+            if self.file_ids.pop(key, None) is not None:
+                self._save()
+
+
+class TelegramOutbox:
+    """
+    Durable queue of rendered Telegram messages (Single Responsibility Principle).
+    Each message is stored under an idempotency key with one delivery row per
+    recipient (pending, sent or failed, attempts, next attempt) before anything is
+    sent, so a message that could not be delivered is retried by a later drain
+    without scraping again, and a chat that already got it is never sent it again
+    (a crash between Telegram's answer and the commit can still repeat one).
+    Error notifications of one type are merged while one is waiting to be sent.
+    Without a path the outbox only lives for the process.
+    """
+    
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    # Still pending when its message stopped being worth sending (e.g. the coupon ran out)
+    EXPIRED = "expired"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            text TEXT NOT NULL,
+            photo BLOB,
+            occurrences INTEGER NOT NULL DEFAULT 1,
+            created REAL NOT NULL,
+            expires_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS deliveries (
+            message_id INTEGER NOT NULL,
+            chat_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            sent_at REAL,
+            PRIMARY KEY (message_id, chat_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (state, next_attempt);
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        import sqlite3
+        
+        self.path = path
+        self.durable = bool(path)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(self.SCHEMA)
+        # Outboxes written before messages could expire lack the column
+        if "expires_at" not in {row["name"] for row in self.db.execute("PRAGMA table_info(messages)")}:
+            self.db.execute("ALTER TABLE messages ADD COLUMN expires_at REAL")
+        self._lock = threading.RLock()
+        self._shrunk = False
+    
+    def enqueue(self, key: str, kind: str, text: str, chat_ids: Iterable[str],
+                photo: Optional[bytes] = None, not_before: Optional[float] = None,
+                expires_at: Optional[float] = None) -> int:
+        """
+        Store a message for chat_ids and return its ID. Enqueuing an existing key
+        only adds recipients it does not have yet. Deliveries still pending at
+        expires_at (epoch seconds) are marked expired instead of being sent.
+        """
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute("INSERT OR IGNORE INTO messages (key, kind, text, photo, created, expires_at)"
+                            " VALUES (?, ?, ?, ?, ?, ?)", (key, kind, text, photo, now, expires_at))
+            message_id = self.db.execute("SELECT id FROM messages WHERE key = ?", (key,)).fetchone()["id"]
+            self.db.executemany(
+                "INSERT OR IGNORE INTO deliveries (message_id, chat_id, state, next_attempt) VALUES (?, ?, ?, ?)",
+                [(message_id, str(chat_id), self.PENDING, max(now, not_before or now))
+                 for chat_id in dict.fromkeys(chat_ids)]
+            )
+        return message_id
+    
+    def enqueue_error(self, error_type: str, text: str, chat_id: str, window: float) -> int:
+        """
+        Queue an error notification, merged into a pending one of the same type if
+        there is one (the newest text wins and the count goes up). After one was
+        sent, the next waits until window seconds have passed, so errors repeated
+        in the meantime go out as a single message.
+        """
+        prefix = f"error:{error_type}:"
+        with self._lock, self.db:
+            pending = self.db.execute(
+                "SELECT m.id FROM messages m JOIN deliveries d ON d.message_id = m.id"
+                " WHERE m.kind = 'error' AND substr(m.key, 1, ?) = ? AND d.chat_id = ? AND d.state = ?"
+                " ORDER BY m.id DESC LIMIT 1",
+                (len(prefix), prefix, str(chat_id), self.PENDING)
+            ).fetchone()
+            if pending:
+                self.db.execute("UPDATE messages SET text = ?, occurrences = occurrences + 1 WHERE id = ?",
+                                (text, pending["id"]))
+                return pending["id"]
+            last_sent = self.db.execute(
+                "SELECT MAX(d.sent_at) AS sent_at FROM messages m JOIN deliveries d ON d.message_id = m.id"
+                " WHERE m.kind = 'error' AND substr(m.key, 1, ?) = ? AND d.chat_id = ? AND d.state = ?",
+                (len(prefix), prefix, str(chat_id), self.SENT)
+            ).fetchone()["sent_at"]
+        not_before = last_sent + window if last_sent else None
+        return self.enqueue(f"{prefix}{time.time_ns()}", "error", text, [chat_id], not_before=not_before)
+    
+    def expire(self, now: Optional[float] = None) -> int:
+        """Mark the pending deliveries of messages past their expiry as expired; returns how many."""
+        now = time.time() if now is None else now
+        with self._lock, self.db:
+            return self.db.execute(
+                "UPDATE deliveries SET state = ?, last_error = 'expired before delivery' WHERE state = ?"
+                " AND message_id IN (SELECT id FROM messages WHERE expires_at IS NOT NULL AND expires_at <= ?)",
+                (self.EXPIRED, self.PENDING, now)
+            ).rowcount
+    
+    def due(self, now: Optional[float] = None) -> List[Dict]:
+        """Messages with deliveries due now, oldest first (without their photo); expired ones are settled first."""
+        now = time.time() if now is None else now
+        self.expire(now)
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT id, key, kind, text, occurrences, created, photo IS NOT NULL AS has_photo FROM messages m"
+                " WHERE EXISTS (SELECT 1 FROM deliveries d WHERE d.message_id = m.id"
+                " AND d.state = ? AND d.next_attempt <= ?) ORDER BY id",
+                (self.PENDING, now)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def photo(self, message_id: int) -> Optional[bytes]:
+        with self._lock:
+            row = self.db.execute("SELECT photo FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row["photo"] if row else None
+    
+    def due_chats(self, message_id: int, limit: int, now: Optional[float] = None) -> List[str]:
+        """Up to limit recipients of a message whose delivery is due."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT chat_id FROM deliveries WHERE message_id = ? AND state = ? AND next_attempt <= ?"
+                " ORDER BY chat_id LIMIT ?",
+                (message_id, self.PENDING, now, limit)
+            ).fetchall()
+        return [row["chat_id"] for row in rows]
+    
+    def record(self, message_id: int, results: Iterable[Dict], max_attempts: int,
+               retry_base: float, retry_max: float) -> List[Dict]:
+        """
+        Store a batch of send results in one transaction: delivered chats are done,
+        the others are retried with exponential backoff until max_attempts (or
+        at once given up on if the result is marked permanent).
+        Returns the results that will not be retried.
+        """
+        now = time.time()
+        given_up = []
+        with self._lock, self.db:
+            for result in results:
+                chat_id = str(result["chat_id"])
+                if result["ok"]:
+                    self.db.execute(
+                        "UPDATE deliveries SET state = ?, attempts = attempts + 1, sent_at = ?, last_error = NULL"
+                        " WHERE message_id = ? AND chat_id = ?", (self.SENT, now, message_id, chat_id))
+                    continue
+                attempts = self.db.execute(
+                    "SELECT attempts FROM deliveries WHERE message_id = ? AND chat_id = ?", (message_id, chat_id)
+                ).fetchone()["attempts"] + 1
+                state = self.FAILED if attempts >= max_attempts or result.get("permanent") else self.PENDING
+                delay = min(retry_max, retry_base * 2 ** (attempts - 1))
+                self.db.execute(
+                    "UPDATE deliveries SET state = ?, attempts = ?, next_attempt = ?, last_error = ?"
+                    " WHERE message_id = ? AND chat_id = ?",
+                    (state, attempts, now + delay, (result.get("error") or "")[:500], message_id, chat_id))
+                if state == self.FAILED:
+                    given_up.append(result)
+        return given_up
+    
+    def states(self, message_id: Optional[int] = None, kind: Optional[str] = None) -> Dict[str, int]:
+        """Delivery counts by state, for one message, one kind of message or the whole outbox."""
+        query = "SELECT state, COUNT(*) AS n FROM deliveries"
+        args = ()
+        if message_id is not None:
+            query += " WHERE message_id = ?"
+            args = (message_id,)
+        elif kind is not None:
+            query += " WHERE message_id IN (SELECT id FROM messages WHERE kind = ?)"
+            args = (kind,)
+        with self._lock:
+            counts = {row["state"]: row["n"] for row in self.db.execute(query + " GROUP BY state", args)}
+        return {state: counts.get(state, 0) for state in (self.PENDING, self.SENT, self.FAILED, self.EXPIRED)}
+    
+    def next_due(self) -> Optional[float]:
+        """Time (epoch seconds) of the earliest pending delivery, or None."""
+        self.expire()
+        with self._lock:
+            row = self.db.execute("SELECT MIN(next_attempt) AS t FROM deliveries WHERE state = ?",
+                                  (self.PENDING,)).fetchone()
+        return row["t"]
+    
+    SETTLED = "NOT EXISTS (SELECT 1 FROM deliveries d WHERE d.message_id = messages.id AND d.state = 'pending')"
+    
+    def drop_settled_photos(self) -> int:
+        """Forget the images of messages nobody is waiting for; returns how many were dropped."""
+        with self._lock, self.db:
+            dropped = self.db.execute(f"UPDATE messages SET photo = NULL WHERE photo IS NOT NULL AND {self.SETTLED}").rowcount
+        self._shrunk = self._shrunk or dropped > 0
+        return dropped
+    
+    def prune(self, retention_days: float):
+        """Drop the photos of settled messages, and settled messages older than retention_days."""
+        self.drop_settled_photos()
+        old = f"SELECT id FROM messages WHERE created < ? AND {self.SETTLED}"
+        cutoff = time.time() - retention_days * 86400
+        with self._lock, self.db:
+            self.db.execute(f"DELETE FROM deliveries WHERE message_id IN ({old})", (cutoff,))
+            removed = self.db.execute(f"DELETE FROM messages WHERE id IN ({old})", (cutoff,)).rowcount
+        self._shrunk = self._shrunk or removed > 0
+    
+    def close(self):
+        """
+        Drop the images of settled messages and compact the file before closing,
+        so a committed outbox only carries the images still to be sent (SQLite
+        keeps deleted bytes in free pages until VACUUM).
+        """
+        if self.durable:
+            self.drop_settled_photos()
+            if self._shrunk:
+                with self._lock:
+                    self.db.execute("VACUUM")
+        self.db.close()
+
+
+class TelegramService:
+    """
+    Handles all Telegram communication (Single Responsibility Principle).
+    Depends on abstraction (Config) not concretions (Dependency Inversion Principle).
+    Messages with an image go out through sendPhoto: the first send uploads the
+    image, every later send and broadcast recipient reuses its cached file_id.
+    Every message goes through the TelegramOutbox first and is delivered by drain,
+    so what could not be sent now is retried by a later drain.
+    """
+    
+    # No status is retried by the HTTP client: 429 is handled here from Telegram's
+    # retry_after, a 5xx may have posted the message and is left to the outbox
+    RETRY_STATUSES = frozenset()
+    # Telegram's limits for photo captions and uploaded photos
+    CAPTION_LIMIT = 1024
+    MAX_PHOTO_BYTES = 10 * 1024 * 1024
+    # 400 descriptions that blame the photo rather than the chat or the caption
+    MEDIA_ERROR_RE = re.compile(r"file|photo|image|web page content", re.IGNORECASE)
+    # Answers that retrying will not change (bad request, bot blocked or removed from the chat)
+    PERMANENT_STATUSES = {400, 403}
+    
+    def __init__(self, config: Config, formatter: MessageFormatter, client: Optional[HttpClient] = None,
+                 metrics: Optional[Metrics] = None, media_cache: Optional[MediaCache] = None,
+                 outbox: Optional[TelegramOutbox] = None):
+        self.config = config
+        self.formatter = formatter
+        self.client = client or HttpClient(config, metrics=metrics)
+        self.metrics = self.client.metrics
+        if media_cache is None:
+            media_cache = MediaCache(config.media_cache_file or None)
+        self.media_cache = media_cache
+        self.outbox = outbox or TelegramOutbox()
+        self.broadcast_chat_ids = config.load_broadcast_chat_ids()
+        self.last_report: Optional[BroadcastReport] = None
+        self._global_bucket = TokenBucket(config.telegram_global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+    
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        """Per-chat limiter: groups and channels (negative IDs) get the stricter group rate."""
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                rate = self.config.telegram_group_rate if str(chat_id).startswith("-") else self.config.telegram_chat_rate
+                bucket = TokenBucket(rate, capacity=1)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+    
+    def _request(self, message: str, chat_id: str, photo: Optional[FetchedPage]) -> tuple:
+        """(API method, request arguments, uploaded bytes) for one attempt."""
+        if photo is None:
+            return "sendMessage", {"json": {"chat_id": chat_id, "text": message, "parse_mode": "HTML"}}, 0
+        payload = {"chat_id": chat_id, "caption": message, "parse_mode": "HTML"}
+        file_id = self.media_cache.get(MediaCache.key(self.config.telegram_bot_token, photo))
+        if file_id:
+            return "sendPhoto", {"json": dict(payload, photo=file_id)}, 0
+        return "sendPhoto", {"data": payload, "files": {"photo": ("image", photo.content)}}, len(photo.content)
+    
+    @staticmethod
+    def _uploaded_file_id(response) -> Optional[str]:
+        """file_id of the largest size Telegram made of an uploaded photo."""
+        try:
+            sizes = response.json()["result"]["photo"]
+            return sizes[-1]["file_id"] if sizes else None
+        except (ValueError, KeyError, TypeError, IndexError):
+            return None
+    
+    def _send_to_chat(self, message: str, chat_id: str, photo: Optional[FetchedPage] = None) -> Dict:
+        """
+        Send one message to one chat under the global and per-chat limits,
+        waiting out Telegram's retry_after on 429. With a photo the message is its
+        caption; a rejected file_id is dropped and the image uploaded again, a
+        rejected upload falls back to a text message. Returns the recipient result.
+        """
+        result = {"chat_id": chat_id, "ok": False, "status": None, "attempts": 0,
+                  "retry_after": 0, "elapsed": 0.0, "error": None,
+                  "media": "text", "uploaded_bytes": 0}
+        chat_bucket = self._chat_bucket(chat_id)
+        start = time.perf_counter()
+        
+        while result["attempts"] < self.config.telegram_max_attempts:
+            method, request, upload_bytes = self._request(message, chat_id, photo)
+            url = f"{self.config.telegram_api_url}/bot{self.config.telegram_bot_token}/{method}"
+            self._global_bucket.acquire()
+            chat_bucket.acquire()
+            result["attempts"] += 1
+            try:
+                response = self.client.post(url, "telegram:send", retry_statuses=self.RETRY_STATUSES, **request)
+            except Exception as e:
+                result["error"] = str(e)
+                break
+            
+            result["uploaded_bytes"] += upload_bytes
+            if upload_bytes:
+                self.metrics.count("telegram_upload_bytes", upload_bytes)
+            result["status"] = response.status_code
+            if response.status_code == 429:
+                try:
+                    retry_after = int(response.json().get("parameters", {}).get("retry_after", 1))
+                except ValueError:
+                    retry_after = 1
+                result["retry_after"] += retry_after
+                result["error"] = f"Too Many Requests: retry after {retry_after}"
+                # Flood control during a broadcast covers the bot, not just this chat
+                self._global_bucket.pause(retry_after)
+                chat_bucket.pause(retry_after)
+                continue
+            
+            if response.status_code == 400 and photo is not None and self.MEDIA_ERROR_RE.search(response.text):
+                key = MediaCache.key(self.config.telegram_bot_token, photo)
+                if upload_bytes:
+                    print(f"Telegram rejected the image ({response.text[:200]}), sending text only.")
+                    photo = None
+                else:
+                    # The cached file_id is no longer valid: upload again
+                    self.media_cache.drop(key)
+                continue
+            
+            if response.ok:
+                result["ok"] = True
+                result["error"] = None
+                if photo is not None:
+                    result["media"] = "upload" if upload_bytes else "file_id"
+                    file_id = self._uploaded_file_id(response) if upload_bytes else None
+                    if file_id:
+                        self.media_cache.put(MediaCache.key(self.config.telegram_bot_token, photo), file_id)
+            else:
+                result["error"] = response.text[:500]
+            break
+        
+        result["elapsed"] = round(time.perf_counter() - start, 4)
+        self.metrics.timings.add("telegram:deliver", result["elapsed"])
+        self.metrics.count("telegram_messages", ok=result["ok"])
+        if result["retry_after"]:
+            self.metrics.count("telegram_throttled_seconds", result["retry_after"])
+        return result
+    
+    def broadcast(self, message: str, chat_ids: Iterable[str], photo: Optional[FetchedPage] = None) -> BroadcastReport:
+        """
+        Send one message to many chats concurrently over the pooled client. An
+        image not uploaded yet is sent to one chat at a time until an upload
+        succeeds, so every other recipient gets it by file_id.
+        """
+        report = BroadcastReport()
+        remaining = iter(chat_ids)
+        with self.metrics.span("telegram:broadcast") as span, \
+                ThreadPoolExecutor(max_workers=self.config.telegram_broadcast_workers,
+                                   thread_name_prefix="telegram") as executor:
+            if photo is not None:
+                key = MediaCache.key(self.config.telegram_bot_token, photo)
+                for chat_id in remaining:
+                    if self.media_cache.get(key):
+                        remaining = chain([chat_id], remaining)
+                        break
+                    result = self._send_to_chat(message, chat_id, photo)
+                    report.add(result)
+                    if result["media"] == "text" and result["ok"]:
+                        # Telegram refused the image itself: everyone gets text
+                        photo = None
+                        break
+            for result in executor.map(lambda chat_id: self._send_to_chat(message, chat_id, photo), remaining):
+                report.add(result)
+            report.finish()
+            span.update(recipients=len(report.results), delivered=report.delivered, failed=report.failed,
+                        uploaded_bytes=report.summary()["uploaded_bytes"])
+        self.last_report = report
+        return report
+    
+    def drain(self, message_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        """
+        Deliver the outbox's due deliveries (only those of message_ids, if given),
+        up to outbox_batch_size recipients per broadcast, recording each batch as
+        it finishes. last_report covers every delivery attempted. Returns the
+        results of deliveries that will not be retried.
+        """
+        if not self.config.telegram_bot_token:
+            print("Cannot deliver Telegram messages: bot token not found.")
+            return []
+        
+        config = self.config
+        wanted = set(message_ids) if message_ids is not None else None
+        if wanted is None:
+            self.outbox.prune(config.outbox_retention_days)
+        # Deliveries that fail now are due again after started, so each is tried once per drain
+        started = time.time()
+        expired = self.outbox.expire(started)
+        if expired:
+            print(f"Dropped {expired} Telegram deliveries whose message expired before it could be sent.")
+            self.metrics.count("telegram_outbox_expired", expired)
+        messages = [message for message in self.outbox.due(started) if wanted is None or message["id"] in wanted]
+        if wanted is None and messages:
+            print(f"Delivering {len(messages)} queued Telegram messages...")
+        
+        report = BroadcastReport()
+        given_up = []
+        for message in messages:
+            text = message["text"]
+            if message["occurrences"] > 1:
+                text += self.formatter.format_repeat_note(message["occurrences"], message["created"])
+            photo = None
+            if message["has_photo"]:
+                photo = FetchedPage(f"outbox:{message['key']}", 200, self.outbox.photo(message["id"]))
+            while True:
+                chat_ids = self.outbox.due_chats(message["id"], config.outbox_batch_size, started)
+                if not chat_ids:
+                    break
+                results = self.broadcast(text, chat_ids, photo).results
+                for result in results:
+                    report.add(result)
+                    # Retrying will not change these answers
+                    result["permanent"] = result["status"] in self.PERMANENT_STATUSES
+                given_up += self.outbox.record(message["id"], results, config.outbox_max_attempts,
+                                               config.outbox_retry_base, config.outbox_retry_max)
+        report.finish()
+        self.last_report = report
+        states = self.outbox.states()
+        self.metrics.gauge("telegram_outbox_pending", states[TelegramOutbox.PENDING])
+        self.metrics.count("telegram_outbox_given_up", len(given_up))
+        return given_up
+    
+    def next_retry(self) -> Optional[float]:
+        """Seconds until the outbox has a delivery due (0 if one is due now), or None."""
+        due = self.outbox.next_due()
+        return None if due is None else max(0.0, due - time.time())
     
-    def send_message(self, asset_data: Dict[str, str]) -> bool:
-        """Send the weekly asset message."""
+    def send_message(self, asset_data: Dict[str, str], image: Optional[FetchedPage] = None,
+                     key: Optional[str] = None) -> bool:
+        """
+        Queue the weekly asset message (for every broadcast recipient, if configured)
+        and deliver it, with the asset's key image when one was fetched and the
+        message fits in a caption. key makes queuing idempotent: a message already
+        queued under it is not queued again, and chats that got it are not sent it
+        again. Returns True once every recipient has it.
+        """
         if not asset_data:
             print("No asset data to send.")
             return False
         
         message = self.formatter.format_asset_message(asset_data)
-        print("Sending Telegram message...")
+        photo = None
+        if image is not None and self.config.telegram_send_photos:
+            if len(message) > self.CAPTION_LIMIT or len(image.content) > self.MAX_PHOTO_BYTES:
+                print("Message or image too large for a photo post, sending text only.")
+            else:
+                photo = image
+        
+        if self.broadcast_chat_ids and self.config.telegram_bot_token:
+            chat_ids = self.broadcast_chat_ids
+            print(f"Broadcasting Telegram message to {len(chat_ids)} chats...")
+        elif self.config.is_telegram_configured():
+            chat_ids = [self.config.telegram_chat_id]
+            print("Sending Telegram message...")
+        else:
+            print("Error: Telegram credentials not found in environment variables.")
+            return False
+        
+        key = key or "asset:" + hashlib.sha256(message.encode("utf-8")).hexdigest()
+        # A coupon is worthless once the sale ends, so the message is not sent after that
+        sale_end = PollSchedule(self.config).expected_rollover(asset_data.get("end_date"))
+        message_id = self.outbox.enqueue(key, "asset", message, chat_ids, photo.content if photo else None,
+                                         expires_at=sale_end.timestamp() if sale_end else None)
+        given_up = self.drain([message_id])
+        if len(chat_ids) > 1:
+            summary = self.last_report.summary()
+            print(f"Broadcast finished: {summary['delivered']}/{summary['recipients']} delivered "
+                  f"in {summary['elapsed_s']}s ({summary['messages_per_s']} msg/s, {summary['throttled']} throttled, "
+                  f"{summary['uploaded_bytes']} bytes uploaded)")
         
-        if self._post_to_api(message):
+        states = self.outbox.states(message_id)
+        if states[TelegramOutbox.SENT] == sum(states.values()):
             print("Message sent successfully!")
             return True
-        else:
-            # Send error notification about failed message
+        if states[TelegramOutbox.EXPIRED]:
+            print(f"{states[TelegramOutbox.EXPIRED]} deliveries not sent: the sale ended before they went out.")
+        for result in self.last_report.results:
+            if not result["ok"]:
+                print(f"Error posting to Telegram API ({result['chat_id']}): {result['error']}")
+        if states[TelegramOutbox.PENDING]:
+            print(f"{states[TelegramOutbox.PENDING]} deliveries left in the outbox for a later retry.")
+        
+        # Report what will not be delivered: deliveries given up on, or retries a non-durable outbox loses
+        undelivered = [str(result["chat_id"]) for result in given_up]
+        if not self.outbox.durable:
+            undelivered += [str(result["chat_id"]) for result in self.last_report.results if not result["ok"]
+                            and str(result["chat_id"]) not in undelivered]
+        if undelivered and len(chat_ids) > 1:
+            self.send_error_notification(
+                "Broadcast Incomplete",
+                f"Could not deliver the weekly asset message to {len(undelivered)} chats:\n{', '.join(undelivered)[:1000]}"
+            )
+        elif undelivered:
             self.send_error_notification(
                 "Message Sending Failed",
                 "Could not send the weekly asset message.\n\nPlease check Telegram credentials and API response."
             )
-            return False
+        return False
     
     def send_error_notification(self, error_type: str, error_details: str) -> bool:
-        """Send an error notification."""
+        """
+        Send an error notification. Notifications of one type are merged while one
+        is waiting in the outbox, and sent at most once per outbox_error_window.
+        """
         if not self.config.is_telegram_configured():
             print("Cannot send error notification: Telegram credentials not found.")
             return False
@@ -433,66 +3675,636 @@ class TelegramService:
         message = self.formatter.format_error_message(error_type, error_details)
         print(f"Sending error notification: {error_type}")
         
-        if self._post_to_api(message):
+        message_id = self.outbox.enqueue_error(error_type, message, self.config.telegram_chat_id,
+                                               self.config.outbox_error_window)
+        self.drain([message_id])
+        if self.outbox.states(message_id)[TelegramOutbox.SENT]:
             print("Error notification sent successfully.")
             return True
-        else:
-            print(f"Failed to send error notification.")
-            return False
+        print("Error notification queued in the outbox (merged with any of the same type).")
+        return False
 
 
 # =============================================================================
-# MAIN APPLICATION
+# PIPELINE AND WATCH MODE CLASSES
 # =============================================================================
 
-def main():
-    import argparse
-    parser = argparse.ArgumentParser(description="Unity Asset Store Scraper")
-    parser.add_argument("--dry-run", action="store_true", help="Print message to console instead of sending to Telegram")
-    args = parser.parse_args()
-
-    print("Starting Unity Asset Store Scraper...")
+class PromotionPipeline:
+    """
+    Runs one scrape -> archive -> post cycle over long-lived services (Single Responsibility Principle).
+    A normal run calls run_once a single time; watch mode calls it on every poll,
+    reusing the same session, cache, ledger and rate limiters. Sources are scraped
+    concurrently by the SourceScheduler, then archived and posted one by one.
+    """
     
-    # Initialize dependencies (Dependency Injection)
-    config = Config()
-    asset_parser = AssetParser()
-    message_formatter = MessageFormatter(config)
-    asset_scraper = AssetScraper(config, asset_parser)
-    telegram_service = TelegramService(config, message_formatter)
-    archive_service = ArchiveService(config)
+    POSTED = "posted"
+    HANDLED = "already-posted"
+    FAILED = "failed"
+    
+    def __init__(self, config: Config, scheduler: SourceScheduler, archive: ArchiveService,
+                 telegram: TelegramService, formatter: MessageFormatter, ledger: PromotionLedger,
+                 metrics: Metrics, dry_run: bool = False, force: bool = False,
+                 broadcast_report: Optional[str] = None, snapshots: Optional[SnapshotStore] = None,
+                 crawler: Optional[CatalogCrawler] = None):
+        self.config = config
+        self.scheduler = scheduler
+        self.archive = archive
+        self.telegram = telegram
+        self.formatter = formatter
+        self.ledger = ledger
+        self.metrics = metrics
+        self.dry_run = dry_run
+        self.force = force
+        self.broadcast_report = broadcast_report
+        self.snapshots = snapshots
+        self.crawler = crawler
+        self.last_asset: Optional[Dict[str, str]] = None
+        self._previewed = set()
+        self._forced = False
+    
+    def _gate(self, page: FetchedPage, asset_data: Optional[Dict[str, str]]):
+        """Stop at handled promotions; a dry run also stops at the ones it already previewed."""
+        if asset_data is not None and self.dry_run:
+            identity = PromotionLedger.identity(asset_data)
+            if identity in self._previewed:
+                raise AlreadyPosted(identity, "already previewed")
+        if not self.force:
+            self.ledger.check(page, asset_data)
+    
+    def _store_snapshots(self, scraper: AssetScraper) -> Optional[Dict[str, Dict[str, str]]]:
+        """Keep the pages this promotion was parsed from; failing to do so must not stop archiving."""
+        if not self.snapshots:
+            return None
+        refs = {}
+        for kind, page in (("publisher-sale", scraper.last_page), ("asset-page", scraper.last_asset_page)):
+            if page:
+                try:
+                    refs[kind] = self.snapshots.put(page)
+                except OSError as e:
+                    print(f"Warning: could not store {kind} snapshot: {e}")
+        return refs or None
     
-    # 1. Scrape
-    asset_data = asset_scraper.scrape()
+    def _crawl_catalog(self, asset_data: Dict[str, str]):
+        """Summarise the featured publisher's catalog into the post; the records go to the archive."""
+        publisher_url = asset_data.get("publisher_url") or ""
+        if not self.crawler or "/publishers/" not in publisher_url:
+            return
+        sink = None
+        if not self.dry_run:
+            # Each record says which promotion's crawl it came from
+            stamp = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                     "code": asset_data["code"], "publisher_url": publisher_url}
+            sink = lambda records: self.archive.append_catalog([{**stamp, **record} for record in records])
+        try:
+            summary = self.crawler.crawl(publisher_url, sink=sink)
+        except Exception as e:
+            print(f"Warning: publisher catalog crawl failed: {e}")
+            return
+        print(f"Publisher catalog: {summary.packages} packages on {summary.pages} pages, "
+              f"{summary.discounted} discounted.")
+        asset_data["catalog"] = summary.to_dict()
     
-    # 2. Send Message or Print
-    if asset_data:
-        # Save to archive first (before sending)
-        archive_service.save_asset(asset_data)
+    def run_once(self, notify_failure: bool = True) -> str:
+        """
+        Scrape every source, then archive and post (or preview) each new promotion.
+        Returns FAILED if any source failed, else POSTED if anything was posted,
+        else HANDLED. force only applies to the first call.
+        """
+        # 0. Deliver what earlier runs left in the outbox (needs no scraping)
+        if not self.dry_run:
+            self.drain_outbox()
         
-        if args.dry_run:
-            print("\n--- GENERATED MESSAGE PREVIEW ---")
-            message = message_formatter.format_asset_message(asset_data)
-            print(message)
-            print("---------------------------------")
-        else:
-            telegram_service.send_message(asset_data)
-    else:
-        error_msg = "Scraping failed or returned no data."
-        print(error_msg)
+        # 1. Scrape (each source stops early if its promotion was already handled)
+        self._forced = self.force
+        try:
+            results = self.scheduler.scrape_all(gate=self._gate)
+        finally:
+            self.force = False
+        
+        outcomes = []
+        published = set()
+        for scraper, outcome, value in results:
+            if outcome == SourceScheduler.HANDLED:
+                print(f"✅ {scraper.source.name}: {value}. Nothing to do (use --force to post again).")
+                outcomes.append(self.HANDLED)
+            elif outcome == SourceScheduler.FAILED:
+                outcomes.append(self._report_failure(scraper, notify_failure))
+            elif PromotionLedger.identity(value) in published:
+                # Several sources can carry the same promotion (e.g. regional variants)
+                print(f"✅ {scraper.source.name}: same promotion as another source, skipped.")
+                outcomes.append(self.HANDLED)
+            else:
+                published.add(PromotionLedger.identity(value))
+                outcomes.append(self._publish(scraper, value))
+        
+        self.metrics.gauge("run_success", int(self.FAILED not in outcomes))
+        for status in (self.FAILED, self.POSTED):
+            if status in outcomes:
+                return status
+        return self.HANDLED
+    
+    def drain_outbox(self) -> bool:
+        """Deliver the outbox's due messages; True if none is left waiting for a retry."""
+        try:
+            self.telegram.drain()
+        except Exception as e:
+            print(f"Warning: could not drain the Telegram outbox: {e}")
+            return False
+        return not self.telegram.outbox.states()[TelegramOutbox.PENDING]
+    
+    def _report_failure(self, scraper: AssetScraper, notify_failure: bool) -> str:
+        print(f"Scraping failed or returned no data ({scraper.source.name}).")
         
         # Send error notification (only in production, not during dry-run)
-        if not args.dry_run:
-            telegram_service.send_error_notification(
+        if notify_failure and not self.dry_run:
+            self.telegram.send_error_notification(
                 "Scraping Failed",
-                "Could not extract asset data from Unity Asset Store.\n\n"
+                f"Could not extract asset data from Unity Asset Store ({scraper.source.name}: {scraper.source.url}).\n\n"
                 "Possible causes:\n"
                 "• Page structure has changed\n"
                 "• Asset promotion is not active\n"
                 "• Network/connectivity issue\n\n"
                 "Please check the GitHub Actions logs for details."
             )
+        return self.FAILED
+    
+    def _publish(self, scraper: AssetScraper, asset_data: Dict[str, str]) -> str:
+        # 2. Save to archive first (before sending); a dry run must not mark the promotion as handled
+        if self.last_asset is None or scraper is self.scheduler.scrapers[0]:
+            self.last_asset = asset_data
+        identity = PromotionLedger.identity(asset_data)
+        self._crawl_catalog(asset_data)
+        if self.dry_run:
+            print("Dry run: archive not written.")
+        elif self.archive.save_asset(asset_data, snapshots=self._store_snapshots(scraper), source=scraper.source.name):
+            self.ledger.remember(scraper.last_page, identity)
+        
+        # 3. Send Message or Print
+        if self.dry_run:
+            print("\n--- GENERATED MESSAGE PREVIEW ---")
+            print(self.formatter.format_asset_message(asset_data))
+            print("---------------------------------")
+            self._previewed.add(identity)
+        else:
+            # The promotion's identity keeps a rerun from posting it twice; --force asks for a new post
+            key = f"asset:{identity}" + (f":{time.time_ns()}" if self._forced else "")
+            sent = self.telegram.send_message(asset_data, image=scraper.last_image, key=key)
+            self.metrics.gauge("telegram_sent", int(sent))
+            if self.broadcast_report and self.telegram.last_report:
+                self.telegram.last_report.save(self.broadcast_report)
+        return self.POSTED
+
+
+class PollSchedule:
+    """
+    Adaptive polling interval for watch mode (Single Responsibility Principle).
+    The next promotion is expected when the current sale ends: polls are tight
+    from watch_window_before until watch_window_after that moment, moderate while
+    the new promotion is late (up to watch_late_period), and sparse otherwise.
+    """
+    
+    END_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})\s*([ap]m)", re.IGNORECASE)
+    DEFAULT_END_TIME = (8, 0)
+    
+    def __init__(self, config: Config):
+        self.config = config
+        try:
+            from zoneinfo import ZoneInfo
+            self.store_tz = ZoneInfo(config.store_timezone)
+        except Exception:
+            # No tz database (e.g. Windows without tzdata): Pacific Standard Time
+            self.store_tz = timezone(timedelta(hours=-8))
+    
+    def expected_rollover(self, end_date: Optional[str]) -> Optional[datetime]:
+        """Moment the sale described by end_date (e.g. 'January 8, 2026 at 7:59am PT') ends."""
+        day = AssetParser.normalize_end_date(end_date)
+        if not day:
+            return None
+        hour, minute = self.DEFAULT_END_TIME
+        match = self.END_TIME_RE.search(end_date)
+        if match:
+            hour = int(match.group(1)) % 12 + (12 if match.group(3).lower() == "pm" else 0)
+            minute = int(match.group(2))
+        return datetime.strptime(day, "%Y-%m-%d").replace(hour=hour, minute=minute, tzinfo=self.store_tz)
+    
+    def next_delay(self, rollover: Optional[datetime], now: Optional[datetime] = None) -> float:
+        """Seconds until the next poll (with +-10% jitter, never past the start of the tight window)."""
+        config = self.config
+        now = now or datetime.now(timezone.utc)
+        if rollover is None:
+            return config.watch_late_interval
+        
+        window_start = rollover - timedelta(seconds=config.watch_window_before)
+        if now < window_start:
+            interval = config.watch_slow_interval
+        elif now <= rollover + timedelta(seconds=config.watch_window_after):
+            interval = config.watch_fast_interval
+        elif now <= rollover + timedelta(seconds=config.watch_late_period):
+            interval = config.watch_late_interval
+        else:
+            interval = config.watch_slow_interval
+        
+        delay = interval * random.uniform(0.9, 1.1)
+        if now < window_start:
+            delay = min(delay, (window_start - now).total_seconds())
+        return max(1.0, delay)
+
+
+class WatchService:
+    """
+    Long-running watch mode (Single Responsibility Principle).
+    Calls PromotionPipeline.run_once on the PollSchedule until stopped. The
+    expected rollover comes from the newest promotion seen, falling back to the
+    last archived entry. A failure is reported once per streak, not on every poll.
+    Between polls it wakes up to deliver outbox retries as they fall due.
+    """
+    
+    def __init__(self, pipeline: PromotionPipeline, schedule: PollSchedule,
+                 on_cycle: Optional[Callable[[], None]] = None):
+        self.pipeline = pipeline
+        self.schedule = schedule
+        self.on_cycle = on_cycle
+        self.cycles = 0
+        self.consecutive_failures = 0
+        self._stop = threading.Event()
+    
+    def stop(self, *args):
+        """Ask the loop to exit after the current cycle (usable as a signal handler)."""
+        self._stop.set()
+    
+    def _expected_rollover(self) -> Optional[datetime]:
+        asset = self.pipeline.last_asset or self.pipeline.archive.latest_entry()
+        return self.schedule.expected_rollover(asset.get("end_date")) if asset else None
+    
+    def run(self, max_cycles: Optional[int] = None):
+        """Poll until stop() is called (or max_cycles polls have run)."""
+        metrics = self.pipeline.metrics
+        while not self._stop.is_set():
+            try:
+                outcome = self.pipeline.run_once(notify_failure=self.consecutive_failures == 0)
+            except Exception as e:
+                print(f"Watch cycle failed: {e}")
+                outcome = PromotionPipeline.FAILED
+            self.cycles += 1
+            self.consecutive_failures = self.consecutive_failures + 1 if outcome == PromotionPipeline.FAILED else 0
+            
+            rollover = self._expected_rollover()
+            delay = self.schedule.next_delay(rollover)
+            metrics.count("watch_cycles", outcome=outcome)
+            metrics.gauge("watch_consecutive_failures", self.consecutive_failures)
+            metrics.gauge("watch_next_poll_seconds", round(delay, 1))
+            if self.on_cycle:
+                self.on_cycle()
+            if max_cycles and self.cycles >= max_cycles:
+                break
+            
+            expected = rollover.astimezone().strftime("%Y-%m-%d %H:%M %Z") if rollover else "unknown"
+            print(f"Next poll in {delay:.0f}s (expected rollover: {expected})")
+            self._wait(delay)
+    
+    def _wait(self, delay: float):
+        """Sleep until the next poll, draining the outbox whenever a retry falls due."""
+        deadline = time.monotonic() + delay
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            retry = None if self.pipeline.dry_run else self.pipeline.telegram.next_retry()
+            if retry is None or retry >= remaining:
+                self._stop.wait(remaining)
+                return
+            if self._stop.wait(retry):
+                return
+            self.pipeline.drain_outbox()
+
+
+# =============================================================================
+# ARCHIVE REPROCESSING CLASS
+# =============================================================================
+
+class ArchiveReprocessor:
+    """
+    Re-parses archived promotions from their stored snapshots (Single Responsibility Principle).
+    Runs the current extraction stages over every entry that has snapshots in a
+    process pool, streams the field-level diff in archive order and, when asked,
+    writes corrected entries back one year at a time. Each correction keeps the
+    replaced values, so the archive itself records what changed.
+    """
+    
+    FIELDS = ("name", "url", "code", "publisher_url", "end_date")
+    # Values the extractors fill in when they find nothing; never a correction
+    PLACEHOLDERS = {"name": "Unknown Asset", "end_date": "Unknown Date"}
+    
+    # Per-process state of pool workers, set by _init_worker
+    _worker = None
+    
+    def __init__(self, config: Config, archive: ArchiveService, snapshots: SnapshotStore,
+                 workers: Optional[int] = None):
+        self.config = config
+        self.archive = archive
+        self.snapshots = snapshots
+        self.workers = workers or os.cpu_count() or 1
+        self.summary = {"entries": 0, "without_snapshots": 0, "unchanged": 0,
+                        "changed": 0, "failed": 0, "corrected": 0}
+    
+    @classmethod
+    def _init_worker(cls, config: Config, snapshot_root: str):
+        config.cache_dir = None
+        cls._worker = (SnapshotStore(snapshot_root), SourceScheduler(config, SourceRegistry.from_config(config)), config)
+    
+    @classmethod
+    def _reparse(cls, task: Dict) -> Dict:
+        """Re-parse one archive entry from its snapshots and report the fields that differ."""
+        store, scheduler, config = cls._worker
+        entry = task["entry"]
+        # Each source is re-parsed with its own strategy; entries from before sources existed came from the sale page
+        scraper = next((s for s in scheduler.scrapers if s.source.name == entry.get("source")), scheduler.scrapers[0])
+        refs = entry["snapshots"]
+        result = dict(task, changes={}, error=None, note=None)
+        try:
+            # Extractor progress messages would interleave with the diff
+            with redirect_stdout(io.StringIO()):
+                sale_page = store.load(refs["publisher-sale"])
+                data = scraper.extract_sale_page(sale_page)
+                if not data:
+                    raise ValueError("sale page no longer parses")
+                for field, placeholder in cls.PLACEHOLDERS.items():
+                    if data[field] == placeholder:
+                        data[field] = None
+                if data["url"] == sale_page.url:
+                    data["url"] = data["publisher_url"] = None
+                    result["note"] = "package link not found"
+                elif data["publisher_url"] == sale_page.url:
+                    asset_ref = refs.get("asset-page")
+                    if asset_ref and asset_ref["url"] == data["url"]:
+                        data["publisher_url"] = scraper.extract_asset_page(store.load(asset_ref), data["url"])
+                        if not data["publisher_url"]:
+                            result["note"] = "publisher not found on the asset page"
+                    else:
+                        # The asset page of the newly chosen package was never fetched
+                        data["publisher_url"] = None
+                        result["note"] = "publisher not re-checked (asset page not in snapshot)"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            return result
         
+        if data["url"]:
+            data["url"] = data["url"] + "?aid=" + config.affiliate_id
+        for field in cls.FIELDS:
+            if data.get(field) is not None and data[field] != entry.get(field):
+                result["changes"][field] = (entry.get(field), data[field])
+        return result
+    
+    def _tasks(self, years: List[int]) -> Iterable[Dict]:
+        for year in years:
+            for position, entry in enumerate(self.archive.load_entries(year)):
+                self.summary["entries"] += 1
+                sale_ref = entry.get("snapshots", {}).get("publisher-sale")
+                # The entry may come from a checkout whose snapshots/ was pruned or not copied over
+                if not sale_ref or not self.snapshots.has(sale_ref["sha256"]):
+                    self.summary["without_snapshots"] += 1
+                    continue
+                yield {"year": year, "position": position, "entry": entry}
+    
+    def _results(self, tasks: Iterable[Dict]) -> Iterable[Dict]:
+        """Yield results in task order, keeping a bounded number of tasks in flight."""
+        if self.workers <= 1:
+            self._init_worker(self.config, self.snapshots.root)
+            yield from map(self._reparse, tasks)
+            return
+        
+        # multiprocessing is only needed here; importing it at the top costs every start
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=self._init_worker,
+                                 initargs=(self.config, self.snapshots.root)) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append(executor.submit(self._reparse, task))
+                if len(pending) >= self.workers * 4:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _print_result(self, result: Dict):
+        entry = result["entry"]
+        header = f"{result['year']} #{result['position']}  {entry.get('name', '?')}  ({entry.get('code', '?')})"
+        if result["error"]:
+            print(f"! {header}: {result['error']}")
+            return
+        if result["changes"]:
+            print(header)
+            for field, (old, new) in result["changes"].items():
+                print(f"  - {field}: {old}")
+                print(f"  + {field}: {new}")
+            if result["note"]:
+                print(f"  ({result['note']})")
+    
+    def _correct(self, result: Dict) -> Dict:
+        corrected = dict(result["entry"])
+        previous = {}
+        for field, (old, new) in result["changes"].items():
+            previous[field] = old
+            corrected[field] = new
+        corrected["corrections"] = corrected.get("corrections", []) + [{
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "parser_version": AssetParser.VERSION,
+            "previous": previous,
+        }]
+        return corrected
+    
+    def _flush(self, year: int, corrections: List[tuple]):
+        if corrections:
+            applied = self.archive.apply_corrections(year, corrections)
+            self.summary["corrected"] += applied
+            print(f"📦 Corrected {applied} entries in {self.archive._get_archive_filename(year)}")
+    
+    def run(self, years: Optional[List[int]] = None, apply: bool = False) -> Dict[str, int]:
+        """Re-parse the given years (all by default). Returns the summary counts."""
+        years = years or self.archive.available_years()
+        corrections, year = [], None
+        for result in self._results(self._tasks(years)):
+            if apply and result["year"] != year:
+                self._flush(year, corrections)
+                corrections, year = [], result["year"]
+            self._print_result(result)
+            if result["error"]:
+                self.summary["failed"] += 1
+            elif result["changes"]:
+                self.summary["changed"] += 1
+                corrections.append((result["position"], result["entry"], self._correct(result)))
+            else:
+                self.summary["unchanged"] += 1
+        if apply:
+            self._flush(year, corrections)
+        return self.summary
+
+
+# =============================================================================
+# MAIN APPLICATION
+# =============================================================================
+
+def run_query(args):
+    """Answer an archive query from the persistent index."""
+    archive_service = ArchiveService(Config())
+    index = archive_service.get_index()
+    if args.rebuild:
+        index.rebuild()
+    
+    start = time.perf_counter()
+    entries = index.query(publisher=args.publisher, package=args.package, code=args.code,
+                          end_date=args.end_date, name=args.name, year=args.year)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    if args.json:
+        print(json.dumps(entries, indent=2, ensure_ascii=False))
+    else:
+        for entry in entries:
+            end_date = AssetParser.normalize_end_date(entry.get("end_date")) or "?"
+            print(f"{entry.get('timestamp', '?'):<20} {end_date:<11} {entry.get('code', '?'):<18} "
+                  f"{entry.get('name', '?')}\n{'':<51}{entry.get('url', '')}")
+        print(f"{len(entries)} entries ({elapsed_ms:.2f} ms)")
+    index.close()
+
+
+def run_reprocess(args):
+    """Re-parse archived promotions from their snapshots."""
+    config = Config()
+    if not config.snapshot_dir:
+        print("No snapshot store configured (SCRAPER_SNAPSHOT_DIR).")
         sys.exit(1)
+    archive_service = ArchiveService(config)
+    reprocessor = ArchiveReprocessor(config, archive_service, SnapshotStore(config.snapshot_dir),
+                                     workers=args.workers)
+    start = time.perf_counter()
+    summary = reprocessor.run(years=[args.year] if args.year else None, apply=args.apply)
+    elapsed = time.perf_counter() - start
+    print(f"{summary['entries']} entries: {summary['unchanged']} unchanged, {summary['changed']} changed, "
+          f"{summary['failed']} failed, {summary['without_snapshots']} without snapshots "
+          f"({elapsed:.2f}s, {reprocessor.workers} workers)")
+    if summary["changed"] and not args.apply:
+        print("Run again with --apply to write the corrections to the archive.")
+    elif args.apply:
+        print(f"{summary['corrected']} entries corrected.")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Unity Asset Store Scraper")
+    parser.add_argument("--dry-run", action="store_true", help="Print message to console instead of sending to Telegram")
+    parser.add_argument("--timings", action="store_true", help="Print per-phase timings (p50/p95/p99) when the run finishes")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP and parse cache")
+    parser.add_argument("--broadcast", metavar="FILE", help="Send to every chat ID listed in FILE (overrides TELEGRAM_BROADCAST_FILE)")
+    parser.add_argument("--sources", metavar="FILE", help="Also track the promotion pages listed in FILE (overrides SCRAPER_SOURCES_FILE)")
+    parser.add_argument("--no-catalog", action="store_true", help="Do not crawl the featured publisher's catalog")
+    parser.add_argument("--broadcast-report", metavar="FILE", help="Write the per-recipient broadcast report as JSON")
+    parser.add_argument("--migrate-archive", action="store_true", help="Convert legacy assets_archive_<year>.json files to .jsonl and exit")
+    parser.add_argument("--export-archive", metavar="YEAR", type=int, help="Write assets_archive_<YEAR>.json in the legacy format and exit")
+    parser.add_argument("--force", action="store_true", help="Archive and post even if this promotion was already handled")
+    parser.add_argument("--watch", action="store_true", help="Keep running and poll for new promotions, tightly around the expected rollover")
+    parser.add_argument("--drain", action="store_true", help="Only deliver the Telegram messages waiting in the outbox (no scraping)")
+    parser.add_argument("--metrics-json", metavar="FILE", help="Write a JSON run report (spans, counters, phase percentiles)")
+    parser.add_argument("--metrics-prom", metavar="FILE", help="Write run metrics as a Prometheus textfile")
+    parser.add_argument("--profile-parse", metavar="FILE", help="cProfile the parse/extract phases and dump pstats to FILE")
+    
+    subparsers = parser.add_subparsers(dest="command")
+    query_parser = subparsers.add_parser("query", help="Search the archive of every year")
+    query_parser.add_argument("--publisher", help="Publisher ID or URL")
+    query_parser.add_argument("--package", help="Package ID or URL")
+    query_parser.add_argument("--code", help="Coupon code (case-insensitive)")
+    query_parser.add_argument("--end-date", help="Sale end date (YYYY-MM-DD or e.g. 'January 8, 2026')")
+    query_parser.add_argument("--name", help="Words that must all appear in the asset name")
+    query_parser.add_argument("--year", type=int, help="Restrict to one archive year")
+    query_parser.add_argument("--json", action="store_true", help="Print matching entries as JSON")
+    query_parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the archive files first")
+    reprocess_parser = subparsers.add_parser("reprocess", help="Re-parse archived promotions from their page snapshots")
+    reprocess_parser.add_argument("--year", type=int, help="Restrict to one archive year")
+    reprocess_parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    reprocess_parser.add_argument("--apply", action="store_true", help="Write corrected entries back to the archive")
+    args = parser.parse_args()
+    
+    if args.command == "query":
+        run_query(args)
+        return
+    if args.command == "reprocess":
+        run_reprocess(args)
+        return
+    
+    if args.migrate_archive or args.export_archive:
+        archive_service = ArchiveService(Config())
+        if args.migrate_archive:
+            migrated = archive_service.migrate_legacy()
+            print(f"Migrated years: {', '.join(map(str, migrated)) or 'none'}")
+        if args.export_archive:
+            print(f"Exported {archive_service.export_legacy(args.export_archive)}")
+        return
+
+    print("Starting Unity Asset Store Scraper...")
+    
+    # Initialize dependencies (Dependency Injection)
+    config = Config()
+    if args.no_cache:
+        config.cache_dir = None
+    if args.broadcast:
+        config.telegram_broadcast_file = args.broadcast
+    if args.sources:
+        config.sources_file = args.sources
+    if args.no_catalog:
+        config.crawl_catalog = False
+    metrics = Metrics(enabled=bool(args.metrics_json or args.metrics_prom), profile_path=args.profile_parse)
+    message_formatter = MessageFormatter(config)
+    scheduler = SourceScheduler(config, SourceRegistry.from_config(config), metrics=metrics)
+    # A dry run sends nothing, so it must not leave an outbox behind
+    outbox = TelegramOutbox(None if args.dry_run else config.outbox_file or None)
+    telegram_service = TelegramService(config, message_formatter, metrics=metrics, outbox=outbox)
+    archive_service = ArchiveService(config, metrics=metrics)
+    metrics.gauge("run_success", 0)
+    ledger_path = os.path.join(config.cache_dir, "promotions.json") if config.cache_dir else None
+    ledger = PromotionLedger(archive_service, ledger_path)
+    snapshots = SnapshotStore(config.snapshot_dir, metrics) if config.snapshot_dir else None
+    crawler = CatalogCrawler(config, scheduler.client, metrics) if config.crawl_catalog else None
+    pipeline = PromotionPipeline(config, scheduler, archive_service, telegram_service, message_formatter,
+                                 ledger, metrics, dry_run=args.dry_run, force=args.force,
+                                 broadcast_report=args.broadcast_report, snapshots=snapshots,
+                                 crawler=crawler)
+    
+    def write_reports():
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+    
+    try:
+        if args.drain:
+            if not pipeline.drain_outbox():
+                states = outbox.states()
+                print(f"{states[TelegramOutbox.PENDING]} deliveries still waiting in the outbox.")
+                sys.exit(1)
+            print("Outbox drained.")
+        elif args.watch:
+            watcher = WatchService(pipeline, PollSchedule(config), on_cycle=write_reports)
+            signal.signal(signal.SIGTERM, watcher.stop)
+            print("Watching for new promotions (Ctrl+C to stop)...")
+            try:
+                watcher.run()
+            except KeyboardInterrupt:
+                pass
+            print(f"Watch stopped after {watcher.cycles} polls.")
+        elif pipeline.run_once() == PromotionPipeline.FAILED:
+            sys.exit(1)
+    finally:
+        scheduler.close()
+        outbox.close()
+        if args.timings:
+            print("\n--- PHASE TIMINGS ---")
+            print(metrics.timings.format_report())
+        write_reports()
+        if args.metrics_json:
+            print(f"Run report written to {args.metrics_json}")
+        if args.metrics_prom:
+            print(f"Prometheus metrics written to {args.metrics_prom}")
+        if args.profile_parse:
+            print(f"Parse profile written to {metrics.dump_profile()} (view with: python -m pstats {args.profile_parse})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+import json
+import os
+
+import pytest
+
+from main import AlreadyPosted, ArchiveService, Config, FetchedPage, PromotionLedger
+
+ASSET = {
+    "name": "Human Crafting Animations",
+    "url": "https://assetstore.unity.com/packages/3d/animations/human-crafting-animations-254830",
+    "code": "KEVINIGLESIAS2026",
+    "publisher_url": "https://assetstore.unity.com/publishers/36307",
+    "end_date": "* Sale and related free asset promotion end February 12, 2026 at 7:59am PT.",
+}
+
+
+def entry(name):
+    return {"timestamp": "2026-02-06 08:03:16", "name": name, "url": "https://x/packages/a-1",
+            "code": "CODE", "publisher_url": "https://x/publishers/1", "end_date": "February 12, 2026"}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ArchiveService(Config(), str(tmp_path))
+
+
+def test_torn_last_line_is_ignored_on_read_and_cut_off_on_append(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    path.write_bytes(json.dumps(entry("first")).encode() + b"\n" + b'{"timestamp": "2026-02-13", "na')
+
+    assert [e["name"] for e in archive.load_entries(2026)] == ["first"]
+
+    archive._append_entry(str(path), entry("second"))
+
+    assert [e["name"] for e in archive.load_entries(2026)] == ["first", "second"]
+    assert path.read_bytes().count(b"\n") == 2
+
+
+def test_torn_only_line_is_cut_off_entirely(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    path.write_bytes(b'{"timestamp": "2026')
+
+    archive._append_entry(str(path), entry("only"))
+
+    assert [e["name"] for e in archive.load_entries(2026)] == ["only"]
+
+
+def test_complete_file_is_left_alone(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    content = json.dumps(entry("first")).encode() + b"\n"
+    path.write_bytes(content)
+
+    ArchiveService._repair_tail(str(path))
+
+    assert path.read_bytes() == content
+
+
+def test_legacy_json_archive_is_migrated_once(archive, tmp_path):
+    legacy = tmp_path / "assets_archive_2025.json"
+    legacy.write_text(json.dumps([entry("old"), entry("older")]), encoding="utf-8")
+
+    assert archive.available_years() == [2025]
+    assert [e["name"] for e in archive.load_entries(2025)] == ["old", "older"]
+    assert archive.migrate_legacy() == [2025]
+
+    assert not legacy.exists()
+    assert [e["name"] for e in archive.load_entries(2025)] == ["old", "older"]
+    assert archive.migrate_legacy() == []
+
+
+def test_legacy_archive_is_not_migrated_over_an_existing_jsonl(archive, tmp_path):
+    (tmp_path / "assets_archive_2025.json").write_text(json.dumps([entry("legacy")]), encoding="utf-8")
+    (tmp_path / "assets_archive_2025.jsonl").write_text(json.dumps(entry("current")) + "\n", encoding="utf-8")
+
+    assert archive.migrate_legacy() == []
+    assert [e["name"] for e in archive.load_entries(2025)] == ["current"]
+
+
+def test_legacy_export_round_trips(archive, tmp_path):
+    (tmp_path / "assets_archive_2025.json").write_text(json.dumps([entry("old")]), encoding="utf-8")
+    archive.migrate_legacy(remove_legacy=False)
+    os.remove(tmp_path / "assets_archive_2025.json")
+
+    path = archive.export_legacy(2025)
+
+    with open(path, encoding="utf-8") as f:
+        assert [e["name"] for e in json.load(f)] == ["old"]
+
+
+def page(body: bytes = b"<html>sale page</html>") -> FetchedPage:
+    return FetchedPage("https://assetstore.unity.com/publisher-sale", 200, body)
+
+
+def test_promotion_identity_ignores_formatting():
+    same = dict(ASSET, code="keviniglesias2026", url=ASSET["url"] + "?aid=1011lHuMX", end_date="Feb 12, 2026")
+
+    assert PromotionLedger.identity(ASSET) == "KEVINIGLESIAS2026|254830|2026-02-12"
+    assert PromotionLedger.identity(same) == PromotionLedger.identity(ASSET)
+    assert PromotionLedger.identity({}) == "?|?|?"
+
+
+def test_ledger_lets_a_new_promotion_through(archive, tmp_path):
+    ledger = PromotionLedger(archive, str(tmp_path / "promotions.json"))
+
+    ledger.check(page())
+    ledger.check(page(), ASSET)
+
+
+def test_archived_promotion_is_already_posted(archive, tmp_path):
+    ledger = PromotionLedger(archive, str(tmp_path / "promotions.json"))
+    archive.save_asset(ASSET)
+
+    with pytest.raises(AlreadyPosted) as raised:
+        ledger.check(page(), ASSET)
+
+    assert raised.value.identity == PromotionLedger.identity(ASSET)
+    assert raised.value.reason == "already in archive"
+
+
+def test_unchanged_sale_page_stops_the_next_run_before_parsing(archive, tmp_path):
+    state_path = str(tmp_path / "promotions.json")
+    archive.save_asset(ASSET)
+    with pytest.raises(AlreadyPosted):
+        PromotionLedger(archive, state_path).check(page(), ASSET)
+
+    # A later run only has the fetched page
+    ledger = PromotionLedger(archive, state_path)
+    with pytest.raises(AlreadyPosted) as raised:
+        ledger.check(page())
+    assert raised.value.reason == "sale page unchanged"
+    ledger.check(page(b"<html>next week's sale</html>"))
+
+
+def test_fingerprint_of_a_promotion_missing_from_the_archive_does_not_stop_the_run(archive, tmp_path):
+    ledger = PromotionLedger(archive, str(tmp_path / "promotions.json"))
+    ledger.remember(page(), PromotionLedger.identity(ASSET))
+
+    ledger.check(page())
+
+
+def test_promotion_without_a_code_is_never_taken_as_posted(archive):
+    archive.save_asset(dict(ASSET, code=None))
+
+    assert not PromotionLedger(archive).is_posted(PromotionLedger.identity(dict(ASSET, code=None)))
+
+
+def test_unchanged_sale_page_is_recognised_from_the_archive_alone(archive):
+    # A fresh CI checkout: no ledger state file, only the committed archive
+    archive.save_asset(ASSET, snapshots={"publisher-sale": {"url": page().url, "sha256": page().body_hash}})
+
+    with pytest.raises(AlreadyPosted) as raised:
+        PromotionLedger(archive).check(page())
+
+    assert raised.value.reason == "sale page unchanged"
+    assert raised.value.identity == PromotionLedger.identity(ASSET)
+    PromotionLedger(archive).check(page(b"<html>next week's sale</html>"))
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+
+import pytest
+
+from main import ArchiveIndex, ArchiveService, Config, PromotionLedger
+
+
+def entry(name, code="CODE", package_id=1, publisher_id=1, end_date="February 12, 2026"):
+    return {"timestamp": "2026-02-06 08:03:16", "name": name,
+            "url": f"https://assetstore.unity.com/packages/3d/{name.lower().replace(' ', '-')}-{package_id}",
+            "code": code, "publisher_url": f"https://assetstore.unity.com/publishers/{publisher_id}",
+            "end_date": f"* Sale and related free asset promotion end {end_date} at 7:59am PT."}
+
+
+def write(path, entries):
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ArchiveService(Config(), str(tmp_path))
+    yield archive
+    if archive._index is not None:
+        archive._index.close()
+
+
+def test_rewritten_and_longer_file_is_indexed_again(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    write(path, [entry("First Asset", code="ONE"), entry("Second Asset", code="TWO")])
+    assert len(archive.get_index().query()) == 2
+
+    # Another machine's corrections arrive through git pull: same entries, longer lines
+    corrected = dict(entry("First Asset", code="ONE"), corrections=[{"url": "https://example.com/old-url"}])
+    write(path, [corrected, entry("Second Asset", code="TWO")])
+
+    assert [e.get("corrections") for e in archive.get_index().query()] == [corrected["corrections"], None]
+    assert PromotionLedger(archive).is_posted(PromotionLedger.identity(entry("Second Asset", code="TWO")))
+
+
+def test_rewrite_of_the_same_length_is_detected(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    write(path, [entry("Asset", code="AAAA")])
+    archive.get_index()
+    write(path, [entry("Asset", code="BBBB")])
+
+    assert [e["code"] for e in archive.get_index().query()] == ["BBBB"]
+
+
+def test_appends_are_read_incrementally(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    write(path, [entry("First Asset")])
+    archive.get_index()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry("Second Asset")) + "\n")
+
+    assert archive.get_index().sync() == 0
+    assert [e["name"] for e in archive.get_index().query()] == ["First Asset", "Second Asset"]
+
+
+def test_index_from_before_prefix_hashes_is_rebuilt_without_duplicates(archive, tmp_path):
+    write(tmp_path / "assets_archive_2026.jsonl", [entry("First Asset"), entry("Second Asset")])
+    index = archive.get_index()
+    with index.db:
+        index.db.execute("UPDATE sources SET prefix_sha256 = NULL")
+
+    assert index.sync() == 2
+    assert len(index.query()) == 2
+
+
+def test_unreadable_line_is_skipped(archive, tmp_path):
+    path = tmp_path / "assets_archive_2026.jsonl"
+    path.write_text(json.dumps(entry("First Asset")) + "\n{not json\n" + json.dumps(entry("Second Asset")) + "\n",
+                    encoding="utf-8")
+
+    assert [e["name"] for e in archive.get_index().query()] == ["First Asset", "Second Asset"]
+
+
+def test_index_from_before_sale_page_hashes_is_read_again(archive, tmp_path):
+    write(tmp_path / "assets_archive_2026.jsonl",
+          [dict(entry("First Asset"), snapshots={"publisher-sale": {"url": "u", "sha256": "ab" * 32}})])
+    old_schema = (ArchiveIndex.SCHEMA.replace(",\n            prefix_sha256 TEXT", "")
+                  .replace("            sale_sha256 TEXT,\n", ""))
+    db = sqlite3.connect(str(tmp_path / "archive_index.sqlite3"))
+    db.executescript(old_schema)
+    db.execute("INSERT INTO entries (year, name, raw) VALUES (2026, 'First Asset', '{}')")
+    db.execute("INSERT INTO sources (year, offset) VALUES (2026, 1)")
+    db.commit()
+    db.close()
+
+    assert [e["name"] for e in archive.get_index().query(sale_page="ab" * 32)] == ["First Asset"]
+    assert len(archive.get_index().query()) == 1
+
+
+@pytest.fixture
+def filled(archive, tmp_path):
+    write(tmp_path / "assets_archive_2025.jsonl", [
+        entry("Ocean Toolkit", code="OCEAN", package_id=53514, publisher_id=10, end_date="December 4, 2025"),
+    ])
+    write(tmp_path / "assets_archive_2026.jsonl", [
+        entry("Ocean Shader Pack", code="WAVES", package_id=60000, publisher_id=10, end_date="January 8, 2026"),
+        entry("Forest Toolkit", code="Trees2026", package_id=70000, publisher_id=20, end_date="January 15, 2026"),
+    ])
+    return archive.get_index()
+
+
+def names(entries):
+    return [e["name"] for e in entries]
+
+
+def test_query_without_filters_returns_every_entry_oldest_first(filled):
+    assert names(filled.query()) == ["Ocean Toolkit", "Ocean Shader Pack", "Forest Toolkit"]
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"publisher": "10"}, ["Ocean Toolkit", "Ocean Shader Pack"]),
+    ({"publisher": "https://assetstore.unity.com/publishers/20"}, ["Forest Toolkit"]),
+    ({"package": "https://assetstore.unity.com/packages/3d/ocean-toolkit-53514?aid=1"}, ["Ocean Toolkit"]),
+    ({"code": "trees2026"}, ["Forest Toolkit"]),
+    ({"end_date": "2026-01-08"}, ["Ocean Shader Pack"]),
+    ({"end_date": "* Sale and related free asset promotion end January 15, 2026 at 7:59am PT."}, ["Forest Toolkit"]),
+    ({"year": 2025}, ["Ocean Toolkit"]),
+    ({"name": "ocean"}, ["Ocean Toolkit", "Ocean Shader Pack"]),
+    ({"name": "Toolkit Ocean"}, ["Ocean Toolkit"]),
+    ({"name": "ocean", "year": 2026}, ["Ocean Shader Pack"]),
+    ({"publisher": "10", "code": "TREES2026"}, []),
+])
+def test_query_filters(filled, filters, expected):
+    assert names(filled.query(**filters)) == expected
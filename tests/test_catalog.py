@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from main import CatalogCrawler, CatalogSummary, Config, FetchedPage, Metrics
+from benchmark import STORE, build_catalog_page, catalog_product
+
+PUBLISHER = STORE + "/publishers/72095"
+
+
+class CatalogClient:
+    """Serves a synthetic publisher catalog in place of HttpClient, recording the pages asked for."""
+
+    def __init__(self, size, per_page=10, failing=(), latency=0.0):
+        self.size = size
+        self.per_page = per_page
+        self.failing = set(failing)
+        self.latency = latency
+        self.metrics = Metrics(enabled=True)
+        self.fetched = []
+        self.open = self.most_open = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, url, phase="http"):
+        page = int(url.split("?page=")[1]) if "?page=" in url else 1
+        with self._lock:
+            self.fetched.append(page)
+            self.open += 1
+            self.most_open = max(self.most_open, self.open)
+        try:
+            time.sleep(self.latency)
+            if page in self.failing:
+                raise requests.HTTPError(f"503 Service Unavailable: {url}")
+            return FetchedPage(url, 200, build_catalog_page(72095, page, self.size, self.per_page).encode("utf-8"))
+        finally:
+            with self._lock:
+                self.open -= 1
+
+
+def crawler(client, **settings):
+    config = Config()
+    config.crawl_host_rate = 1000.0
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return CatalogCrawler(config, client)
+
+
+def test_page_url():
+    assert CatalogCrawler.page_url(PUBLISHER + "?aid=1", 1) == PUBLISHER
+    assert CatalogCrawler.page_url(PUBLISHER + "?aid=1", 3) == PUBLISHER + "?page=3"
+
+
+def test_every_page_is_crawled_and_handed_to_the_sink_in_order():
+    client = CatalogClient(size=95)
+    batches = []
+
+    summary = crawler(client).crawl(PUBLISHER, sink=batches.append)
+
+    assert sorted(client.fetched) == list(range(1, 11))
+    assert [len(batch) for batch in batches] == [10] * 9 + [5]
+    records = [record for batch in batches for record in batch]
+    expected = [catalog_product(index) for index in range(95)]
+    assert [record["url"] for record in records] == [product["url"] for product in expected]
+    assert [record["discount"] for record in records] == [product["discount"] for product in expected]
+    assert records[1]["package_id"] == "300001"
+    assert {record["currency"] for record in records} == {"USD"}
+    assert (summary.pages, summary.packages) == (10, 95)
+    assert summary.discounted == sum(1 for product in expected if product["discount"])
+
+
+def test_crawl_stops_at_the_page_limit():
+    client = CatalogClient(size=95)
+
+    summary = crawler(client, crawl_max_pages=3).crawl(PUBLISHER)
+
+    assert sorted(client.fetched) == [1, 2, 3]
+    assert (summary.pages, summary.packages) == (3, 30)
+
+
+def test_failed_page_is_skipped_and_counted():
+    client = CatalogClient(size=30, failing={2})
+    batches = []
+
+    crawl = crawler(client)
+    summary = crawl.crawl(PUBLISHER, sink=batches.append)
+
+    assert [batch[0]["url"] for batch in batches] == [catalog_product(0)["url"], catalog_product(20)["url"]]
+    assert (summary.pages, summary.packages) == (3, 20)
+    assert crawl.metrics.counters[("catalog_page_errors", ())] == 1
+
+
+def test_open_requests_per_host_stay_under_the_cap():
+    client = CatalogClient(size=100, latency=0.02)
+
+    crawler(client, crawl_workers=6, crawl_host_concurrency=2).crawl(PUBLISHER)
+
+    assert len(client.fetched) == 10
+    assert client.most_open == 2
+
+
+def record(name, discount):
+    return {"name": name, "url": f"{STORE}/packages/{name}", "price": 1.0, "original_price": 2.0,
+            "discount": discount, "currency": "USD"}
+
+
+def test_summary_keeps_the_most_discounted_with_ties_in_catalog_order():
+    summary = CatalogSummary()
+    for name, discount in [("a", 0), ("b", 50), ("c", 90), ("d", 50), ("e", 25), ("f", 90), ("g", None)]:
+        summary.add(record(name, discount))
+
+    result = summary.to_dict()
+
+    assert (result["packages"], result["discounted"], result["max_discount"]) == (7, 5, 90)
+    assert [item["name"] for item in result["top"]] == ["c", "f", "b"]
+
+
+@pytest.mark.parametrize("product, discount", [
+    ({"discount": 33.4, "price": 1.0, "original_price": 2.0}, 33),
+    ({"discount": None, "price": 7.5, "original_price": 10.0}, 25),
+    ({"discount": None, "price": 10.0, "original_price": 10.0}, 0),
+    ({"discount": None, "price": 5.0, "original_price": None}, 0),
+])
+def test_discount_is_the_page_figure_or_derived_from_the_prices(product, discount):
+    assert crawler(CatalogClient(size=0))._discount(product) == discount
@@ -0,0 +1,111 @@
+import os
+import time
+
+import requests
+
+from main import Config, HttpCache, HttpClient
+
+
+class CachingSession:
+    """Answers with the given (status, headers, body) triples and records the request headers."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.sent_headers = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.sent_headers.append(dict(headers or {}))
+        status, response_headers, body = self.answers.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(response_headers)
+        response._content = body
+        return response
+
+    def close(self):
+        pass
+
+
+def client(cache, *answers):
+    client = HttpClient(Config(), cache=cache)
+    client.session = CachingSession(*answers)
+    return client
+
+
+def test_unchanged_page_is_revalidated_and_served_from_disk(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    http = client(cache, (200, {"ETag": '"v1"', "Last-Modified": "Tue, 06 Jan 2026 08:00:00 GMT"}, b"<html>sale</html>"),
+                  (304, {}, b""))
+
+    first = http.fetch("https://example.com/sale")
+    second = http.fetch("https://example.com/sale")
+
+    assert (first.content, first.from_cache) == (b"<html>sale</html>", False)
+    assert (second.content, second.from_cache) == (b"<html>sale</html>", True)
+    assert second.body_hash == first.body_hash
+    assert http.session.sent_headers == [{}, {"If-None-Match": '"v1"',
+                                               "If-Modified-Since": "Tue, 06 Jan 2026 08:00:00 GMT"}]
+
+
+def test_changed_page_replaces_the_stored_copy(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    http = client(cache, (200, {"ETag": '"v1"'}, b"old"), (200, {"ETag": '"v2"'}, b"new"), (304, {}, b""))
+
+    for _ in range(3):
+        page = http.fetch("https://example.com/sale")
+
+    assert (page.content, page.from_cache) == (b"new", True)
+    assert http.session.sent_headers[2] == {"If-None-Match": '"v2"'}
+
+
+def test_response_without_validators_is_not_stored(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    http = client(cache, (200, {}, b"page"), (200, {}, b"page"))
+
+    http.fetch("https://example.com/sale")
+    http.fetch("https://example.com/sale")
+
+    assert cache.lookup("https://example.com/sale") is None
+    assert http.session.sent_headers == [{}, {}]
+
+
+def store(cache, url, body):
+    response = requests.Response()
+    response.headers["ETag"] = '"1"'
+    response._content = body
+    cache.store(url, response)
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=10 ** 6)
+    for name in ("a", "b", "c"):
+        store(cache, f"https://example.com/{name}", b"x" * 1000)
+    # Make "a" the oldest entry, then read it so that "b" becomes the least recently used
+    for age, name in ((300, "a"), (200, "b"), (100, "c")):
+        for suffix in (".body", ".json"):
+            path = os.path.join(str(tmp_path), "http", HttpCache._key(f"https://example.com/{name}") + suffix)
+            os.utime(path, (time.time() - age, time.time() - age))
+    cache.load_body("https://example.com/a")
+
+    cache.max_bytes = 2500
+    cache.evict()
+
+    assert cache.lookup("https://example.com/b") is None
+    assert cache.lookup("https://example.com/a") is not None
+    assert cache.lookup("https://example.com/c") is not None
+
+
+def test_entries_older_than_max_age_are_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path), max_age_days=1)
+    store(cache, "https://example.com/old", b"old")
+    store(cache, "https://example.com/new", b"new")
+    cache.put_parsed("publisher-sale", "ab" * 32, {"name": "Asset"})
+    old = time.time() - 2 * 86400
+    for path in (os.path.join(str(tmp_path), "http", HttpCache._key("https://example.com/old") + suffix)
+                 for suffix in (".body", ".json")):
+        os.utime(path, (old, old))
+
+    assert cache.evict() == 2
+    assert cache.lookup("https://example.com/old") is None
+    assert cache.load_body("https://example.com/new") == b"new"
+    assert cache.get_parsed("publisher-sale", "ab" * 32) == {"name": "Asset"}
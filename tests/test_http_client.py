@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from main import Config, HttpClient
+
+
+class FakeSession:
+    """Answers each request with the next outcome: a status code or an exception to raise."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(method)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response._content = b""
+        return response
+
+    def close(self):
+        pass
+
+
+def client(*outcomes):
+    config = Config()
+    config.http_backoff_base = 0.0
+    client = HttpClient(config)
+    client.session = FakeSession(*outcomes)
+    return client
+
+
+def test_get_is_retried_on_timeouts_and_server_errors():
+    http = client(requests.ReadTimeout(), 503, 200)
+
+    assert http.get("https://example.com/").status_code == 200
+    assert http.session.calls == ["GET"] * 3
+
+
+def test_get_gives_up_after_max_retries():
+    http = client(*[500] * 4)
+
+    assert http.get("https://example.com/").status_code == 500
+    assert len(http.session.calls) == 1 + http.config.http_max_retries
+
+
+@pytest.mark.parametrize("outcome", [requests.ConnectionError(), requests.ConnectTimeout()])
+def test_post_is_retried_when_it_cannot_have_been_sent(outcome):
+    http = client(outcome, 200)
+
+    assert http.post("https://example.com/").status_code == 200
+    assert http.session.calls == ["POST", "POST"]
+
+
+def test_post_is_not_retried_after_a_read_timeout():
+    http = client(requests.ReadTimeout(), 200)
+
+    with pytest.raises(requests.ReadTimeout):
+        http.post("https://example.com/")
+    assert http.session.calls == ["POST"]
+
+
+def test_post_is_not_retried_on_a_server_error():
+    http = client(502, 200)
+
+    assert http.post("https://example.com/").status_code == 502
+    assert http.session.calls == ["POST"]
+
+
+def test_prefetch_fetches_in_the_background():
+    http = client(503, 200)
+
+    page = http.prefetch("https://example.com/asset").result(timeout=5)
+
+    assert (page.url, page.status_code, page.from_cache) == ("https://example.com/asset", 200, False)
+    assert http.session.calls == ["GET", "GET"]
+    http.close()
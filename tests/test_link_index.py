@@ -0,0 +1,53 @@
+import pytest
+
+from main import LinkIndex
+
+STORE = "https://assetstore.unity.com"
+ASSET_STORE_TOOLS = "/packages/tools/utilities/asset-store-tools-115"
+BEHAVIOR_DESIGNER = "/packages/tools/visual-scripting/behavior-designer-pro-3-dots-powered-behavior-trees-368344"
+
+# Archived promotions whose URL was the featured tool linked above the promotion, not the promoted asset
+# (the promoted packages' URLs were never recorded; these slugs are built from the names)
+MISFIRES = [
+    ("Abandoned Factory Buildings - Day/Night Scene", ASSET_STORE_TOOLS,
+     "/packages/3d/environments/industrial/abandoned-factory-buildings-day-night-scene-281201"),
+    ("Food Pack | Low Poly Meat & Seafood", ASSET_STORE_TOOLS,
+     "/packages/3d/props/food/food-pack-low-poly-meat-seafood-300112"),
+    ("Human Crafting Animations", ASSET_STORE_TOOLS,
+     "/packages/3d/animations/human-crafting-animations-254830"),
+    ("Sci-Fi Weapons: Bullet Hell Sound Effects Pack", BEHAVIOR_DESIGNER,
+     "/packages/audio/sound-fx/weapons/sci-fi-weapons-bullet-hell-sound-effects-pack-317446"),
+    ("Map Track Markers VFX", BEHAVIOR_DESIGNER,
+     "/packages/vfx/particles/map-track-markers-vfx-322301"),
+]
+
+
+@pytest.mark.parametrize("name, misfire, promoted", MISFIRES)
+def test_title_does_not_match_the_misfired_package(name, misfire, promoted):
+    assert not LinkIndex.title_matches(name, STORE + misfire + "?aid=1011lHuMX")
+    assert LinkIndex.title_matches(name, STORE + promoted)
+
+
+@pytest.mark.parametrize("name, misfire, promoted", MISFIRES)
+def test_promoted_package_outscores_a_featured_link_next_to_the_coupon(name, misfire, promoted):
+    # The featured tool comes first, inside the coupon's container and right before the coupon
+    index = LinkIndex([(10, misfire, "Learn more"), (40, promoted, "View asset")])
+    title_tokens = LinkIndex.tokens(name)
+
+    assert index.score(1, title_tokens, scope=(5, 50), anchor=12) > index.score(0, title_tokens, scope=(5, 50), anchor=12)
+    assert index.best(name, scope=(5, 50), anchor=12) == STORE + promoted
+
+
+def test_gift_button_wins_over_a_featured_link_without_a_title():
+    promoted = MISFIRES[0][2]
+    index = LinkIndex([(10, ASSET_STORE_TOOLS, "Asset Store Tools"), (90, promoted, "Get your gift")])
+
+    assert 1 in index.gifts
+    assert index.best(None) == STORE + promoted
+
+
+def test_featured_link_is_still_the_fallback_when_nothing_matches():
+    index = LinkIndex([(10, ASSET_STORE_TOOLS, "Asset Store Tools")])
+
+    assert index.best("Human Crafting Animations") == STORE + ASSET_STORE_TOOLS
+    assert not LinkIndex.title_matches("Human Crafting Animations", index.best("Human Crafting Animations"))
@@ -0,0 +1,105 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from main import Config, FetchedPage, MediaCache, MessageFormatter, TelegramOutbox, TelegramService
+
+IMAGE = FetchedPage("https://assetstore.unity.com/image.png", 200, b"\x89PNG image")
+
+
+def test_key_is_per_bot_and_per_image():
+    key = MediaCache.key("123456:SECRET", IMAGE)
+
+    assert key == f"123456:{IMAGE.body_hash}"
+    assert MediaCache.key("123456:OTHER-SECRET", IMAGE) == key
+    assert MediaCache.key("654321:SECRET", IMAGE) != key
+    assert MediaCache.key("123456:SECRET", FetchedPage(IMAGE.url, 200, b"other image")) != key
+
+
+def test_file_ids_survive_a_restart(tmp_path):
+    path = str(tmp_path / "media" / "telegram_media.json")
+    cache = MediaCache(path)
+    cache.put("1:a", "file-a")
+    cache.put("1:b", "file-b")
+    cache.drop("1:a")
+
+    reopened = MediaCache(path)
+
+    assert reopened.get("1:a") is None
+    assert reopened.get("1:b") == "file-b"
+
+
+def test_unreadable_cache_file_starts_empty(tmp_path):
+    path = tmp_path / "telegram_media.json"
+    path.write_text("{not json", encoding="utf-8")
+
+    cache = MediaCache(str(path))
+    cache.put("1:a", "file-a")
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"1:a": "file-a"}
+
+
+def test_cache_without_a_path_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = MediaCache()
+    cache.put("1:a", "file-a")
+
+    assert cache.get("1:a") == "file-a"
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def service(monkeypatch):
+    config = Config()
+    config.telegram_bot_token = "123456:TEST"
+    config.media_cache_file = None
+    service = TelegramService(config, MessageFormatter(config), outbox=TelegramOutbox())
+    service.requests = []
+    monkeypatch.setattr(main.TokenBucket, "acquire", lambda bucket: None)
+    yield service
+    service.outbox.close()
+
+
+def answer(service, *responses):
+    """Make service's POSTs answer with responses in turn, recording (chat_id, upload or file_id)."""
+    responses = iter(responses)
+
+    def post(url, phase, **kwargs):
+        if "files" in kwargs:
+            service.requests.append((kwargs["data"]["chat_id"], "upload"))
+        else:
+            service.requests.append((kwargs["json"]["chat_id"], kwargs["json"].get("photo")))
+        status, body = next(responses)
+        return SimpleNamespace(status_code=status, ok=status == 200, text=json.dumps(body), json=lambda: body)
+
+    service.client.post = post
+
+
+UPLOADED = (200, {"ok": True, "result": {"photo": [{"file_id": "small"}, {"file_id": "large"}]}})
+SENT = (200, {"ok": True, "result": {}})
+
+
+def test_image_is_uploaded_once_then_sent_by_file_id(service):
+    answer(service, UPLOADED, SENT, SENT)
+
+    report = service.broadcast("caption", ["1", "2", "3"], photo=IMAGE)
+
+    assert report.delivered == 3
+    assert service.requests[0] == ("1", "upload")
+    assert sorted(service.requests[1:]) == [("2", "large"), ("3", "large")]
+    assert service.media_cache.get(MediaCache.key("123456:TEST", IMAGE)) == "large"
+
+
+def test_rejected_file_id_is_dropped_and_the_image_uploaded_again(service):
+    key = MediaCache.key("123456:TEST", IMAGE)
+    service.media_cache.put(key, "expired")
+    answer(service, (400, {"ok": False, "description": "Bad Request: wrong file identifier/HTTP URL specified"}),
+           UPLOADED)
+
+    result = service._send_to_chat("caption", "1", IMAGE)
+
+    assert result["ok"] and result["media"] == "upload"
+    assert service.requests == [("1", "expired"), ("1", "upload")]
+    assert service.media_cache.get(key) == "large"
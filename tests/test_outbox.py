@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from main import Config, MessageFormatter, TelegramOutbox, TelegramService
+
+RETRY = {"max_attempts": 4, "retry_base": 60.0, "retry_max": 200.0}
+
+
+def failure(chat_id, status=500, **fields):
+    return dict({"chat_id": chat_id, "ok": False, "status": status, "error": f"HTTP {status}"}, **fields)
+
+
+def success(chat_id):
+    return {"chat_id": chat_id, "ok": True, "status": 200, "error": None}
+
+
+@pytest.fixture
+def outbox():
+    outbox = TelegramOutbox()
+    yield outbox
+    outbox.close()
+
+
+def delivering_service(outbox, statuses):
+    """A TelegramService whose broadcasts answer each chat with statuses[chat_id] and record the chats sent to."""
+    config = Config()
+    config.telegram_bot_token = "123456:TEST"
+    config.media_cache_file = None
+    service = TelegramService(config, MessageFormatter(config), outbox=outbox)
+    service.sent = []
+
+    def broadcast(text, chat_ids, photo=None):
+        service.sent += chat_ids
+        return SimpleNamespace(results=[success(chat_id) if statuses.get(chat_id, 200) == 200
+                                        else failure(chat_id, statuses[chat_id]) for chat_id in chat_ids])
+
+    service.broadcast = broadcast
+    return service
+
+
+def test_failed_delivery_backs_off_exponentially_up_to_the_cap(outbox):
+    message_id = outbox.enqueue("promo:A", "asset", "text", ["1"])
+    delays = []
+    for _ in range(3):
+        before = time.time()
+        assert outbox.record(message_id, [failure("1")], **RETRY) == []
+        delays.append(outbox.next_due() - before)
+    assert [round(delay, -1) for delay in delays] == [60, 120, 200]
+    assert outbox.due_chats(message_id, 10) == []
+    assert outbox.due_chats(message_id, 10, now=time.time() + 200) == ["1"]
+
+
+def test_delivery_is_given_up_after_max_attempts(outbox):
+    message_id = outbox.enqueue("promo:A", "asset", "text", ["1"])
+    for _ in range(RETRY["max_attempts"] - 1):
+        assert outbox.record(message_id, [failure("1")], **RETRY) == []
+    given_up = outbox.record(message_id, [failure("1")], **RETRY)
+    assert [result["chat_id"] for result in given_up] == ["1"]
+    assert outbox.states(message_id) == {"pending": 0, "sent": 0, "failed": 1, "expired": 0}
+    assert outbox.next_due() is None
+
+
+def test_drain_gives_up_on_400_and_403_at_once_and_retries_the_rest(outbox):
+    outbox.enqueue("promo:A", "asset", "text", ["bad-request", "blocked", "flaky", "ok"])
+    service = delivering_service(outbox, {"bad-request": 400, "blocked": 403, "flaky": 500})
+
+    given_up = service.drain()
+
+    assert sorted(result["chat_id"] for result in given_up) == ["bad-request", "blocked"]
+    assert outbox.states() == {"pending": 1, "sent": 1, "failed": 2, "expired": 0}
+    rows = outbox.db.execute("SELECT chat_id, attempts FROM deliveries WHERE state = 'failed'").fetchall()
+    assert {row["chat_id"]: row["attempts"] for row in rows} == {"bad-request": 1, "blocked": 1}
+
+
+def test_rerun_after_a_crash_does_not_resend_to_chats_that_got_the_message(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = TelegramOutbox(path)
+    message_id = outbox.enqueue("promo:A", "asset", "text", ["1", "2"])
+    outbox.record(message_id, [success("1")], **RETRY)
+    # Crash: the process dies without closing the outbox
+    outbox.db.close()
+
+    outbox = TelegramOutbox(path)
+    assert outbox.enqueue("promo:A", "asset", "text", ["1", "2", "3"]) == message_id
+    service = delivering_service(outbox, {})
+    assert service.drain() == []
+    assert sorted(service.sent) == ["2", "3"]
+    assert outbox.states(message_id) == {"pending": 0, "sent": 3, "failed": 0, "expired": 0}
+
+    service.sent = []
+    outbox.enqueue("promo:A", "asset", "text", ["1", "2", "3"])
+    service.drain()
+    assert service.sent == []
+    outbox.close()
+
+
+def test_prune_removes_old_settled_messages_and_keeps_pending_ones(outbox):
+    settled = outbox.enqueue("promo:old", "asset", "text", ["1"], photo=b"image")
+    pending = outbox.enqueue("promo:waiting", "asset", "text", ["1"], photo=b"image")
+    recent = outbox.enqueue("promo:recent", "asset", "text", ["1"], photo=b"image")
+    outbox.record(settled, [success("1")], **RETRY)
+    outbox.record(recent, [success("1")], **RETRY)
+    outbox.db.execute("UPDATE messages SET created = ? WHERE id IN (?, ?)", (time.time() - 40 * 86400, settled, pending))
+
+    outbox.prune(retention_days=30)
+
+    keys = [row["key"] for row in outbox.db.execute("SELECT key FROM messages ORDER BY id")]
+    assert keys == ["promo:waiting", "promo:recent"]
+    assert outbox.photo(pending) == b"image"
+    assert outbox.photo(recent) is None
+    assert outbox.db.execute("SELECT COUNT(*) FROM deliveries WHERE message_id = ?", (settled,)).fetchone()[0] == 0
+
+
+def test_close_drops_sent_images_and_compacts_the_file(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = TelegramOutbox(path)
+    message_id = outbox.enqueue("promo:A", "asset", "text", ["1"], photo=os.urandom(256 * 1024))
+    outbox.record(message_id, [success("1")], **RETRY)
+    size_before = os.path.getsize(path)
+
+    outbox.close()
+
+    assert os.path.getsize(path) < size_before / 4
+    reopened = TelegramOutbox(path)
+    assert reopened.photo(message_id) is None
+    assert reopened.states(message_id)["sent"] == 1
+    reopened.close()
+
+
+def test_drain_expires_messages_past_their_end_instead_of_sending_them(outbox):
+    stale = outbox.enqueue("promo:last-week", "asset", "old coupon", ["1", "2"], expires_at=time.time() - 60)
+    current = outbox.enqueue("promo:this-week", "asset", "new coupon", ["1", "2"], expires_at=time.time() + 3600)
+    service = delivering_service(outbox, {})
+
+    assert service.drain() == []
+
+    assert service.sent == ["1", "2"]
+    assert outbox.states(stale) == {"pending": 0, "sent": 0, "failed": 0, "expired": 2}
+    assert outbox.states(current) == {"pending": 0, "sent": 2, "failed": 0, "expired": 0}
+    assert outbox.next_due() is None
+
+
+def test_pending_retry_expires_when_the_sale_ends(outbox):
+    message_id = outbox.enqueue("promo:A", "asset", "text", ["1"], expires_at=time.time() + 100)
+    outbox.record(message_id, [failure("1")], **RETRY)
+
+    # The retry is due 60 s later, before the sale ends, but not once it has ended
+    assert [message["id"] for message in outbox.due(now=time.time() + 90)] == [message_id]
+    assert outbox.due(now=time.time() + 101) == []
+    assert outbox.states(message_id)["expired"] == 1
+
+
+def test_send_message_expires_at_the_sale_end(outbox):
+    service = delivering_service(outbox, {})
+    service.config.telegram_chat_id = "1"
+    asset = {"name": "Asset", "url": "https://assetstore.unity.com/packages/a-1", "code": "CODE",
+             "publisher_url": "https://assetstore.unity.com/publishers/1",
+             "end_date": "* Sale and related free asset promotion end January 8, 2026 at 7:59am PT."}
+
+    assert service.send_message(asset, key="promo:A") is False
+
+    assert service.sent == []
+    row = outbox.db.execute("SELECT expires_at FROM messages WHERE key = 'promo:A'").fetchone()
+    # 7:59am Pacific Standard Time
+    assert row["expires_at"] == 1767887940.0
+
+
+def test_outbox_from_before_expiry_is_upgraded(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    db = sqlite3.connect(path)
+    db.executescript(TelegramOutbox.SCHEMA.replace(",\n            expires_at REAL", ""))
+    db.execute("INSERT INTO messages (key, kind, text, created) VALUES ('promo:A', 'asset', 'text', 0)")
+    db.execute("INSERT INTO deliveries (message_id, chat_id, state, next_attempt) VALUES (1, '1', 'pending', 0)")
+    db.commit()
+    db.close()
+
+    outbox = TelegramOutbox(path)
+
+    assert [message["key"] for message in outbox.due()] == ["promo:A"]
+    outbox.close()
@@ -0,0 +1,74 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from main import AssetParser, PageExtractor, StreamExtractor
+from benchmark import SALE_URL, build_sale_page, legacy_extract
+
+TITLE = "Flexalon Pro: 3D & UI Layouts"
+ASSET_URL = "https://assetstore.unity.com/packages/tools/utilities/flexalon-pro-3d-ui-layouts-230509"
+
+
+def extract(markup):
+    return PageExtractor(AssetParser()).extract(BeautifulSoup(markup, "html.parser"), SALE_URL)
+
+
+@pytest.mark.parametrize("cards", [1, 2, 50])
+@pytest.mark.parametrize("button_text", ["Get your gift", "Claim it now"])
+def test_single_pass_agrees_with_the_original_extraction(cards, button_text):
+    markup = build_sale_page(cards, button_text=button_text)
+
+    expected = legacy_extract(BeautifulSoup(markup, "html.parser"), AssetParser(), SALE_URL)
+    assert extract(markup) == expected
+    assert expected["url"] == ASSET_URL
+
+
+def test_title_is_found_in_the_containers_surroundings():
+    markup = (f"<html><body><section><h2>{TITLE}</h2><div><p>Use coupon code VIRTUALMAKER at checkout.</p>"
+              '<a href="/packages/tools/utilities/flexalon-pro-3d-ui-layouts-230509">Get your gift</a></div></section>'
+              "<div><h3>Another asset</h3></div>"
+              "<p>* Sale and related free asset promotion end November 27, 2025 at 7:59am PT.</p></body></html>")
+
+    asset_data = extract(markup)
+
+    assert (asset_data["name"], asset_data["url"], asset_data["code"]) == (TITLE, ASSET_URL, "VIRTUALMAKER")
+
+
+def test_title_search_looks_only_a_few_levels_up():
+    markup = ("<html><body><div><p>Use coupon code VIRTUALMAKER at checkout.</p></div>"
+              f"<h2>{TITLE}</h2></body></html>")
+
+    # The heading is only inside the body, one level above the coupon's container
+    assert extract(markup)["name"] == TITLE
+    assert extract("<html><body><div><div><div><div><p>Use coupon code VIRTUALMAKER.</p></div></div></div></div>"
+                   f"<h2>{TITLE}</h2></body></html>")["name"] == "Unknown Asset"
+
+
+def test_link_text_stops_where_the_link_ends():
+    markup = ("<html><body><div><h2>Ocean Toolkit</h2><p>Use coupon code OCEAN at checkout.</p>"
+              '<a href="/packages/tools/ocean-toolkit-1"><span>Get your</span></a><span> gift</span>'
+              '<a href="/packages/tools/ocean-toolkit-2">Get <b>your</b> gift</a></div></body></html>')
+
+    # Only the second link is a gift button; the first one's text must not run on into the next span
+    assert extract(markup)["url"] == "https://assetstore.unity.com/packages/tools/ocean-toolkit-2"
+
+
+def stream_extract(markup):
+    return StreamExtractor(AssetParser()).extract(markup.encode("utf-8"), SALE_URL)
+
+
+@pytest.mark.parametrize("markup", [
+    build_sale_page(50),
+    build_sale_page(50, button_text="Claim it now"),
+    build_sale_page(5, end_date="November  27,\n  2025 at 7:59am PT"),
+    build_sale_page(5, title="Ocean &amp; Sky  Toolkit", slug="tools/ocean-sky-toolkit-53514"),
+], ids=["button", "no-button", "spaced-end-date", "spaced-title"])
+def test_stream_extractor_agrees_with_the_dom_extractor(markup):
+    expected = extract(markup)
+
+    assert stream_extract(markup) == expected
+
+
+def test_stream_extractor_collapses_whitespace_inside_the_end_date():
+    markup = build_sale_page(5, end_date="November  27,\n  2025 at 7:59am PT")
+
+    assert stream_extract(markup)["end_date"] == "* Sale and related free asset promotion end November 27, 2025 at 7:59am PT."
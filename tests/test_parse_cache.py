@@ -0,0 +1,50 @@
+import pytest
+
+from main import AssetParser, AssetScraper, Config, FetchedPage, HttpCache
+from benchmark import CorpusClient, STORE, build_sale_page
+
+SALE_URL = STORE + "/publisher-sale"
+
+
+def scraper(config, cache=None):
+    client = CorpusClient({"/publisher-sale": build_sale_page(20).encode("utf-8")})
+    client.cache = cache
+    return AssetScraper(config, AssetParser(), client)
+
+
+def config(**settings):
+    config = Config()
+    config.publisher_sale_url = SALE_URL
+    config.cache_dir = None
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return config
+
+
+PAGE = FetchedPage(SALE_URL, 200, b"<html></html>")
+
+
+def test_key_names_the_enabled_stages_and_tree_builder():
+    key = scraper(config())._parse_cache_key(PAGE)
+
+    assert key == f"{AssetParser.VERSION}-structured_stream_dom.html.parser-{PAGE.body_hash}"
+
+
+@pytest.mark.parametrize("settings", [
+    {"structured_extract": False},
+    {"stream_extract": False},
+    {"html_parser": "lxml"},
+])
+def test_changing_the_extraction_settings_changes_the_key(settings):
+    assert scraper(config(**settings))._parse_cache_key(PAGE) != scraper(config())._parse_cache_key(PAGE)
+
+
+def test_parse_cached_with_other_stages_is_not_reused(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    structured = scraper(config(), cache)
+    page = structured.client.fetch(SALE_URL)
+    stale = dict(structured.extract_sale_page(page), name="Cached by the structured stage")
+    structured._store_parse("publisher-sale", page, stale)
+
+    assert structured._cached_parse("publisher-sale", page) == stale
+    assert scraper(config(structured_extract=False), cache)._cached_parse("publisher-sale", page) is None
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from main import Config, PollSchedule
+
+END_DATE = "* Sale and related free asset promotion end January 8, 2026 at 7:59am PT."
+
+
+@pytest.fixture
+def schedule():
+    return PollSchedule(Config())
+
+
+@pytest.fixture
+def rollover(schedule):
+    return schedule.expected_rollover(END_DATE)
+
+
+def test_rollover_is_the_sale_end_in_store_time(schedule, rollover):
+    assert rollover.replace(tzinfo=None) == datetime(2026, 1, 8, 7, 59)
+    # Pacific Standard Time in January
+    assert rollover.utcoffset() == timedelta(hours=-8)
+
+
+def test_rollover_reads_pm_times_and_defaults_to_8am(schedule):
+    assert schedule.expected_rollover("ends March 5, 2026 at 12:30pm PT").hour == 12
+    assert schedule.expected_rollover("ends March 5, 2026 at 4:15pm PT").time().isoformat() == "16:15:00"
+    assert schedule.expected_rollover("ends March 5, 2026").time().isoformat() == "08:00:00"
+
+
+def test_rollover_is_unknown_without_a_date(schedule):
+    assert schedule.expected_rollover(None) is None
+    assert schedule.expected_rollover("Ends soon") is None
+
+
+def within_jitter(delay, interval):
+    return interval * 0.9 <= delay <= interval * 1.1
+
+
+@pytest.mark.parametrize("offset, interval", [
+    (timedelta(seconds=0), "watch_fast_interval"),
+    (timedelta(minutes=-5), "watch_fast_interval"),
+    (timedelta(hours=2), "watch_fast_interval"),
+    (timedelta(hours=3), "watch_late_interval"),
+    (timedelta(hours=23), "watch_late_interval"),
+    (timedelta(hours=25), "watch_slow_interval"),
+])
+def test_interval_follows_the_phase_around_the_rollover(schedule, rollover, offset, interval):
+    delay = schedule.next_delay(rollover, now=rollover + offset)
+
+    assert within_jitter(delay, getattr(schedule.config, interval))
+
+
+def test_slow_polls_never_overshoot_the_tight_window(schedule, rollover):
+    config = schedule.config
+    now = rollover - timedelta(seconds=config.watch_window_before + 60)
+
+    assert schedule.next_delay(rollover, now=now) == pytest.approx(60)
+    assert within_jitter(schedule.next_delay(rollover, now=rollover - timedelta(days=2)), config.watch_slow_interval)
+
+
+def test_unknown_rollover_polls_at_the_late_interval(schedule):
+    delay = schedule.next_delay(None, now=datetime(2026, 1, 8, tzinfo=timezone.utc))
+
+    assert within_jitter(delay, schedule.config.watch_late_interval)
+
+
+def test_delay_is_at_least_one_second(schedule, rollover):
+    now = rollover - timedelta(seconds=schedule.config.watch_window_before + 0.1)
+
+    assert schedule.next_delay(rollover, now=now) == 1.0
@@ -0,0 +1,130 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from main import BroadcastReport, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_of_its_capacity_then_paces_at_its_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+
+    assert [bucket._reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket._reserve() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == pytest.approx(0.5)
+
+
+def test_bucket_refills_no_further_than_its_capacity(clock):
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    bucket._reserve()
+    bucket._reserve()
+
+    clock.now += 60
+    assert [bucket._reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket._reserve() > 0
+
+
+def test_default_capacity_is_one_second_of_tokens_but_at_least_one():
+    assert TokenBucket(rate=30.0).capacity == 30.0
+    assert TokenBucket(rate=1 / 3).capacity == 1.0
+
+
+def test_pause_withholds_tokens_until_it_ends(clock):
+    bucket = TokenBucket(rate=100.0)
+    bucket.pause(5)
+
+    assert bucket._reserve() == pytest.approx(5)
+    clock.now += 4
+    assert bucket._reserve() == pytest.approx(1)
+    clock.now += 1
+    # The bucket starts empty after a pause
+    assert bucket._reserve() == pytest.approx(0.01)
+    clock.now += 0.011
+    assert bucket._reserve() == 0.0
+
+
+def test_pause_never_shortens_a_longer_pause(clock):
+    bucket = TokenBucket(rate=1.0)
+    bucket.pause(10)
+    bucket.pause(2)
+
+    assert bucket._reserve() == pytest.approx(10)
+
+
+def result(chat_id, ok=True, retry_after=0, uploaded_bytes=0):
+    return {"chat_id": chat_id, "ok": ok, "status": 200 if ok else 500, "attempts": 1,
+            "retry_after": retry_after, "elapsed": 0.0, "error": None if ok else "HTTP 500",
+            "media": "text", "uploaded_bytes": uploaded_bytes}
+
+
+def test_broadcast_report_summarises_the_results():
+    report = BroadcastReport()
+    report.add(result("1", uploaded_bytes=1000))
+    report.add(result("2", retry_after=3))
+    report.add(result("3", ok=False))
+    report.finish()
+
+    summary = report.summary()
+    assert (report.delivered, report.failed) == (2, 1)
+    assert {key: summary[key] for key in ("recipients", "delivered", "failed", "throttled", "uploaded_bytes")} == {
+        "recipients": 3, "delivered": 2, "failed": 1, "throttled": 1, "uploaded_bytes": 1000}
+    assert summary["messages_per_s"] > 0
+
+
+def test_empty_broadcast_report():
+    report = BroadcastReport()
+    report.finish()
+
+    assert report.summary()["recipients"] == 0
+    assert report.summary()["delivered"] == 0
+
+
+def test_broadcast_report_saves_summary_and_results(tmp_path):
+    report = BroadcastReport()
+    report.add(result("1"))
+    report.finish()
+    path = tmp_path / "report.json"
+
+    report.save(str(path))
+
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["summary"]["delivered"] == 1
+    assert [entry["chat_id"] for entry in saved["results"]] == ["1"]
+
+
+def test_flood_control_pauses_the_whole_bot_not_just_the_chat(clock, monkeypatch):
+    config = main.Config()
+    config.telegram_bot_token = "123456:TEST"
+    config.media_cache_file = None
+    service = main.TelegramService(config, main.MessageFormatter(config), outbox=main.TelegramOutbox())
+    responses = iter([(429, {"ok": False, "parameters": {"retry_after": 7}}), (200, {"ok": True})])
+    monkeypatch.setattr(main.TokenBucket, "acquire", lambda bucket: None)
+
+    def post(url, phase, **kwargs):
+        status, body = next(responses)
+        return SimpleNamespace(status_code=status, ok=status == 200, text=json.dumps(body), json=lambda: body)
+
+    service.client.post = post
+
+    assert service._send_to_chat("text", "1")["ok"]
+    assert service._global_bucket._reserve() == pytest.approx(7)
+    assert service._chat_bucket("2")._reserve() == 0.0
+    service.outbox.close()
@@ -0,0 +1,61 @@
+from main import AssetParser, AssetScraper, Config, StructuredDataExtractor
+from benchmark import CorpusClient, STORE, build_asset_page, build_sale_page
+
+TITLE = "Flexalon Pro: 3D & UI Layouts"
+ASSET_URL = STORE + "/packages/tools/utilities/flexalon-pro-3d-ui-layouts-230509"
+
+
+class RecordingClient(CorpusClient):
+    def __init__(self, pages, events):
+        super().__init__(pages)
+        self.events = events
+
+    def prefetch(self, url, phase="http"):
+        self.events.append(("prefetch", url))
+        return super().prefetch(url, phase)
+
+
+def scraper(events, **settings):
+    config = Config()
+    config.publisher_sale_url = STORE + "/publisher-sale"
+    config.cache_dir = None
+    config.telegram_send_photos = False
+    for name, value in settings.items():
+        setattr(config, name, value)
+    client = RecordingClient({"/publisher-sale": build_sale_page(200).encode("utf-8"),
+                              "/packages/tools/utilities/flexalon-pro-3d-ui-layouts-230509":
+                                  build_asset_page(TITLE).encode("utf-8")}, events)
+    scraper = AssetScraper(config, AssetParser(), client)
+    for stage in ("stream_extractor", "extractor"):
+        extractor = getattr(scraper, stage)
+        extract = extractor.extract
+        extractor.extract = lambda *args, stage=stage, extract=extract, **kwargs: (
+            events.append((stage,)) or extract(*args, **kwargs))
+    return scraper
+
+
+def test_asset_page_download_starts_before_the_slow_stages_run():
+    events = []
+
+    asset_data = scraper(events).scrape()
+
+    assert asset_data["url"] == ASSET_URL
+    assert asset_data["publisher_url"] == STORE + "/publishers/72095"
+    assert events == [("prefetch", ASSET_URL), ("stream_extractor",)]
+
+
+def test_asset_page_download_starts_before_the_dom_stage_too():
+    events = []
+
+    scraper(events, stream_extract=False).scrape()
+
+    assert events == [("prefetch", ASSET_URL), ("extractor",)]
+
+
+def test_coupon_link_needs_a_heading_that_names_the_package():
+    extractor = StructuredDataExtractor(AssetParser())
+    page = build_sale_page(10)
+
+    assert extractor.coupon_link(page.encode("utf-8")) == ASSET_URL
+    assert extractor.coupon_link(page.replace(f"<h2>{TITLE}</h2>", "<h2>Weekly gift</h2>")) is None
+    assert extractor.coupon_link(page.replace(f"<h2>{TITLE}</h2>", "")) is None
@@ -0,0 +1,79 @@
+import json
+import time
+
+import pytest
+
+from main import AlreadyPosted, Config, PromotionSource, SourceRegistry, SourceScheduler
+from benchmark import CorpusClient
+
+
+def scheduler(behaviours):
+    """A SourceScheduler whose scrapers run behaviours[source name] instead of fetching."""
+    config = Config()
+    registry = SourceRegistry(PromotionSource(name, f"https://example.com/{name}") for name in behaviours)
+    scheduler = SourceScheduler(config, registry, client=CorpusClient({}))
+    for scraper in scheduler.scrapers:
+        scraper.scrape = lambda gate=None, behaviour=behaviours[scraper.source.name]: behaviour()
+    return scheduler
+
+
+def after(seconds, result=None, error=None):
+    def behaviour():
+        time.sleep(seconds)
+        if error:
+            raise error
+        return result
+    return behaviour
+
+
+def test_failing_source_does_not_stop_the_others():
+    sources = scheduler({
+        "broken": after(0, error=RuntimeError("layout changed")),
+        "posted": after(0.05, error=AlreadyPosted("A|1|2026-01-01", "already in archive")),
+        "working": after(0.1, result={"name": "Asset"}),
+        "empty": after(0),
+    })
+
+    results = {scraper.source.name: (outcome, value) for scraper, outcome, value in sources.scrape_all()}
+    sources.close()
+
+    assert results["broken"][0] == SourceScheduler.FAILED
+    assert str(results["broken"][1]) == "layout changed"
+    assert results["posted"][0] == SourceScheduler.HANDLED
+    assert results["working"] == (SourceScheduler.FOUND, {"name": "Asset"})
+    assert results["empty"] == (SourceScheduler.FAILED, None)
+
+
+def test_run_takes_about_as_long_as_the_slowest_source():
+    sources = scheduler({"fast": after(0.1, {}), "medium": after(0.2, {}), "slow": after(0.3, {})})
+
+    start = time.perf_counter()
+    results = sources.scrape_all()
+    elapsed = time.perf_counter() - start
+    sources.close()
+
+    assert [scraper.source.name for scraper, _, _ in results] == ["fast", "medium", "slow"]
+    assert 0.3 <= elapsed < 0.5
+
+
+def test_sources_file_adds_to_the_publisher_sale_page(tmp_path):
+    path = tmp_path / "sources.json"
+    path.write_text(json.dumps([{"name": "bundles", "url": "https://example.com/bundles", "strategy": "structured",
+                                 "asset_page": False}]), encoding="utf-8")
+    config = Config()
+    config.sources_file = str(path)
+
+    registry = SourceRegistry.from_config(config)
+
+    assert [source.name for source in registry] == ["publisher-sale", "bundles"]
+    assert registry.get("bundles").stages == ("structured",)
+    assert registry.get("bundles").asset_page is False
+
+
+def test_duplicate_names_and_unknown_strategies_are_rejected():
+    registry = SourceRegistry([PromotionSource("a", "https://example.com/a")])
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        registry.add(PromotionSource("a", "https://example.com/other"))
+    with pytest.raises(ValueError, match="Unknown strategy"):
+        PromotionSource("b", "https://example.com/b", strategy="regex")
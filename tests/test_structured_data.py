@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from main import AssetParser, StructuredDataExtractor
+from benchmark import build_sale_page
+
+FLEXALON_URL = "https://assetstore.unity.com/packages/tools/utilities/flexalon-pro-3d-ui-layouts-230509"
+END_DATE = "* Sale and related free asset promotion end November 27, 2025 at 7:59am PT."
+
+
+def json_ld(obj) -> str:
+    return f'<script type="application/ld+json">{json.dumps(obj)}</script>'
+
+
+def sale_page(*products) -> str:
+    return build_sale_page(20).replace("</head>", "".join(map(json_ld, products)) + "</head>")
+
+
+def free_product(name: str, url: str, **fields) -> dict:
+    return dict({"@type": "Product", "name": name, "url": url, "offers": {"price": "0"}}, **fields)
+
+
+@pytest.fixture
+def extractor():
+    return StructuredDataExtractor(AssetParser())
+
+
+def test_free_product_named_by_coupon_block_is_the_promotion(extractor):
+    page = sale_page(free_product("Flexalon Pro: 3D & UI Layouts", FLEXALON_URL))
+    asset = extractor.extract(page, "https://assetstore.unity.com/publisher-sale")
+    assert asset["name"] == "Flexalon Pro: 3D & UI Layouts"
+    assert asset["url"] == FLEXALON_URL
+    assert asset["code"] == "VIRTUALMAKER"
+
+
+def test_unrelated_free_product_is_not_paired_with_the_coupon(extractor):
+    other = free_product("Some Other Free Asset", "https://assetstore.unity.com/packages/tools/some-other-free-asset-1234")
+    assert extractor.extract(sale_page(other), "https://assetstore.unity.com/publisher-sale") is None
+
+
+def test_named_product_wins_over_unrelated_free_product(extractor):
+    other = free_product("Some Other Free Asset", "https://assetstore.unity.com/packages/tools/some-other-free-asset-1234")
+    page = sale_page(other, free_product("Flexalon Pro: 3D & UI Layouts", FLEXALON_URL))
+    assert extractor.extract(page, "https://assetstore.unity.com/publisher-sale")["url"] == FLEXALON_URL
+
+
+def test_product_with_coupon_code_needs_no_coupon_block(extractor):
+    product = free_product("Unlisted Asset", "https://assetstore.unity.com/packages/tools/unlisted-asset-999",
+                           couponCode="DATACODE", endDate="January 8, 2026 at 7:59am PT")
+    asset = extractor.extract(sale_page(product), "https://assetstore.unity.com/publisher-sale")
+    assert asset["code"] == "DATACODE"
+    assert asset["end_date"] == "* Sale and related free asset promotion end January 8, 2026 at 7:59am PT."
+
+
+def test_end_date_falls_back_to_the_page_sentence(extractor):
+    # No endDate in the data: the footer sentence must be read from its start
+    page = sale_page(free_product("Flexalon Pro: 3D & UI Layouts", FLEXALON_URL))
+    assert extractor.extract(page, "https://assetstore.unity.com/publisher-sale")["end_date"] == END_DATE
+
+
+def test_end_date_sentence_split_across_tags(extractor):
+    page = sale_page(free_product("Flexalon Pro: 3D & UI Layouts", FLEXALON_URL)).replace(
+        "<footer><p>* Sale and related free asset promotion end ",
+        "<footer><p>* Sale and related free asset <b>promotion end</b> ")
+    # The element starts inside <b>; the fallback phrase still finds the date
+    asset = extractor.extract(page, "https://assetstore.unity.com/publisher-sale")
+    assert asset is not None and "November 27, 2025" in asset["end_date"]